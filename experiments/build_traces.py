@@ -3,10 +3,12 @@
 This script is used to record execution traces for each mission within a
 provided mission suite file.
 """
-from typing import List, Iterator, Callable, Dict, Any
+from typing import List, Iterator, Callable, Dict, Any, Optional, Tuple
+from timeit import default_timer as timer
 import os
 import argparse
 import concurrent.futures
+import multiprocessing.util
 import json
 import logging
 import contextlib
@@ -17,6 +19,11 @@ import bugzoo
 import bugzoo.server
 import houston
 from houston.exceptions import ConnectionLostError, NoConnectionError
+from houston.journal import CampaignJournal, JournalEntry, RetryPolicy
+from houston.pool import SandboxPool
+from houston.trace import SamplingPolicy, FixedRateSampling, \
+    MaxGapSampling, LastStatePerCommand
+from houston.tracefile import TraceFile, TraceSink, read_trace_stream
 
 import settings
 
@@ -27,6 +34,9 @@ DESCRIPTION = "Builds trace files for a given set of missions."
 
 SandboxFactory = Callable[[bugzoo.BugZoo, bugzoo.Bug, houston.Mission], Iterator[houston.Sandbox]]
 
+# the warm container pool that belongs to this worker process
+_sandbox_pool = None  # type: Optional[SandboxPool]
+
 
 def kill_child_processes(parent_pid, sig=signal.SIGTERM):
     try:
@@ -65,6 +75,23 @@ def parse_args():
                    help='number of traces to generate for each mission.')
     p.add_argument('--threads', type=int, default=1,
                    help='number of threads to use when building trace files.')
+    p.add_argument('--reuse-containers', action='store_true',
+                   help='reuses a warm container within each worker rather than provisioning a container for each trace (ignored when collecting coverage).')
+    p.add_argument('--journal', type=str,
+                   help='path to a campaign journal that is used to skip completed missions and to resume an interrupted campaign.')
+    p.add_argument('--attempts', type=int, default=1,
+                   help='maximum number of attempts for each mission that crashes (requires --journal).')
+    p.add_argument('--format', choices=('json', 'binary'), default='json',
+                   help='the format of the trace files: JSON, or the binary, columnar trace format.')
+    p.add_argument('--dedup', choices=('exact', 'noise'),
+                   help='records consecutive states whose variables are unchanged (exactly, or within their noise) by their time offsets alone.')
+    sampling = p.add_mutually_exclusive_group()
+    sampling.add_argument('--sample-rate', type=float,
+                          help='records states at a fixed rate (in Hz of simulated time).')
+    sampling.add_argument('--max-gap', type=float,
+                          help='records states whenever a variable changes beyond its noise, or after the given number of seconds of simulated time.')
+    sampling.add_argument('--last-state-only', action='store_true',
+                          help='only records the last state of each command.')
     return p.parse_args()
 
 
@@ -73,39 +100,109 @@ def trace(index: int,
           jsn_mission: Dict[str, Any],
           num_repeats: int,
           dir_output: str,
-          collect_coverage: bool
-          ) -> None:
+          collect_coverage: bool,
+          dedup: Optional[str] = None,
+          sampling: Optional[SamplingPolicy] = None,
+          fmt: str = 'json',
+          keep_partial: bool = False
+          ) -> Tuple[str, float]:
+    """
+    Builds the trace file for a given mission.
+
+    Traces are streamed to a partial file as they are recorded. If a partial
+    file was left behind by an earlier attempt, its completed traces are
+    kept, and only the remaining repeats are run. Should this attempt fail,
+    the partial file is removed, unless keep_partial is set and the file
+    holds at least one completed trace.
+
+    Returns:
+        a tuple of the status of the attempt, given as a journal status,
+        and the number of seconds that it took.
+    """
+    time_start = timer()
     mission = houston.Mission.from_dict(json.loads(jsn_mission))
 
-    # generate a (very-likely-to-be) "unique" ID for the mission
-    uid = hex(abs(hash(mission)))[2:][:8]
+    # use the digest of the mission to give it a stable, unique ID
+    uid = mission.digest
     logger.info("generating trace for mission %d: %s", index, uid)
-    filename = "{}.json".format(uid)
+    extension = 'trace' if fmt == 'binary' else 'json'
+    filename = "{}.{}".format(uid, extension)
     filename = os.path.join(dir_output, filename)
     if os.path.exists(filename):
         logger.info("skipping trace: %d ('%s' already exists)", index, filename)
-        return
+        return JournalEntry.COMPLETED, 0.0
 
+    # traces are streamed to a partial file as they are recorded, so that
+    # completed repeats survive a crash, and are only converted to the final
+    # trace file once all repeats have been completed
+    fn_partial = partial_filename(dir_output, uid)
+    try:
+        sink = TraceSink(fn_partial, mission, append=True)
+    except ValueError:
+        logger.warning("discarding unreadable partial trace: %s", fn_partial)
+        sink = TraceSink(fn_partial, mission)
+    num_completed = sink.num_traces
+    if num_completed > 0:
+        logger.info("resuming trace %d after %d completed repeats",
+                    index, num_completed)
     try:
-        traces = []  # List[MissionTrace]
-        for _ in range(num_repeats):
-            with sandbox_factory(collect_coverage) as sandbox:
-                t = sandbox.run_and_trace(mission.commands, collect_coverage)
-                traces.append(t)
+        with sink:
+            for _ in range(num_completed, num_repeats):
+                with sandbox_factory(collect_coverage) as sandbox:
+                    sandbox.run_and_trace(mission.commands,
+                                          collect_coverage,
+                                          sink=sink,
+                                          dedup=dedup,
+                                          sampling=sampling,
+                                          retain=False)
+                num_completed += 1
 
         logger.debug("saving traces to file: %s", filename)
-        with open(filename, 'w') as f:
-            json.dump({'mission': mission.to_dict(),
-                       'traces': [t.to_dict() for t in traces]},
-                      f)
+        _, traces = read_trace_stream(fn_partial, mission.system)
+        if fmt == 'binary':
+            TraceFile.write(filename, list(traces), mission)
+        else:
+            with open(filename, 'w') as f:
+                f.write('{"mission": ')
+                json.dump(mission.to_dict(), f)
+                f.write(', "traces": [')
+                for i, t in enumerate(traces):
+                    if i > 0:
+                        f.write(', ')
+                    json.dump(t.to_dict(), f)
+                f.write(']}')
+        os.remove(fn_partial)
         logger.debug("saved trace to file: %s", filename)
     except (ConnectionLostError, NoConnectionError):
         logger.error("SITL crashed during trace %d: %s", index, uid)
+        status = JournalEntry.CRASHED
     except (KeyboardInterrupt, SystemExit):
         logger.exception("received keyboard interrupt")
         raise
     except:
         logger.exception("failed to build trace %d: %s", index, uid)
+        status = JournalEntry.CRASHED
+    else:
+        return JournalEntry.COMPLETED, timer() - time_start
+
+    if not keep_partial or num_completed == 0:
+        remove_partial(dir_output, uid)
+    return status, timer() - time_start
+
+
+def partial_filename(dir_output: str, uid: str) -> str:
+    """
+    Returns the name of the partial file to which the traces for the
+    mission with a given digest are streamed.
+    """
+    return os.path.join(dir_output, "{}.partial".format(uid))
+
+
+def remove_partial(dir_output: str, uid: str) -> None:
+    fn_partial = partial_filename(dir_output, uid)
+    if os.path.exists(fn_partial):
+        logger.debug("removing partial trace: %s", fn_partial)
+        os.remove(fn_partial)
 
 
 @contextlib.contextmanager
@@ -132,35 +229,95 @@ def build_sandbox(client_bugzoo: bugzoo.Client,
             del client_bugzoo.containers[container.uid]
 
 
+@contextlib.contextmanager
+def lease_sandbox(client_bugzoo: bugzoo.Client,
+                  snapshot: bugzoo.Bug,
+                  jsn_mission: str,
+                  collect_coverage: bool
+                  ) -> Iterator[houston.Sandbox]:
+    global _sandbox_pool
+    assert not collect_coverage
+    mission = houston.Mission.from_dict(json.loads(jsn_mission))
+    if _sandbox_pool is None:
+        _sandbox_pool = SandboxPool(client_bugzoo, snapshot, 1)
+        # destroy the container when the worker process exits
+        multiprocessing.util.Finalize(None, _sandbox_pool.close,
+                                      exitpriority=10)
+    with _sandbox_pool.lease(mission.system.sandbox,
+                             mission.initial_state,
+                             mission.environment,
+                             mission.configuration) as sandbox:
+        yield sandbox
+
+
 def build_traces(client_bugzoo: bugzoo.Client,
                  snapshot: bugzoo.Bug,
                  jsn_missions: List[str],
                  num_threads: int,
                  num_repeats: int,
                  dir_output: str,
-                 collect_coverage: bool
+                 collect_coverage: bool,
+                 reuse_containers: bool = False,
+                 journal: Optional[CampaignJournal] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 dedup: Optional[str] = None,
+                 sampling: Optional[SamplingPolicy] = None,
+                 fmt: str = 'json'
                  ) -> None:
-    futures = []
+    futures = {}  # type: Dict[concurrent.futures.Future, int]
+    if collect_coverage:
+        reuse_containers = False
+    build = lease_sandbox if reuse_containers else build_sandbox
+    missions = [houston.Mission.from_dict(json.loads(m)) for m in jsn_missions]
     with concurrent.futures.ProcessPoolExecutor(num_threads) as e:
+        def submit(i: int) -> concurrent.futures.Future:
+            logger.debug("submitting mission %d", i)
+            jsn_mission = jsn_missions[i]
+            sandbox_factory = functools.partial(build,
+                                                client_bugzoo,
+                                                snapshot,
+                                                jsn_mission)
+            future = e.submit(trace,
+                              i,
+                              sandbox_factory,
+                              jsn_mission,
+                              num_repeats,
+                              dir_output,
+                              collect_coverage,
+                              dedup,
+                              sampling,
+                              fmt,
+                              journal is not None)
+            futures[future] = i
+            return future
+
         try:
-            for i, jsn_mission in enumerate(jsn_missions):
-                logger.debug("submitting mission %d", i)
-                sandbox_factory = functools.partial(build_sandbox,
-                                                    client_bugzoo,
-                                                    snapshot,
-                                                    jsn_mission)
-                future = e.submit(trace,
-                                  i,
-                                  sandbox_factory,
-                                  jsn_mission,
-                                  num_repeats,
-                                  dir_output,
-                                  collect_coverage)
-                futures.append(future)
+            for i, mission in enumerate(missions):
+                if journal and not journal.should_run(mission, retry_policy):
+                    logger.info("skipping mission %d: recorded by journal", i)
+                    continue
+                submit(i)
 
             logger.debug("submitted all missions")
             logger.debug("waiting for missions to complete")
-            concurrent.futures.wait(futures)
+            pending = set(futures)
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                if not journal:
+                    continue
+                for future in done:
+                    i = futures[future]
+                    mission = missions[i]
+                    status, time_elapsed = future.result()
+                    journal.record(mission, status, time_elapsed)
+                    if status != JournalEntry.CRASHED:
+                        continue
+                    if journal.should_run(mission, retry_policy):
+                        logger.info("retrying mission %d", i)
+                        pending.add(submit(i))
+                    else:
+                        remove_partial(dir_output, mission.digest)
             logger.debug("finished executing all missions")
         except KeyboardInterrupt:
             logger.info("Received keyboard interrupt. Shutting down...")
@@ -193,6 +350,23 @@ if __name__ == '__main__':
         jsn = json.load(f)
     jsn_missions = [json.dumps(m) for m in jsn]
 
-    with bugzoo.server.ephemeral() as client_bugzoo:
-        snapshot = client_bugzoo.bugs[args.snapshot]
-        build_traces(client_bugzoo, snapshot, jsn_missions, num_threads, num_repeats, args.output, collect_coverage)
+    journal = None  # type: Optional[CampaignJournal]
+    retry_policy = RetryPolicy(max_attempts=args.attempts)
+    if args.journal:
+        journal = CampaignJournal(args.journal)
+
+    sampling = None  # type: Optional[SamplingPolicy]
+    if args.sample_rate:
+        sampling = FixedRateSampling(args.sample_rate)
+    elif args.max_gap:
+        sampling = MaxGapSampling(args.max_gap)
+    elif args.last_state_only:
+        sampling = LastStatePerCommand()
+
+    try:
+        with bugzoo.server.ephemeral() as client_bugzoo:
+            snapshot = client_bugzoo.bugs[args.snapshot]
+            build_traces(client_bugzoo, snapshot, jsn_missions, num_threads, num_repeats, args.output, collect_coverage, args.reuse_containers, journal, retry_policy, args.dedup, sampling, args.format)
+    finally:
+        if journal:
+            journal.close()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 __all__ = ['compare_traces']
 
-from typing import Tuple, List, Tuple, Set, Type
+from typing import Any, Dict, Tuple, List, Tuple, Set, Type
 import argparse
 import logging
 import json
@@ -15,6 +15,8 @@ from houston import System
 from houston.exceptions import HoustonException
 from houston import Mission, MissionTrace, State
 from houston.state import Variable
+from houston.tracefile import TraceFile, is_trace_file, is_trace_stream, \
+    read_trace_stream
 
 logger = logging.getLogger("houston")  # type: logging.Logger
 logger.setLevel(logging.DEBUG)
@@ -243,6 +245,12 @@ def parse_args():
 def load_file(fn: str) -> Tuple[Mission, List[MissionTrace]]:
     system = System.get_by_name('arducopter')
     try:
+        if is_trace_file(fn):
+            trace_file = TraceFile(fn, SYSTEM)
+            return (trace_file.mission, trace_file.traces())
+        if is_trace_stream(fn):
+            mission, traces = read_trace_stream(fn, SYSTEM)
+            return (mission, list(traces))
         with open(fn, 'r') as f:
             jsn = json.load(f)
             mission = Mission.from_dict(jsn['mission'])
@@ -257,6 +265,15 @@ def load_file(fn: str) -> Tuple[Mission, List[MissionTrace]]:
         raise
 
 
+def load_trace_dicts(fn: str) -> List[Dict[str, Any]]:
+    """
+    Loads the traces within a given trace file, in any of its formats, in
+    their dictionary form.
+    """
+    _, traces = load_file(fn)
+    return [t.to_dict() for t in traces]
+
+
 def main():
     args = parse_args()
     setup_logging(args.verbose)
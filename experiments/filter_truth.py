@@ -46,7 +46,8 @@ def validate_truth(dir_oracle: str, fn_trace: str) -> bool:
 def filter_truth_traces(dir_oracle: str,
                         threads: int) -> List[str]:
     trace_filenames = \
-        [fn for fn in os.listdir(dir_oracle) if fn.endswith('.json')]
+        [fn for fn in os.listdir(dir_oracle)
+         if fn.endswith('.json') or fn.endswith('.trace')]
     valid_traces = []
     futures = []
     with concurrent.futures.ProcessPoolExecutor(threads) as e:
@@ -24,6 +24,7 @@ from bugzoo import BugZoo as BugZooDaemon
 from bugzoo.core import FileLineSet
 from houston import System
 from houston.mission import Mission
+from houston.pool import SandboxPool
 from houston.trace import CommandTrace, MissionTrace
 from houston.ardu.copter import ArduCopter
 
@@ -226,11 +227,25 @@ def process_mutation(system: Type[System],
 
     # build an ephemeral image for the mutant
     try:
-        with build_mutant_snapshot(client_bugzoo, snapshot_orig, coverage, diff) as snapshot:
+        with contextlib.ExitStack() as stack:
+            snapshot = stack.enter_context(build_mutant_snapshot(client_bugzoo, snapshot_orig, coverage, diff))
+
+            # coverage must be collected from a fresh container, but otherwise
+            # a single warm container is reused across the mutant's missions
+            pool = None  # type: Optional[SandboxPool]
+            if not coverage:
+                pool = stack.enter_context(SandboxPool(client_bugzoo, snapshot, 1))
 
             def obtain_trace(mission: houston.Mission) -> MissionTrace:
-                jsn_mission = json.dumps(mission.to_dict())  # FIXME hack
-                with build_sandbox(client_bugzoo, snapshot, jsn_mission, False) as sandbox:
+                if pool:
+                    sandbox_cm = pool.lease(sandbox_cls,
+                                            mission.initial_state,
+                                            mission.environment,
+                                            mission.configuration)
+                else:
+                    jsn_mission = json.dumps(mission.to_dict())  # FIXME hack
+                    sandbox_cm = build_sandbox(client_bugzoo, snapshot, jsn_mission, False)
+                with sandbox_cm as sandbox:
                     return sandbox.run_and_trace(mission.commands, coverage)
 
             for fn_trace in trace_filenames:
@@ -1,6 +1,5 @@
 import logging
 import os
-import json
 import csv
 import concurrent.futures
 import random
@@ -8,6 +7,7 @@ import random
 import argparse
 from ruamel.yaml import YAML
 
+from compare_traces import load_trace_dicts
 from filter_truth import filter_truth_traces, VALID_LIST_OUTPUT
 
 logger = logging.getLogger('houston')  # type: logging.Logger
@@ -47,13 +47,13 @@ def setup_arg_parser():
 
 
 def transform_data(name, data_dir, output_dir, ignore_cat, separate_params):
-    m_hash = name[:-len('.json')]
+    m_hash = os.path.splitext(name)[0]
     filename = os.path.join(data_dir, name)
-    with open(filename, 'r') as f:
-        j = json.load(f)
+    # the trace file may be JSON, a binary trace file, or a trace stream
+    traces = load_trace_dicts(filename)
     index = 0
     trace_commands = None
-    for t in j['traces']:
+    for t in traces:
         if t['commands']:
             trace_commands = t['commands']
             break
@@ -1,5 +1,4 @@
 import os
-import json
 import csv
 import yaml
 import logging
@@ -9,6 +8,7 @@ import argparse
 from ruamel.yaml import YAML
 
 from ground_truth import DatabaseEntry
+from compare_traces import load_trace_dicts
 from filter_truth import filter_truth_traces, VALID_LIST_OUTPUT
 
 logger = logging.getLogger('houston')  # type: logging.Logger
@@ -149,9 +149,7 @@ this_invocation_nonce
     index = 1
     fn_to_nonce = {}
     for filename in traces:
-        with open(filename, 'r') as f:
-            j = json.load(f)
-        traces = [t for t in j['traces'] if t['commands']]
+        traces = [t for t in load_trace_dicts(filename) if t['commands']]
         nonces = []
         for c in traces[0]['commands']:
             nonce = str(index)
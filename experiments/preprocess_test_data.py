@@ -1,6 +1,5 @@
 import logging
 import os
-import json
 import csv
 import concurrent.futures
 import random
@@ -8,6 +7,7 @@ import random
 import argparse
 from ruamel.yaml import YAML
 
+from compare_traces import load_trace_dicts
 from filter_truth import filter_truth_traces, VALID_LIST_OUTPUT
 
 logger = logging.getLogger('houston')  # type: logging.Logger
@@ -45,13 +45,11 @@ def setup_arg_parser():
 
 
 def transform_data(name, output_dir, ignore_cat, separate_params):
-    m_hash = os.path.basename(name)[:-len('.json')]
+    m_hash = os.path.splitext(os.path.basename(name))[0]
     filename = name
-    with open(filename, 'r') as f:
-        j = json.load(f)
     index = 0
     trace_commands = None
-    for t in j['traces']:
+    for t in load_trace_dicts(filename):
         if t['commands']:
             trace_commands = t['commands']
             break
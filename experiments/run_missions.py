@@ -41,8 +41,8 @@ def setup_arg_parser():
                         help='path to json file containing the missions')
     parser.add_argument('--coverage', default=False, action="store_true",
                         help='if given fault localization will be done at the end.')
-    parser.add_argument('--not_record', default=True, action="store_false",
-                        help='if given the results will not be recorded.')
+    parser.add_argument('--not_record', default=False, action="store_true",
+                        help='deprecated: has no effect, since results are no longer recorded.')
     parser.add_argument('--threads', default=5,
                         help='number of threads to be used for this run.')
     args = parser.parse_args()
@@ -59,7 +59,7 @@ def run_single_mission_with_coverage(sandbox, mission):
     print(coverage)
 
 ### Run all missions stored in a JSON file
-def run_all_missions(bz, snapshot_name, sut, mission_file, coverage=False, record=True, threads=5):
+def run_all_missions(bz, snapshot_name, sut, mission_file, coverage=False, record=False, threads=5):
     missions = []
     with open(mission_file, "r") as f:
         missions_json = json.load(f)
@@ -110,7 +110,10 @@ def run_all_missions(bz, snapshot_name, sut, mission_file, coverage=False, recor
 if __name__ == "__main__":
     setup_logging()
     args = setup_arg_parser()
+    if args.not_record:
+        logging.getLogger('houston').warning(
+            "--not_record is deprecated and has no effect: results are no longer recorded")
     bz = BugZoo()
 
     run_all_missions(bz, args.snapshot, sut, args.input_file, args.coverage,
-                     args.not_record, args.threads)
+                     threads=args.threads)
@@ -4,7 +4,6 @@ import subprocess
 import pexpect
 import tempfile
 import os
-import json
 import csv
 import attr
 import functools
@@ -17,7 +16,7 @@ import concurrent.futures
 from ruamel.yaml import YAML
 
 from ground_truth import DatabaseEntry
-from compare_traces import load_file
+from compare_traces import load_file, load_trace_dicts
 from hash_mutants import mutation_to_uid
 
 from enum import Enum
@@ -210,12 +209,11 @@ def verify_entry(entry: DatabaseEntry,
                  model_checking) -> NewDatabaseEntry:
     all_data = []
     for oracle_fn, trace_fn in entry.fn_inconsistent_traces:
-        with open(oracle_fn, 'r') as f:
-            gt_data = json.load(f)
-        with open(trace_fn, 'r') as f:
-            test_data = json.load(f)
-        all_data.append({'mu': test_data['traces'],
-                         'gt': [t for t in gt_data['traces'] if t['commands']]})
+        # trace files may be JSON, binary trace files, or trace streams
+        gt_traces = load_trace_dicts(oracle_fn)
+        test_traces = load_trace_dicts(trace_fn)
+        all_data.append({'mu': test_traces,
+                         'gt': [t for t in gt_traces if t['commands']]})
 
     logger.info("Len all_data: %d", len(all_data))
     cmd_based_dict, result = parse_data(all_data)
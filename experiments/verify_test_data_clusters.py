@@ -4,7 +4,6 @@ import subprocess
 import pexpect
 import tempfile
 import os
-import json
 import csv
 import yaml
 import attr
@@ -19,7 +18,7 @@ import concurrent.futures
 from ruamel.yaml import YAML
 
 from ground_truth import DatabaseEntry
-from compare_traces import load_file
+from compare_traces import load_file, load_trace_dicts
 from hash_mutants import mutation_to_uid
 from filter_truth import VALID_LIST_OUTPUT
 
@@ -132,25 +131,23 @@ def verify_entry(entry: List[Tuple],
                  model_checking) -> NewDatabaseEntry:
     pairs = []
     for oracle_fn, trace_fn in entry:
-        with open(oracle_fn, 'r') as f:
-            gt_data = json.load(f)
-            name = os.path.basename(oracle_fn)[:-len(".json")]
-            for t in gt_data['traces']:
-                if t['commands']:
-                    res = model_checking(t['commands'], name=name)
-                    break
-            if not res:
-                logger.error("WTF")
-                raise Exception
-            oracle = VerifiedEntry(oracle_fn, res)
-        with open(trace_fn, 'r') as f:
-            test_data = json.load(f)
-            name = os.path.basename(trace_fn)[:-len(".json")]
-            res = model_checking(test_data['traces'][0]['commands'], name=name)
-            if not res:
-                logger.error("WTF2")
-                raise Exception
-            trace = VerifiedEntry(trace_fn, res)
+        gt_traces = load_trace_dicts(oracle_fn)
+        name = os.path.splitext(os.path.basename(oracle_fn))[0]
+        for t in gt_traces:
+            if t['commands']:
+                res = model_checking(t['commands'], name=name)
+                break
+        if not res:
+            logger.error("WTF")
+            raise Exception
+        oracle = VerifiedEntry(oracle_fn, res)
+        test_traces = load_trace_dicts(trace_fn)
+        name = os.path.splitext(os.path.basename(trace_fn))[0]
+        res = model_checking(test_traces[0]['commands'], name=name)
+        if not res:
+            logger.error("WTF2")
+            raise Exception
+        trace = VerifiedEntry(trace_fn, res)
         pairs.append((oracle, trace))
 
     logger.info("Len pairs: %d", len(pairs))
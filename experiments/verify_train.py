@@ -4,7 +4,6 @@ import subprocess
 import pexpect
 import tempfile
 import os
-import json
 import csv
 import attr
 import functools
@@ -17,7 +16,7 @@ import concurrent.futures
 from ruamel.yaml import YAML
 
 from ground_truth import DatabaseEntry
-from compare_traces import load_file
+from compare_traces import load_file, load_trace_dicts
 from filter_truth import VALID_LIST_OUTPUT
 from hash_mutants import mutation_to_uid
 from verify_test_data import VerifiedEntry, Status,\
@@ -78,10 +77,9 @@ def setup_arg_parser():
 def verify_entry(oracle_fn,
                  model_checking) -> NewDatabaseEntry:
     all_data = []
-    with open(oracle_fn, 'r') as f:
-        gt_data = json.load(f)
+    gt_traces = load_trace_dicts(oracle_fn)
     all_data.append({'mu': [],
-                    'gt': [t for t in gt_data['traces'] if t['commands']]})
+                    'gt': [t for t in gt_traces if t['commands']]})
 
     logger.info("Len all_data: %d", len(all_data))
     cmd_based_dict, result = parse_data(all_data)
@@ -1,7 +1,8 @@
 __all__ = ['MAVLinkMessage', 'CommandLong', 'MAVLinkConnection']
 
 import logging
-from typing import Any, List, Callable, Dict
+from typing import Any, List, Callable, Dict, FrozenSet, Iterable, \
+    Optional
 import pymavlink
 from pymavlink.mavutil import mavlink
 import attr
@@ -69,32 +70,73 @@ class MAVLinkConnection(Connection[MAVLinkGeneralMessage]):
     def __init__(self,
                  url: str,
                  hooks: HOOK_TYPE = None,
-                 timeout: int = 30
+                 timeout: int = 30,
+                 *,
+                 filters: Optional[Dict[str, Iterable[str]]] = None,
+                 queue_size: Optional[int] = None
                  ) -> None:
-        super().__init__(hooks)
-        self.__conn = dronekit.connect(url,
-                                       wait_ready=False,
-                                       heartbeat_timeout=0)
-        self.__conn.wait_ready(True,
-                               timeout=timeout,
-                               raise_exception=True)
+        """
+        Establishes a connection to the vehicle at a given URL. Hooks may be
+        restricted to given MAVLink message names using filters, and may be
+        called by a worker thread by providing a queue size (see Connection).
+
+        The connection only listens for the messages that are received by
+        at least one hook, and listens for all messages only if there is a
+        hook without a filter. Messages that are not received by any hook
+        are discarded by dronekit before they are wrapped.
+        """
+        self.__conn = None
+        self.__listening = frozenset()  # type: FrozenSet[str]
+        super().__init__(hooks, filters=filters, queue_size=queue_size)
+        conn = dronekit.connect(url,
+                                wait_ready=False,
+                                heartbeat_timeout=0)
+        conn.wait_ready(True,
+                        timeout=timeout,
+                        raise_exception=True)
         # wait for the dronekit to properly set home_location
         # and autopilot_version
-        self.__conn.wait_ready('autopilot_version',
-                               'home_location',
-                               timeout=timeout,
-                               raise_exception=True)
-
-        def recv(vehicle, name: str, message):  # FIXME external types
-            m = MAVLinkMessage(name, message)
-            self.receive(m)
-
-        self.__conn.add_message_listener('*', recv)
+        conn.wait_ready('autopilot_version',
+                        'home_location',
+                        timeout=timeout,
+                        raise_exception=True)
+        self.__conn = conn
+        self._subscribe()
+
+    def _recv(self, vehicle, name: str, message) -> None:  # FIXME types
+        self.receive(MAVLinkMessage(name, message))
+
+    def _subscribe(self) -> None:
+        """
+        Updates the message listeners of the underlying dronekit connection
+        to match the subscriptions of the hooks. New listeners are added
+        before stale listeners are removed, so that no message is missed.
+        """
+        if self.__conn is None:
+            return
+        subscriptions = self.subscriptions()
+        if subscriptions is None:
+            names = frozenset(['*'])
+        else:
+            names = subscriptions
+        for name in names - self.__listening:
+            self.__conn.add_message_listener(name, self._recv)
+        for name in self.__listening - names:
+            self.__conn.remove_message_listener(name, self._recv)
+        self.__listening = names
+
+    def _on_hooks_changed(self) -> None:
+        self._subscribe()
 
     @property
     def conn(self):
         return self.__conn
 
+    def _message_type(self, message: MAVLinkGeneralMessage) -> Optional[str]:
+        if isinstance(message, MAVLinkMessage):
+            return message.name
+        return None
+
     def send(self, message: MAVLinkGeneralMessage) -> None:
         mav = self.__conn.message_factory
         if isinstance(message, CommandLong):
@@ -113,3 +155,4 @@ class MAVLinkConnection(Connection[MAVLinkGeneralMessage]):
     def close(self):
         if self.conn:
             self.conn.close()
+        self._stop_worker()
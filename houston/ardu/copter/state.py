@@ -1,8 +1,10 @@
 __all__ = ['State']
 
+from typing import Dict, Tuple
+
 from ..connection import MAVLinkMessage, MAVLinkConnection
 from ...state import State as BaseState
-from ...state import var
+from ...state import var, Variable
 
 # These are the messages we should later listen to
 IMPORTANT_MESSAGE_NAMES = [
@@ -15,6 +17,21 @@ IMPORTANT_MESSAGE_NAMES = [
     'HOME_POSITION',
 ]
 
+# the variables whose values may be changed, via dronekit, by each type of
+# MAVLink message; messages of any other type cannot change the state
+VARIABLES_BY_MESSAGE = {
+    'GLOBAL_POSITION_INT': ('altitude', 'latitude', 'longitude',
+                            'vx', 'vy', 'vz'),
+    'ATTITUDE': ('pitch', 'yaw', 'roll'),
+    'VFR_HUD': ('heading', 'airspeed', 'groundspeed'),
+    'GPS_RAW_INT': ('armable',),
+    'EKF_STATUS_REPORT': ('armable', 'ekf_ok'),
+    'HEARTBEAT': ('armed', 'mode', 'armable', 'ekf_ok'),
+    'HOME_POSITION': ('home_latitude', 'home_longitude'),
+    'MISSION_ITEM': ('home_latitude', 'home_longitude'),
+    'WAYPOINT': ('home_latitude', 'home_longitude')
+}  # type: Dict[str, Tuple[str, ...]]
+
 
 class State(BaseState):
     home_latitude = var(float,
@@ -48,13 +65,32 @@ class State(BaseState):
 #    throttle_channel = var(float, lambda c: c.conn.channels['3'])
 #    roll_channel = var(float, lambda c: c.conn.channels['1'])
 
+    message_types = frozenset(VARIABLES_BY_MESSAGE)
+
     def evolve(self,
                message: MAVLinkMessage,
                time_offset: float,
                connection: MAVLinkConnection
                ) -> 'State':
-        values = {name: v.read(connection)
-                  for (name, v) in self.variables.items()}
-        values['time_offset'] = time_offset
-        state_new = self.__class__(**values)
-        return state_new
+        """
+        Creates a new state from this state by re-reading only those
+        variables that may have been changed by the received message. If
+        the message cannot change any variables, this state is returned.
+        """
+        try:
+            dirty = _DIRTY_VARIABLES[message.name]
+        except (AttributeError, KeyError):
+            return self
+        values = list(self._values)
+        values[0] = time_offset
+        for index, variable in dirty:
+            values[index] = variable.read(connection)
+        return self.__class__._make(values)
+
+
+# the index and definition of each variable that may be changed by each
+# type of message
+_DIRTY_VARIABLES = {
+    name: tuple((State._indices[v], State.variables[v]) for v in names)
+    for (name, names) in VARIABLES_BY_MESSAGE.items()
+}  # type: Dict[str, Tuple[Tuple[int, Variable], ...]]
@@ -0,0 +1,129 @@
+__all__ = ['ReadinessMonitor']
+
+from typing import Dict, FrozenSet, Tuple
+from timeit import default_timer as timer
+import logging
+import threading
+
+import dronekit
+from pymavlink.mavutil import mavlink
+
+from .connection import MAVLinkGeneralMessage, MAVLinkMessage
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+
+def ekf_ok(flags: int) -> bool:
+    """
+    Determines whether the flags of an EKF_STATUS_REPORT message indicate
+    that the EKF is healthy enough for an unarmed vehicle to be armed.
+    Mirrors the check performed by `dronekit.Vehicle.ekf_ok`.
+    """
+    attitude = flags & mavlink.EKF_ATTITUDE
+    pos_horiz_abs = flags & mavlink.EKF_POS_HORIZ_ABS
+    pred_pos_horiz_abs = flags & mavlink.EKF_PRED_POS_HORIZ_ABS
+    const_pos_mode = flags & mavlink.EKF_CONST_POS_MODE
+    has_position = pos_horiz_abs or pred_pos_horiz_abs
+    return bool(attitude and has_position and not const_pos_mode)
+
+
+class ReadinessMonitor(object):
+    """
+    Observes the MAVLink messages that are sent by a vehicle during startup
+    to determine when it has completed each of its readiness phases:
+
+        gps_fix: a GPS_RAW_INT message reports (at least) a 3D fix.
+        ekf: an EKF_STATUS_REPORT message reports a healthy EKF.
+        home: a HOME_POSITION message has been received.
+
+    The time at which each phase was reached, measured from the creation of
+    the monitor, is recorded and logged.
+    """
+    PHASES = ('gps_fix', 'ekf', 'home')  # type: Tuple[str, ...]
+    # the names of the messages that are observed by the monitor
+    MESSAGE_NAMES = frozenset({'GPS_RAW_INT',
+                               'EKF_STATUS_REPORT',
+                               'HOME_POSITION'})  # type: FrozenSet[str]
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__ready = threading.Condition(self.__lock)
+        self.__time_start = timer()
+        self.__timings = {}  # type: Dict[str, float]
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        The number of seconds taken to reach each of the completed phases.
+        """
+        with self.__lock:
+            return dict(self.__timings)
+
+    @property
+    def pending(self) -> FrozenSet[str]:
+        """
+        The set of phases that have not yet been reached.
+        """
+        with self.__lock:
+            return frozenset(p for p in self.PHASES if p not in self.__timings)
+
+    @property
+    def ready(self) -> bool:
+        return not self.pending
+
+    def _reached(self, phase: str) -> None:
+        with self.__lock:
+            if phase in self.__timings:
+                return
+            duration = timer() - self.__time_start
+            self.__timings[phase] = duration
+            self.__ready.notify_all()
+        logger.debug("vehicle reached readiness phase [%s] after %.3f seconds",
+                     phase, duration)
+
+    def observe(self, message: MAVLinkGeneralMessage) -> None:
+        """
+        Updates the readiness of the vehicle using a message received from
+        it. Intended to be attached as a hook to a MAVLink connection.
+        """
+        if not isinstance(message, MAVLinkMessage):
+            return
+        name = message.name
+        msg = message.message
+        if name == 'GPS_RAW_INT':
+            if msg.fix_type >= mavlink.GPS_FIX_TYPE_3D_FIX:
+                self._reached('gps_fix')
+        elif name == 'EKF_STATUS_REPORT':
+            if ekf_ok(msg.flags):
+                self._reached('ekf')
+        elif name == 'HOME_POSITION':
+            self._reached('home')
+
+    def observe_vehicle(self, vehicle: dronekit.Vehicle) -> None:
+        """
+        Updates the readiness of the vehicle using the attributes that
+        dronekit has already collected from it. Used to account for any
+        messages that were received before the monitor was attached to the
+        connection.
+        """
+        gps = vehicle.gps_0
+        if gps and gps.fix_type and gps.fix_type >= 3:
+            self._reached('gps_fix')
+        if vehicle.ekf_ok:
+            self._reached('ekf')
+        if vehicle.home_location is not None:
+            self._reached('home')
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Blocks until the vehicle has reached all of its readiness phases, or
+        until a given number of seconds have elapsed.
+
+        Returns:
+            True if the vehicle is ready, or False if the timeout was reached.
+        """
+        with self.__ready:
+            return self.__ready.wait_for(
+                lambda: all(p in self.__timings for p in self.PHASES),
+                timeout)
@@ -1,9 +1,8 @@
-from typing import Optional, Sequence
+from typing import Dict, List, Optional, Sequence
 import time
 import shlex
 from timeit import default_timer as timer
 import os
-import sys
 import threading
 import logging
 
@@ -14,12 +13,13 @@ from pymavlink import mavutil
 
 from .home import HomeLocation
 from .connection import CommandLong, MAVLinkConnection, MAVLinkMessage
+from .readiness import ReadinessMonitor
 from ..util import Stopwatch
 from ..sandbox import Sandbox as BaseSandbox
 from ..command import Command, CommandOutcome
 from ..connection import Message
 from ..mission import MissionOutcome
-from ..trace import MissionTrace, CommandTrace, TraceRecorder
+from ..trace import MissionTrace, CommandTrace, TraceRecorder, SamplingPolicy
 from ..exceptions import NoConnectionError, \
     ConnectionLostError, \
     PostConnectionSetupFailed, \
@@ -30,6 +30,11 @@ logger.setLevel(logging.DEBUG)
 
 TIME_LOST_CONNECTION = 5.0
 
+# the names of the messages that are used to track the progress of a mission
+MISSION_MESSAGE_NAMES = frozenset({'MISSION_ITEM_REACHED',
+                                   'MISSION_CURRENT',
+                                   'MISSION_ACK'})
+
 
 def detect_lost_connection(f):
     """
@@ -53,8 +58,12 @@ class Sandbox(BaseSandbox):
                  ) -> None:
         super().__init__(*args, **kwargs)
         self.__connection = None
-        self.__sitl_thread = None
+        self.__docker_api = None
+        self.__sitl_exec_id = None  # type: Optional[str]
+        self.__verbose = False
         self.__fn_log = None  # type: Optional[str]
+        self.__log_offset = 0
+        self.__startup_timings = {}  # type: Dict[str, float]
         if home:
             self.__home = home
         else:
@@ -67,6 +76,14 @@ class Sandbox(BaseSandbox):
     def home(self) -> HomeLocation:
         return self.__home
 
+    @property
+    def startup_timings(self) -> Dict[str, float]:
+        """
+        The number of seconds that it took, following the launch of the SITL,
+        for the vehicle to reach each of its readiness phases during startup.
+        """
+        return dict(self.__startup_timings)
+
     @property
     def connection(self,
                    raise_exception: bool = True
@@ -105,14 +122,44 @@ class Sandbox(BaseSandbox):
         assert self.__fn_log, "no log file created for sandbox."
         return self._bugzoo.files.read(self.container, self.__fn_log)
 
+    def tail_logs(self, complete: bool = True) -> List[str]:
+        """
+        Returns the lines that were written to the log file for this sandbox
+        since the last call to this method (or since the SITL was launched).
+        May be called whilst the SITL is running to follow its output. If
+        complete is set, a final line that has not yet been terminated is
+        left to be returned by a later call.
+        """
+        assert self.__fn_log, "no log file created for sandbox."
+        cmd = 'tail -c +{} {}'.format(self.__log_offset + 1,
+                                      shlex.quote(self.__fn_log))
+        output = self._bugzoo.containers.command(self.container, cmd).output
+        if complete:
+            output = output[:output.rfind('\n') + 1]
+        self.__log_offset += len(output.encode('utf-8'))
+        return output.splitlines()
+
+    def _log_sitl_output(self, complete: bool = True) -> None:
+        """
+        Writes any new output of the SITL to the logger, if verbose.
+        """
+        if self.__verbose and self.__fn_log:
+            for line in self.tail_logs(complete):
+                logger.getChild('SITL').debug(line)
+
     def update(self, message: Message) -> None:
         with self.__state_lock:
             state = self.__state.evolve(message,
                                         self.running_time,
                                         self.connection)
-            self.__state = state
+            # messages that cannot change the state are only recorded
+            changed = state is not self.__state
+            if changed:
+                self.__state = state
+                self.__state_changed.notify_all()
             if self.recorder:
-                self.recorder.record_state(state)
+                if changed:
+                    self.recorder.record_state(state)
                 self.recorder.record_message(message)
 
     def _launch_sitl(self,
@@ -122,13 +169,17 @@ class Sandbox(BaseSandbox):
                      verbose: bool = True
                      ) -> None:
         """
-        Launches the SITL inside the sandbox and blocks until its execution
-        has finished.
+        Launches the SITL inside the sandbox without waiting for it to
+        finish. The output of the SITL is written to a log file inside the
+        container; if verbose is set, the new contents of that log are
+        written to the logger after each command of a traced mission, and
+        once the SITL has been stopped (see tail_logs).
         """
         bzc = self._bugzoo.containers
 
         # generate a temporary log file for the SITL
         self.__fn_log = bzc.mktemp(self.container)
+        self.__log_offset = 0
         logger.debug("writing SITL output to: %s", self.__fn_log)
 
         name_bin = os.path.join("/opt/ardupilot/build/sitl/bin",  # FIXME
@@ -137,6 +188,8 @@ class Sandbox(BaseSandbox):
         home = str(self.home)
         cmd = '{} --model "{}" --speedup "{}" --home "{}" --defaults "{}"'
         cmd = cmd.format(name_bin, name_model, speedup, home, fn_param)
+        if self.wipe:
+            cmd = '{} --wipe'.format(cmd)
         cmd = '{} >& {}'.format(cmd, shlex.quote(self.__fn_log))
 
         # add SITL prefix
@@ -149,6 +202,8 @@ class Sandbox(BaseSandbox):
         cmd = "/bin/bash -c {}".format(shlex.quote(cmd))
         logger.debug("wrapped command: %s", cmd)
 
+        # the SITL is executed in a detached session, rather than by a
+        # dedicated thread that blocks until the SITL has finished
         docker_client = docker.from_env()  # FIXME
         docker_api = docker_client.api
         resp = docker_api.exec_create(self.container.id,
@@ -156,13 +211,31 @@ class Sandbox(BaseSandbox):
                                       tty=True,
                                       stdout=True,
                                       stderr=True)
-        output = docker_api.exec_start(resp['Id'], stream=verbose)
+        docker_api.exec_start(resp['Id'], detach=True)
+        self.__docker_api = docker_api
+        self.__sitl_exec_id = resp['Id']
+        self.__verbose = verbose
         logger.debug("started SITL")
-        if verbose:
-            for line in output:
-                line = line.decode(sys.stdout.encoding).rstrip('\n')
-                logger.getChild('SITL').debug(line)
-            logger.debug("SITL finished")
+
+    def _wait_for_sitl(self, timeout: float = 30.0) -> bool:
+        """
+        Blocks until the SITL has finished, or until a given number of
+        seconds have elapsed.
+
+        Returns:
+            True if the SITL has finished, or False if the timeout was
+            reached.
+        """
+        if not self.__sitl_exec_id:
+            return True
+        stopwatch = Stopwatch()
+        stopwatch.start()
+        while stopwatch.duration < timeout:
+            info = self.__docker_api.exec_inspect(self.__sitl_exec_id)
+            if not info['Running']:
+                return True
+            time.sleep(0.05)
+        return False
 
     @detect_lost_connection
     def start(self,
@@ -193,11 +266,8 @@ class Sandbox(BaseSandbox):
         timeout_mavlink = 60
 
         bzc = self._bugzoo.containers
-        args = (binary_name, model_name, param_file, verbose)
-        self.__sitl_thread = threading.Thread(target=self._launch_sitl,
-                                              args=args)
-        self.__sitl_thread.daemon = True
-        self.__sitl_thread.start()
+        readiness = ReadinessMonitor()
+        self._launch_sitl(binary_name, model_name, param_file, verbose)
 
         # establish connection
         protocol = 'tcp'
@@ -205,12 +275,35 @@ class Sandbox(BaseSandbox):
         ip = str(bzc.ip_address(self.container))
         url = "{}:{}:{}".format(protocol, ip, port)
         logger.debug("connecting to SITL at %s", url)
+        # only listen for the messages that are used by the hooks
+        filters = {'readiness': readiness.MESSAGE_NAMES}
+        message_types = self.state_initial.__class__.message_types
+        if message_types is not None:
+            filters['update'] = message_types
         try:
-            self.__connection = MAVLinkConnection(url,
-                                                  {'update': self.update},
-                                                  timeout=timeout_mavlink)
+            self.__connection = \
+                MAVLinkConnection(url,
+                                  {'update': self.update,
+                                   'readiness': readiness.observe},
+                                  timeout=timeout_mavlink,
+                                  filters=filters)
         except dronekit.APIException:
             raise NoConnectionError
+
+        # wait for a 3D fix, a healthy EKF, and a home position
+        readiness.observe_vehicle(self.vehicle)
+        if 'home' in readiness.pending:
+            msg = CommandLong(0, 0, mavutil.mavlink.MAV_CMD_GET_HOME_POSITION)
+            self.connection.send(msg)
+        is_ready = readiness.wait(timeout_3d_fix)
+        self.connection.remove_hook('readiness')
+        self.__startup_timings = readiness.timings
+        logger.info("vehicle readiness timings: %s", self.__startup_timings)
+        if not is_ready:
+            logger.error("vehicle failed to reach readiness phases: %s",
+                         ', '.join(sorted(readiness.pending)))
+            raise VehicleNotReadyError
+
         # wait for longitude and latitude to match their expected values, and
         # for the system to match the expected `armable` state.
         initial_lon = self.state_initial['longitude']
@@ -218,9 +311,6 @@ class Sandbox(BaseSandbox):
         initial_armable = self.state_initial['armable']
         v = self.state_initial.__class__.variables
 
-        # FIXME wait for 3D fix
-        time.sleep(timeout_3d_fix)
-
         stopwatch.reset()
         stopwatch.start()
         while True:
@@ -277,9 +367,12 @@ class Sandbox(BaseSandbox):
                 logger.debug("killed process: %s", pid)
                 break
         logger.debug("Killed it")
-        logger.debug("Joining thread")
-        self.__sitl_thread.join()
-        logger.debug("Joined")
+        logger.debug("Waiting for SITL to finish")
+        if not self._wait_for_sitl():
+            logger.error("SITL failed to finish within timeout")
+        else:
+            logger.debug("SITL finished")
+        self._log_sitl_output(complete=False)
 #       cmd = 'ps aux | grep -i sitl | awk {\'"\'"\'print $2\'"\'"\'} | xargs kill -2'  # noqa: pycodestyle
 #       bzc.command(self.container, cmd, stdout=False, stderr=False)
 
@@ -292,7 +385,12 @@ class Sandbox(BaseSandbox):
     @detect_lost_connection
     def run_and_trace(self,
                       commands: Sequence[Command],
-                      collect_coverage: bool = False
+                      collect_coverage: bool = False,
+                      sink: 'Optional[TraceSink]' = None,
+                      *,
+                      dedup: Optional[str] = None,
+                      sampling: Optional[SamplingPolicy] = None,
+                      retain: bool = True
                       ) -> 'MissionTrace':
         """
         Executes a mission, represented as a sequence of commands, and
@@ -305,6 +403,17 @@ class Sandbox(BaseSandbox):
                 should be incorporated into the trace. If True (i.e., coverage
                 collection is enabled), this function expects the sandbox to be
                 properly instrumented.
+            sink: an optional trace sink to which the trace is streamed
+                whilst the mission is running. The trace for each command is
+                sealed as soon as the command is completed.
+            dedup: an optional mode of deduplication (see StateBuffer), used
+                to record unchanged states by their time offsets alone.
+            sampling: an optional policy that determines which of the
+                observed states are recorded. The last state of each command
+                is always recorded.
+            retain: if not set, the recorded states are only streamed to the
+                sink, and the returned trace holds the commands, but not the
+                states, that were executed. Requires a sink.
 
         Returns:
             a trace describing the execution of a sequence of commands.
@@ -395,7 +504,9 @@ class Sandbox(BaseSandbox):
                 elif name == 'MISSION_ACK':
                     logger.debug("**MISSION_ACK: %s", message.type)
 
-            self.connection.add_hooks({'check_for_reached': check_for_reached})
+            self.connection.add_hooks(
+                {'check_for_reached': check_for_reached},
+                {'check_for_reached': MISSION_MESSAGE_NAMES})
 
             stopwatch = Stopwatch()
             stopwatch.start()
@@ -417,7 +528,12 @@ class Sandbox(BaseSandbox):
             time_start = timer()
 
             wp_to_traces = {}
-            with self.record() as recorder:
+            if sink:
+                sink.begin_trace()
+            with self.record(sink=sink,
+                             dedup=dedup,
+                             sampling=sampling,
+                             retain=retain) as recorder:
                 while last_wp[0] <= len(cmds) - 1:
                     logger.debug("waiting for command")
                     not_reached_timeout = wp_event.wait(timeout_command)
@@ -444,9 +560,14 @@ class Sandbox(BaseSandbox):
                             cmd = commands[cmd_index]
                             trace = CommandTrace(cmd, states)
                             wp_to_traces[cmd_index] = trace
+                            if sink:
+                                sink.seal(cmd_index, cmd)
+                        elif sink:
+                            sink.discard()
 
                         last_wp[0] = last_wp[1]
                         wp_event.clear()
+                    self._log_sitl_output()
 
             self.connection.remove_hook('check_for_reached')
             logger.debug("Removed hook")
@@ -456,6 +577,8 @@ class Sandbox(BaseSandbox):
                 # if appropriate, store coverage files
                 self.__flush_coverage()
                 coverage = self.__get_coverage()
+            if sink:
+                sink.end_trace(coverage)
 
             traces = [wp_to_traces[k] for k in sorted(wp_to_traces.keys())]
             return MissionTrace(tuple(traces), coverage)
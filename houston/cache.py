@@ -0,0 +1,246 @@
+__all__ = ['OutcomeCache', 'CacheStats']
+
+from typing import Optional, Tuple, Union
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import attr
+from bugzoo import Bug as Snapshot
+
+from .mission import Mission, MissionOutcome
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outcomes (
+    snapshot TEXT NOT NULL,
+    mission TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    num_observations INTEGER NOT NULL,
+    num_passed INTEGER NOT NULL,
+    time_observed REAL NOT NULL,
+    time_used REAL NOT NULL,
+    PRIMARY KEY (snapshot, mission)
+);
+CREATE INDEX IF NOT EXISTS outcomes_time_used ON outcomes (time_used);
+"""
+
+
+@attr.s
+class CacheStats(object):
+    """
+    Describes the usage of an outcome cache.
+    """
+    hits = attr.ib(type=int, default=0)
+    misses = attr.ib(type=int, default=0)
+    untrusted = attr.ib(type=int, default=0)
+    stores = attr.ib(type=int, default=0)
+    evictions = attr.ib(type=int, default=0)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def _snapshot_name(snapshot_or_name: Union[str, Snapshot]) -> str:
+    if isinstance(snapshot_or_name, str):
+        return snapshot_or_name
+    return snapshot_or_name.name
+
+
+class OutcomeCache(object):
+    """
+    A persistent, SQLite-backed cache of mission outcomes, indexed by the
+    name of the snapshot that the mission was run against and the digest
+    of the mission (which covers its configuration, environment, initial
+    state and commands).
+
+    Since the outcomes of missions are not always deterministic, each entry
+    keeps count of the number of times that its mission has been observed
+    to pass or fail. An outcome is only trusted once its mission has been
+    observed at least `min_observations` times, and only if each of those
+    observations agreed on whether the mission passed. Outcomes that were
+    last observed more than `max_age` seconds ago are considered to be
+    stale and are not trusted.
+
+    If `max_entries` is given, the least recently used entries are evicted
+    whenever the cache grows beyond that number of entries.
+    """
+    def __init__(self,
+                 filename: str = ':memory:',
+                 *,
+                 min_observations: int = 1,
+                 max_age: Optional[float] = None,
+                 max_entries: Optional[int] = None
+                 ) -> None:
+        assert min_observations > 0
+        assert max_entries is None or max_entries > 0
+        self.__filename = filename
+        self.__min_observations = min_observations
+        self.__max_age = max_age
+        self.__max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__stats = CacheStats()
+        self.__connection = sqlite3.connect(filename,
+                                            check_same_thread=False)
+        self.__connection.executescript(_SCHEMA)
+        self.__connection.commit()
+
+    def __enter__(self) -> 'OutcomeCache':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            cursor = self.__connection.execute(
+                "SELECT COUNT(*) FROM outcomes")
+            return cursor.fetchone()[0]
+
+    @property
+    def filename(self) -> str:
+        return self.__filename
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        A summary of the usage of this cache since it was opened, or since
+        its statistics were last reset.
+        """
+        with self.__lock:
+            return attr.evolve(self.__stats)
+
+    def reset_stats(self) -> None:
+        with self.__lock:
+            self.__stats = CacheStats()
+
+    def lookup(self,
+               snapshot_or_name: Union[str, Snapshot],
+               mission: Mission
+               ) -> Optional[MissionOutcome]:
+        """
+        Returns the cached outcome of a given mission for a given snapshot,
+        or None if there is no trusted outcome for that mission.
+        """
+        snapshot = _snapshot_name(snapshot_or_name)
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT outcome, num_observations, num_passed, time_observed"
+                " FROM outcomes WHERE snapshot = ? AND mission = ?",
+                (snapshot, mission.digest)).fetchone()
+            if row is None:
+                self.__stats.misses += 1
+                return None
+
+            jsn_outcome, num_observations, num_passed, time_observed = row
+            is_stale = self.__max_age is not None and \
+                time.time() - time_observed > self.__max_age
+            is_consistent = num_passed in (0, num_observations)
+            if is_stale or not is_consistent \
+               or num_observations < self.__min_observations:
+                self.__stats.misses += 1
+                self.__stats.untrusted += 1
+                return None
+
+            self.__connection.execute(
+                "UPDATE outcomes SET time_used = ?"
+                " WHERE snapshot = ? AND mission = ?",
+                (time.time(), snapshot, mission.digest))
+            self.__connection.commit()
+            self.__stats.hits += 1
+
+        return MissionOutcome.from_dict(json.loads(jsn_outcome),
+                                        mission.system.state)
+
+    def observations(self,
+                     snapshot_or_name: Union[str, Snapshot],
+                     mission: Mission
+                     ) -> Tuple[int, int]:
+        """
+        Returns the number of times that a given mission has been observed
+        to pass and to fail, respectively, for a given snapshot, regardless
+        of whether or not those observations are trusted. Stale observations
+        are ignored. Unlike lookups, these queries are not included in the
+        statistics of the cache.
+        """
+        snapshot = _snapshot_name(snapshot_or_name)
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT num_observations, num_passed, time_observed"
+                " FROM outcomes WHERE snapshot = ? AND mission = ?",
+                (snapshot, mission.digest)).fetchone()
+            if row is None:
+                return 0, 0
+            num_observations, num_passed, time_observed = row
+            if self.__max_age is not None and \
+               time.time() - time_observed > self.__max_age:
+                return 0, 0
+            self.__connection.execute(
+                "UPDATE outcomes SET time_used = ?"
+                " WHERE snapshot = ? AND mission = ?",
+                (time.time(), snapshot, mission.digest))
+            self.__connection.commit()
+        return num_passed, num_observations - num_passed
+
+    def store(self,
+              snapshot_or_name: Union[str, Snapshot],
+              mission: Mission,
+              outcome: MissionOutcome
+              ) -> None:
+        """
+        Records an observed outcome of a given mission for a given snapshot.
+        Stale observations of that mission are discarded.
+        """
+        snapshot = _snapshot_name(snapshot_or_name)
+        jsn_outcome = json.dumps(outcome.to_dict())
+        passed = 1 if outcome.passed else 0
+        now = time.time()
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT num_observations, num_passed, time_observed"
+                " FROM outcomes WHERE snapshot = ? AND mission = ?",
+                (snapshot, mission.digest)).fetchone()
+            num_observations, num_passed = 1, passed
+            if row is not None:
+                is_stale = self.__max_age is not None and \
+                    now - row[2] > self.__max_age
+                if not is_stale:
+                    num_observations += row[0]
+                    num_passed += row[1]
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (snapshot, mission.digest, jsn_outcome, num_observations,
+                 num_passed, now, now))
+            self.__stats.stores += 1
+            self._evict()
+            self.__connection.commit()
+
+    def _evict(self) -> None:
+        if self.__max_entries is None:
+            return
+        cursor = self.__connection.execute(
+            "DELETE FROM outcomes WHERE rowid IN"
+            " (SELECT rowid FROM outcomes"
+            "  ORDER BY time_used DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.__max_entries,))
+        if cursor.rowcount > 0:
+            logger.debug("evicted %d outcomes from cache", cursor.rowcount)
+            self.__stats.evictions += cursor.rowcount
+
+    def clear(self) -> None:
+        """
+        Removes all outcomes from this cache.
+        """
+        with self.__lock:
+            self.__connection.execute("DELETE FROM outcomes")
+            self.__connection.commit()
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
@@ -9,9 +9,11 @@ import attr
 
 from .connection import Message
 from .specification import Specification
+from .resolver import SpecificationResolver
 from .configuration import Configuration
 from .state import State
 from .environment import Environment
+from .util import digest
 from .valueRange import ValueRange
 
 logger = logging.getLogger(__name__)   # type: logging.Logger
@@ -42,13 +44,6 @@ class Parameter(Generic[T]):
         """
         return self.values.type
 
-    @property
-    def _field(self) -> str:
-        """
-        The name of the field that stores the value of this parameter.
-        """
-        return "__{}".format(self.name)
-
 
 class CommandMeta(type):
     def __new__(mcl,
@@ -135,11 +130,17 @@ class CommandMeta(type):
         ns['specifications'] = list(specs)
         logger.debug("built specifications")
 
+        # the values of a command are stored as a tuple, in the order in
+        # which its parameters were declared
+        fields = tuple(p.name for p in params)
+        ns['_fields'] = fields
+        ns['_indices'] = {name: i for (i, name) in enumerate(fields)}
+        ns.setdefault('__slots__', ())
+
         logger.debug("constructing properties")
-        for param in params:
-            field = param._field
-            getter = lambda self, f=field: getattr(self, f)
-            ns[param.name] = property(getter)
+        for index, name in enumerate(fields):
+            getter = lambda self, i=index: self._values[i]
+            ns[name] = property(getter)
         logger.debug("constructed properties")
 
         return super().__new__(mcl, cls_name, bases, ns)
@@ -168,8 +169,8 @@ class CommandMeta(type):
             msg = "'uid' field must not be an empty string"
             raise TypeError(tpl_err.format(msg))
 
-        # convert uid to a read-only property
-        ns['uid'] = property(lambda u=uid: u)
+        # store the (possibly generated) uid on the command type
+        cls.uid = uid
 
         # ensure that uid isn't already in use
         if uid in _UID_TO_COMMAND_TYPE:
@@ -180,13 +181,18 @@ class CommandMeta(type):
         _UID_TO_COMMAND_TYPE[uid] = cls
         logger.debug("registered command type [%s] with UID [%s]", cls, uid)
 
+        # each command type has its own specification resolver
+        cls.resolver = SpecificationResolver(cls)
+
         return super().__init__(cls_name, bases, ns)
 
 
 class Command(object, metaclass=CommandMeta):
+    __slots__ = ('_values', '__hash', '__digest')
+
     def __init__(self, *args, **kwargs) -> None:
         cls_name = self.__class__.__name__
-        params = self.__class__.parameters  # type: FrozenSet[Parameter]
+        fields = self.__class__._fields
 
         # were any positional arguments passed to the constructor?
         if args:
@@ -197,26 +203,26 @@ class Command(object, metaclass=CommandMeta):
             raise TypeError(msg)
 
         # set values for each variable
-        for p in params:
-            try:
-                val = kwargs[p.name]
-            except KeyError:
-                msg = "missing keyword argument [{}] to constructor [{}]"
-                msg = msg.format(p.name, cls_name)
-                raise TypeError(msg)
-
-            # TODO perform run-time type checking?
-            setattr(self, p._field, val)
+        # TODO perform run-time type checking?
+        try:
+            self._values = tuple(kwargs[name] for name in fields)
+        except KeyError as err:
+            msg = "missing keyword argument [{}] to constructor [{}]"
+            msg = msg.format(err.args[0], cls_name)
+            raise TypeError(msg)
 
         # did we pass any unexpected keyword arguments?
-        if len(kwargs) > len(params):
+        if len(kwargs) > len(fields):
             actual_args = set(n for n in kwargs)
-            expected_args = set(p.name for p in params)
+            expected_args = set(fields)
             unexpected_arguments = list(actual_args - expected_args)
             msg = "unexpected keyword arguments [{}] supplied to constructor [{}]"  # noqa: pycodestyle
             msg = msg.format('; '.join(unexpected_arguments), cls_name)
             raise TypeError(msg)
 
+        # commands are immutable, so their hash is precomputed
+        self.__hash = hash((self.uid,) + self._values)
+
     @classmethod
     def get_next_allowed(cls, system: Type['System']) -> List[Type['Command']]:
         if not cls.next_allowed:
@@ -232,26 +238,31 @@ class Command(object, metaclass=CommandMeta):
             msg = "illegal comparison of commands: [{}] vs. [{}]"
             msg = msg.format(self.uid, other.uid)
             raise Exception(msg)  # FIXME use HoustonException
-        for param in self.__class__.parameters:
-            if self[param.name] != other[param.name]:
-                return False
-        return True
+        return self._values == other._values
 
     def __getitem__(self, name: str) -> Any:
-        # FIXME use frozendict
         try:
-            params = self.__class__.parameters
-            param = next(p for p in params if p.name == name)
-        except StopIteration:
+            index = self._indices[name]
+        except KeyError:
             msg = "no parameter [{}] in command [{}]"
-            msg.format(name, self.__class__.__name__)
+            msg = msg.format(name, self.__class__.__name__)
             raise KeyError(msg)
-        return getattr(self, param._field)
+        return self._values[index]
 
     def __hash__(self) -> int:
-        params = (self.uid,)
-        params += tuple(self[p.name] for p in self.__class__.parameters)
-        return hash(params)
+        return self.__hash
+
+    @property
+    def digest(self) -> str:
+        """
+        A deterministic digest of the type and parameters of this command.
+        The digest is computed upon first use, and cached thereafter.
+        """
+        try:
+            return self.__digest
+        except AttributeError:
+            self.__digest = digest(self.to_dict())
+            return self.__digest
 
     @property
     def uid(self) -> str:
@@ -275,13 +286,8 @@ class Command(object, metaclass=CommandMeta):
         return typ(**params)
 
     def to_dict(self) -> Dict[str, Any]:
-        fields = {
-            'type': self.uid,
-            'parameters': {}
-        }  # type: Dict[str, Any]
-        for param in self.__class__.parameters:
-            fields['parameters'][param.name] = getattr(self, param._field)
-        return fields
+        return {'type': self.uid,
+                'parameters': dict(zip(self._fields, self._values))}
 
     def __repr__(self) -> str:
         fields = self.to_dict()['parameters']
@@ -347,14 +353,10 @@ class Command(object, metaclass=CommandMeta):
         completing this command in a given state, environment, and
         configuration.
         """
-        for spec in self.__class__.specifications:
-            if spec.precondition.is_satisfied(self,
-                                              state,
-                                              None,
-                                              environment,
-                                              config):
-                return spec
-        raise Exception("failed to resolve specification")
+        return self.__class__.resolver.resolve(self,
+                                               state,
+                                               environment,
+                                               config)
 
     def to_message(self) -> Message:
         """
@@ -386,16 +388,18 @@ class CommandOutcome(object):
     time_elapsed = attr.ib(type=float)  # FIXME use time delta
 
     @staticmethod
-    def from_json(jsn: Dict[str, Any]) -> 'CommandOutcome':
-        return CommandOutcome(Command.from_json(jsn['command']),
+    def from_json(jsn: Dict[str, Any],
+                  state_class: Type[State]
+                  ) -> 'CommandOutcome':
+        return CommandOutcome(Command.from_dict(jsn['command']),
                               jsn['successful'],
-                              State.from_json(jsn['start_state']),
-                              State.from_json(jsn['end_state']),
+                              state_class.from_dict(jsn['start_state']),
+                              state_class.from_dict(jsn['end_state']),
                               jsn['time_elapsed'])
 
     def to_json(self) -> Dict[str, Any]:
-        return {'command': self.__command.to_json(),
-                'successful': self.__successful,
-                'start_state': self.start_state.to_json(),
-                'end_state': self.end_state.to_json(),
-                'time_elapsed': self.__time_elapsed}
+        return {'command': self.command.to_dict(),
+                'successful': self.successful,
+                'start_state': self.start_state.to_dict(),
+                'end_state': self.end_state.to_dict(),
+                'time_elapsed': self.time_elapsed}
@@ -0,0 +1,418 @@
+__all__ = ['CompiledExpression', 'compile_expression']
+
+from typing import Any, Callable, Dict, FrozenSet, List, Set, Tuple, Type, \
+    Union
+from operator import attrgetter, itemgetter
+import functools
+import logging
+import math
+
+import attr
+import numpy as np
+import sexpdata
+
+from . import exceptions
+from .state import State
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+# the abstract types of the values produced by compiled terms
+BOOL = 'bool'
+NUMBER = 'number'
+STRING = 'string'
+
+Evaluator = Callable[['Command', State, State], Any]
+
+
+@attr.s(frozen=True, slots=True)
+class _Term(object):
+    """
+    The result of compiling a single term within an s-expression. Numeric
+    terms that only produce integers are marked as integral, since Z3
+    treats their division differently. Literal terms are marked as constant.
+    """
+    evaluate = attr.ib(type=Evaluator)
+    typ = attr.ib(type=str)
+    noise = attr.ib(type=float)
+    integral = attr.ib(type=bool, default=False)
+    constant = attr.ib(type=bool, default=False)
+
+
+@attr.s(frozen=True)
+class CompiledExpression(object):
+    """
+    A native Python predicate for an s-expression that has been compiled
+    for a particular command and state class. The noise associated with each
+    state variable is built into the predicate in the same way that
+    Expression.recreate_with_noise builds it into the corresponding Z3 query.
+
+    Vectorised predicates accept a dictionary of column arrays, indexed by
+    variable name, in place of the after state, and return a boolean array
+    with an entry for each row of those columns.
+    """
+    expression = attr.ib(type=str)
+    evaluate = attr.ib(type=Evaluator, repr=False)
+    uses_parameters = attr.ib(type=bool)
+    uses_before = attr.ib(type=bool)
+    uses_after = attr.ib(type=bool)
+    vectorised = attr.ib(type=bool, default=False)
+    after_variables = attr.ib(type=FrozenSet[str], default=frozenset())
+
+    def __call__(self,
+                 command: 'Command',
+                 state_before: State,
+                 state_after: State
+                 ) -> bool:
+        return self.evaluate(command, state_before, state_after)
+
+
+class _Compiler(object):
+    def __init__(self,
+                 command_class: Type['Command'],
+                 state_class: Type[State],
+                 vectorised: bool
+                 ) -> None:
+        self.__parameters = {p.name: p for p in command_class.parameters}
+        self.__variables = state_class.variables
+        self.__operators = _VECTOR_OPERATORS if vectorised else _OPERATORS
+        self.__vectorised = vectorised
+        self.uses_parameters = False
+        self.uses_before = False
+        self.uses_after = False
+        self.after_variables = set()  # type: Set[str]
+
+    def compile(self, node: Any) -> _Term:
+        if isinstance(node, list):
+            return self._compile_application(node)
+        if isinstance(node, sexpdata.Symbol):
+            return self._compile_symbol(str(node))
+        if isinstance(node, bool):
+            return _Term(lambda c, b, a, v=node: v, BOOL, 0.0)
+        if isinstance(node, (int, float)):
+            return _Term(lambda c, b, a, v=node: v,
+                         NUMBER,
+                         0.0,
+                         isinstance(node, int),
+                         True)
+        if isinstance(node, str):
+            return _Term(lambda c, b, a, v=node: v, STRING, 0.0)
+        msg = "unsupported term: {}".format(repr(node))
+        raise exceptions.UnsupportedExpression(msg)
+
+    @staticmethod
+    def _type_of(typ: Type) -> str:
+        if typ is bool:
+            return BOOL
+        if typ in (int, float):
+            return NUMBER
+        if typ is str:
+            return STRING
+        raise exceptions.UnsupportedVariableType(typ)
+
+    def _compile_symbol(self, symbol: str) -> _Term:
+        if symbol == 'true':
+            return _Term(lambda c, b, a: True, BOOL, 0.0)
+        if symbol == 'false':
+            return _Term(lambda c, b, a: False, BOOL, 0.0)
+
+        if symbol.startswith('$'):
+            name = symbol[1:]
+            try:
+                param = self.__parameters[name]
+            except KeyError:
+                msg = "unknown parameter: {}".format(symbol)
+                raise exceptions.UnsupportedExpression(msg)
+            self.uses_parameters = True
+            get = attrgetter(name)
+            return _Term(lambda c, b, a: get(c),
+                         self._type_of(param.type),
+                         0.0,
+                         param.type is int)
+
+        if symbol.startswith('__'):
+            name, after = symbol[2:], True
+        elif symbol.startswith('_'):
+            name, after = symbol[1:], False
+        else:
+            msg = "unknown symbol: {}".format(symbol)
+            raise exceptions.UnsupportedExpression(msg)
+
+        try:
+            variable = self.__variables[name]
+        except KeyError:
+            msg = "unknown state variable: {}".format(symbol)
+            raise exceptions.UnsupportedExpression(msg)
+        get = attrgetter(name)
+        noise = float(variable.noise) if variable.is_noisy else 0.0
+        typ = self._type_of(variable.typ)
+        integral = variable.typ is int
+        if after:
+            self.uses_after = True
+            self.after_variables.add(name)
+            if self.__vectorised:
+                get = itemgetter(name)
+            return _Term(lambda c, b, a: get(a), typ, noise, integral)
+        self.uses_before = True
+        return _Term(lambda c, b, a: get(b), typ, noise, integral)
+
+    def _compile_application(self, node: List[Any]) -> _Term:
+        if not node or not isinstance(node[0], sexpdata.Symbol):
+            msg = "expected an operator: {}".format(repr(node))
+            raise exceptions.UnsupportedExpression(msg)
+        op = str(node[0])
+        args = [self.compile(n) for n in node[1:]]
+        try:
+            handler = self.__operators[op]
+        except KeyError:
+            msg = "unsupported operator: {}".format(op)
+            raise exceptions.UnsupportedExpression(msg)
+        return handler(args)
+
+
+def _arity(op: str, args: List[_Term], n: int) -> None:
+    if len(args) != n:
+        msg = "operator [{}] expects {} arguments but {} were given"
+        msg = msg.format(op, n, len(args))
+        raise exceptions.UnsupportedExpression(msg)
+
+
+def _op_and(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+
+    def evaluate(c, b, a):
+        for f in fs:
+            if not f(c, b, a):
+                return False
+        return True
+    return _Term(evaluate, BOOL, math.fsum(t.noise for t in args))
+
+
+def _op_or(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+
+    def evaluate(c, b, a):
+        for f in fs:
+            if f(c, b, a):
+                return True
+        return False
+    return _Term(evaluate, BOOL, math.fsum(t.noise for t in args))
+
+
+def _op_not(args: List[_Term]) -> _Term:
+    _arity('not', args, 1)
+    f = args[0].evaluate
+    return _Term(lambda c, b, a: not f(c, b, a), BOOL, args[0].noise)
+
+
+def _op_implies(args: List[_Term]) -> _Term:
+    _arity('=>', args, 2)
+    f, g = args[0].evaluate, args[1].evaluate
+    return _Term(lambda c, b, a: not f(c, b, a) or g(c, b, a),
+                 BOOL,
+                 math.fsum(t.noise for t in args))
+
+
+def _op_ite(args: List[_Term]) -> _Term:
+    _arity('ite', args, 3)
+    f, g, h = (t.evaluate for t in args)
+    return _Term(lambda c, b, a: g(c, b, a) if f(c, b, a) else h(c, b, a),
+                 args[1].typ,
+                 math.fsum(t.noise for t in args),
+                 args[1].integral and args[2].integral)
+
+
+def _op_eq(args: List[_Term]) -> _Term:
+    _arity('=', args, 2)
+    lhs, rhs = args
+    f, g = lhs.evaluate, rhs.evaluate
+    noise = math.fsum(t.noise for t in args)
+
+    # equality over arithmetic terms is relaxed by the noise of those terms
+    if lhs.typ == NUMBER and rhs.typ == NUMBER:
+        return _Term(lambda c, b, a: abs(f(c, b, a) - g(c, b, a)) <= noise,
+                     BOOL,
+                     noise)
+    return _Term(lambda c, b, a: f(c, b, a) == g(c, b, a), BOOL, noise)
+
+
+def _op_distinct(args: List[_Term]) -> _Term:
+    _arity('distinct', args, 2)
+    f, g = args[0].evaluate, args[1].evaluate
+    return _Term(lambda c, b, a: f(c, b, a) != g(c, b, a),
+                 BOOL,
+                 math.fsum(t.noise for t in args))
+
+
+def _comparison(op: str, cmp: Callable[[Any, Any], bool]):
+    def handler(args: List[_Term]) -> _Term:
+        _arity(op, args, 2)
+        f, g = args[0].evaluate, args[1].evaluate
+        return _Term(lambda c, b, a: cmp(f(c, b, a), g(c, b, a)),
+                     BOOL,
+                     math.fsum(t.noise for t in args))
+    return handler
+
+
+def _vector_op_and(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+    return _Term(lambda c, b, a: functools.reduce(np.logical_and,
+                                                  (f(c, b, a) for f in fs),
+                                                  True),
+                 BOOL,
+                 math.fsum(t.noise for t in args))
+
+
+def _vector_op_or(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+    return _Term(lambda c, b, a: functools.reduce(np.logical_or,
+                                                  (f(c, b, a) for f in fs),
+                                                  False),
+                 BOOL,
+                 math.fsum(t.noise for t in args))
+
+
+def _vector_op_not(args: List[_Term]) -> _Term:
+    _arity('not', args, 1)
+    f = args[0].evaluate
+    return _Term(lambda c, b, a: np.logical_not(f(c, b, a)),
+                 BOOL,
+                 args[0].noise)
+
+
+def _vector_op_implies(args: List[_Term]) -> _Term:
+    _arity('=>', args, 2)
+    f, g = args[0].evaluate, args[1].evaluate
+    return _Term(lambda c, b, a: np.logical_or(np.logical_not(f(c, b, a)),
+                                               g(c, b, a)),
+                 BOOL,
+                 math.fsum(t.noise for t in args))
+
+
+def _vector_op_ite(args: List[_Term]) -> _Term:
+    _arity('ite', args, 3)
+    f, g, h = (t.evaluate for t in args)
+    return _Term(lambda c, b, a: np.where(f(c, b, a), g(c, b, a), h(c, b, a)),
+                 args[1].typ,
+                 math.fsum(t.noise for t in args),
+                 args[1].integral and args[2].integral)
+
+
+def _op_add(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+    return _Term(lambda c, b, a: sum(f(c, b, a) for f in fs),
+                 NUMBER,
+                 math.fsum(t.noise for t in args),
+                 all(t.integral for t in args))
+
+
+def _op_sub(args: List[_Term]) -> _Term:
+    noise = math.fsum(t.noise for t in args)
+    integral = all(t.integral for t in args)
+    if len(args) == 1:
+        f = args[0].evaluate
+        return _Term(lambda c, b, a: -f(c, b, a), NUMBER, noise, integral)
+    _arity('-', args, 2)
+    f, g = args[0].evaluate, args[1].evaluate
+    return _Term(lambda c, b, a: f(c, b, a) - g(c, b, a),
+                 NUMBER,
+                 noise,
+                 integral)
+
+
+def _op_mul(args: List[_Term]) -> _Term:
+    fs = tuple(t.evaluate for t in args)
+    noise = 1.0
+    for t in args:
+        noise *= t.noise
+
+    def evaluate(c, b, a):
+        x = 1
+        for f in fs:
+            x *= f(c, b, a)
+        return x
+    return _Term(evaluate, NUMBER, noise, all(t.integral for t in args))
+
+
+def _op_div(args: List[_Term]) -> _Term:
+    _arity('/', args, 2)
+    # Z3 divides integers by rounding, rather than by true division, and
+    # so the division of integral terms is left to Z3
+    if all(t.integral for t in args):
+        msg = "cannot compile integer division"
+        raise exceptions.UnsupportedExpression(msg)
+    # Z3 treats division by zero as an unknown value, rather than as an
+    # error, and so only division by a non-zero constant is compiled
+    if not args[1].constant:
+        msg = "cannot compile division by a non-constant term"
+        raise exceptions.UnsupportedExpression(msg)
+    f, divisor = args[0].evaluate, args[1].evaluate(None, None, None)
+    if divisor == 0:
+        msg = "cannot compile division by zero"
+        raise exceptions.UnsupportedExpression(msg)
+    return _Term(lambda c, b, a: f(c, b, a) / divisor,
+                 NUMBER,
+                 math.fsum(t.noise for t in args))
+
+
+_OPERATORS = {
+    'and': _op_and,
+    'or': _op_or,
+    'not': _op_not,
+    '=>': _op_implies,
+    'ite': _op_ite,
+    '=': _op_eq,
+    'distinct': _op_distinct,
+    '<': _comparison('<', lambda x, y: x < y),
+    '<=': _comparison('<=', lambda x, y: x <= y),
+    '>': _comparison('>', lambda x, y: x > y),
+    '>=': _comparison('>=', lambda x, y: x >= y),
+    '+': _op_add,
+    '-': _op_sub,
+    '*': _op_mul,
+    '/': _op_div
+}  # type: Dict[str, Callable[[List[_Term]], _Term]]
+
+# arithmetic, comparisons and equality also operate element-wise on arrays
+_VECTOR_OPERATORS = dict(_OPERATORS)
+_VECTOR_OPERATORS.update({
+    'and': _vector_op_and,
+    'or': _vector_op_or,
+    'not': _vector_op_not,
+    '=>': _vector_op_implies,
+    'ite': _vector_op_ite
+})
+
+
+def compile_expression(expression: str,
+                       command_class: Type['Command'],
+                       state_class: Type[State],
+                       *,
+                       vectorised: bool = False
+                       ) -> CompiledExpression:
+    """
+    Compiles an s-expression into a native Python predicate for a given
+    command and state class. If vectorised is set, the predicate evaluates
+    the expression over columns of after states using NumPy.
+
+    Raises:
+        UnsupportedExpression: if the expression uses an operator or symbol
+            that cannot be compiled, in which case it should be checked by
+            Z3 instead.
+    """
+    logger.debug("compiling expression for [%s] and [%s]: %s",
+                 command_class.__name__, state_class.__name__, expression)
+    compiler = _Compiler(command_class, state_class, vectorised)
+    term = compiler.compile(sexpdata.loads(expression))
+    if term.typ != BOOL:
+        msg = "expected a boolean expression: {}".format(expression)
+        raise exceptions.UnsupportedExpression(msg)
+    compiled = CompiledExpression(expression,
+                                  term.evaluate,
+                                  compiler.uses_parameters,
+                                  compiler.uses_before,
+                                  compiler.uses_after,
+                                  vectorised,
+                                  frozenset(compiler.after_variables))
+    logger.debug("compiled expression: %s", compiled)
+    return compiled
@@ -19,10 +19,6 @@ class Option(object):
     name = attr.ib(type=str)
     typ = attr.ib(type=Type)
 
-    @property
-    def _field(self) -> str:
-        return "__{}".format(self.name)
-
     @attr.s(frozen=True)
     class Builder(object):
         typ = attr.ib(type=Type)
@@ -57,16 +53,25 @@ class ConfigurationMeta(type):
         ns['options'] = options
         logger.debug("stored options in options property")
 
+        # the values of a configuration are stored as a tuple, in the order
+        # in which its options were declared
+        fields = tuple(builders)
+        ns['_fields'] = fields
+        ns['_indices'] = {name: i for (i, name) in enumerate(fields)}
+        ns.setdefault('__slots__', ())
+
         logger.debug("constructing options")
-        for option in options:
-            getter = lambda self, f=option._field: getattr(self, f)
-            ns[option.name] = property(getter)
+        for index, name in enumerate(fields):
+            getter = lambda self, i=index: self._values[i]
+            ns[name] = property(getter)
         logger.debug("constructed options")
 
         return super().__new__(mcl, cls_name, bases, ns)
 
 
 class Configuration(object, metaclass=ConfigurationMeta):
+    __slots__ = ('_values',)
+
     @classmethod
     def from_dict(cls: Type['Configuration'],
                   dkt: Dict[str, Any]
@@ -75,7 +80,7 @@ class Configuration(object, metaclass=ConfigurationMeta):
 
     def __init__(self, *args, **kwargs) -> None:
         cls_name = self.__class__.__name__
-        options = self.__class__.options  # type: FrozenSet[Option]
+        fields = self.__class__._fields
 
         # were any positional arguments passed to the constructor?
         if args:
@@ -86,52 +91,43 @@ class Configuration(object, metaclass=ConfigurationMeta):
             raise TypeError(msg)
 
         # set values for each option
-        for opt in options:
-            try:
-                val = kwargs[opt.name]
-            except KeyError:
-                msg = "missing keyword argument [{}] to constructor [{}]"
-                msg = msg.format(opt.name, cls_name)
-                raise TypeError(msg)
-            setattr(self, opt._field, val)
+        try:
+            self._values = tuple(kwargs[name] for name in fields)
+        except KeyError as err:
+            msg = "missing keyword argument [{}] to constructor [{}]"
+            msg = msg.format(err.args[0], cls_name)
+            raise TypeError(msg)
 
         # were any unexpected keyword arguments provided?
-        if len(kwargs) > len(options):
+        if len(kwargs) > len(fields):
             actual_args = set(n for n in kwargs)
-            expected_args = set(opt.name for opt in options)
+            expected_args = set(fields)
             unexpected_arguments = list(actual_args - expected_args)
             msg = "unexpected keyword arguments [{}] supplied to constructor [{}]"  # noqa: pycodestyle
             msg = msg.format('; '.join(unexpected_arguments), cls_name)
             raise TypeError(msg)
 
     def __getitem__(self, name: str) -> Any:
-        # FIXME use frozendict
         try:
-            options = self.__class__.options
-            opt = next(opt for opt in options if opt.name == name)
-        except StopIteration:
-            msg = "no option [{}] in state [{}]"
-            msg.format(name, self.__class__.__name__)
+            index = self._indices[name]
+        except KeyError:
+            msg = "no option [{}] in configuration [{}]"
+            msg = msg.format(name, self.__class__.__name__)
             raise KeyError(msg)
-        return getattr(self, opt._field)
+        return self._values[index]
 
     def __hash__(self) -> int:
-        all_opts = [self[opt.name] for opt in self.__class__.options]
-        all_opts.insert(0, self.__class__.__name__)
-        return hash(tuple(all_opts))
+        return hash((self.__class__.__name__,) + self._values)
 
     def __eq__(self, other: 'Configuration') -> bool:
         if type(self) != type(other):
             msg = "illegal comparison of configurations: [{}] vs. [{}]"
             msg = msg.format(self.__class__.__name__, other.__class__.__name__)
             raise exceptions.HoustonException(msg)
-        return self.__dict__ == other.__dict__
+        return self._values == other._values
 
     def to_dict(self) -> Dict[str, Any]:
-        fields = {}  # type: Dict[str, Any]
-        for opt in self.__class__.options:
-            fields[opt.name] = getattr(self, opt._field)
-        return fields
+        return dict(zip(self._fields, self._values))
 
     def __repr__(self) -> str:
         fields = self.to_dict()
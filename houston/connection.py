@@ -1,10 +1,20 @@
 __all__ = ['Message', 'Connection']
 
-from typing import Generic, TypeVar, List, Callable, Dict
+from typing import Generic, TypeVar, List, Callable, Dict, FrozenSet, \
+    Iterable, Optional, Set, Tuple
+import logging
+import queue
 import threading
 
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
 T = TypeVar('T')
 
+# a registered hook, given by its name, its callable, and the types of
+# message that it receives (or None, if it receives all messages)
+_Hook = Tuple[str, Callable[[T], None], Optional[FrozenSet[str]]]
+
 
 class Message(object):
     """
@@ -15,27 +25,123 @@ class Message(object):
 class Connection(Generic[T]):
     """
     Provides a connection to the system under test using a given protocol.
+
+    Hooks are held in an immutable tuple that is replaced whenever a hook is
+    added or removed, allowing messages to be dispatched without acquiring
+    a lock. Each hook may be restricted to a given set of message types, in
+    which case it only receives messages of those types.
+
+    By default, hooks are called by the thread that receives each message.
+    If a queue size is given, received messages are instead placed onto a
+    bounded queue, and hooks are called by a dedicated worker thread, in the
+    order in which the messages were received. Messages that are received
+    whilst the queue is full are dropped, rather than blocking the receiving
+    thread.
+
+    Connections may use the filters of their hooks to subscribe to only
+    those types of message that are received by at least one hook (see
+    subscriptions).
     """
-    def __init__(self, hooks: Dict[str, Callable[[T], None]]) -> None:
+    def __init__(self,
+                 hooks: Dict[str, Callable[[T], None]],
+                 *,
+                 filters: Optional[Dict[str, Iterable[str]]] = None,
+                 queue_size: Optional[int] = None
+                 ) -> None:
         """
         Establishes a new connection.
 
         Parameters:
             hooks: A dictionary of string (name of the hook) to callables
-                that should be callednupon receiving a message via this
+                that should be called upon receiving a message via this
                 connection.
+            filters: An optional dictionary of hook names to the types of
+                message that should be passed to those hooks.
+            queue_size: If given, the maximum number of messages that may
+                wait to be passed to the hooks by a worker thread.
         """
         self.__lock = threading.Lock()
-        self.__hooks = hooks if hooks else {}
+        self.__hooks = ()  # type: Tuple[_Hook, ...]
+        self.__num_dropped = 0
+        self.__queue = None  # type: Optional[queue.Queue]
+        self.__worker = None  # type: Optional[threading.Thread]
+        if hooks:
+            self.add_hooks(hooks, filters)
+        if queue_size is not None:
+            assert queue_size > 0
+            self.__queue = queue.Queue(queue_size)
+            self.__worker = threading.Thread(target=self._work,
+                                             name='connection-hooks',
+                                             daemon=True)
+            self.__worker.start()
+
+    @property
+    def num_dropped(self) -> int:
+        """
+        The number of messages that were dropped because the queue of
+        messages was full.
+        """
+        return self.__num_dropped
+
+    def subscriptions(self) -> Optional[FrozenSet[str]]:
+        """
+        The types of message that are received by at least one hook, or None
+        if there is a hook that receives all messages.
+        """
+        types = set()  # type: Set[str]
+        for _, _, filtered in self.__hooks:
+            if filtered is None:
+                return None
+            types |= filtered
+        return frozenset(types)
+
+    def _on_hooks_changed(self) -> None:
+        """
+        Called, whilst the hooks are locked, whenever hooks are added or
+        removed. May be used to update the subscriptions of the connection.
+        """
+
+    def _message_type(self, message: T) -> Optional[str]:
+        """
+        Returns the type of a given message, used to determine which of the
+        filtered hooks should receive it, or None if the message has no
+        type, in which case it is only passed to unfiltered hooks.
+        """
+        return None
+
+    def _dispatch(self, message: T) -> None:
+        hooks = self.__hooks
+        if not hooks:
+            return
+        typ = self._message_type(message)
+        for _, hook, types in hooks:
+            if types is None or typ in types:
+                hook(message)
+
+    def _work(self) -> None:
+        while True:
+            message = self.__queue.get()
+            if message is self.__queue:
+                return
+            try:
+                self._dispatch(message)
+            except Exception:
+                logger.exception("hook failed to handle message: %s",
+                                 message)
 
     def receive(self, message: T) -> None:
         """
         Forwards any received messages using the hooks attached to this
         connection.
         """
-        with self.__lock:
-            for hook in self.__hooks.values():
-                hook(message)
+        if self.__queue is None:
+            self._dispatch(message)
+            return
+        try:
+            self.__queue.put_nowait(message)
+        except queue.Full:
+            self.__num_dropped += 1
+            logger.debug("dropped message from full queue: %s", message)
 
     def send(self, message: T) -> None:
         """
@@ -49,18 +155,45 @@ class Connection(Generic[T]):
         """
         raise NotImplementedError
 
-    def add_hooks(self, hooks: Dict[str, Callable[[T], None]]) -> None:
+    def _stop_worker(self) -> None:
+        """
+        Stops the worker thread, if any, once it has passed each of the
+        messages in its queue to the hooks. Should be called when the
+        connection is closed.
+        """
+        if self.__worker is None:
+            return
+        # the queue is used as a sentinel that cannot be a message
+        self.__queue.put(self.__queue)
+        if self.__worker is not threading.current_thread():
+            self.__worker.join()
+        self.__worker = None
+
+    def add_hooks(self,
+                  hooks: Dict[str, Callable[[T], None]],
+                  filters: Optional[Dict[str, Iterable[str]]] = None
+                  ) -> None:
         """
         Adds a dictionary of hooks to the set of hooks to be called
-        when messages are received.
+        when messages are received, replacing any existing hooks with the
+        same names. Hooks may optionally be restricted to given types of
+        message.
         """
+        filters = filters or {}
         with self.__lock:
-            self.__hooks.update(hooks)
+            kept = tuple(h for h in self.__hooks if h[0] not in hooks)
+            added = tuple((name, hook,
+                           frozenset(filters[name])
+                           if name in filters else None)
+                          for (name, hook) in hooks.items())
+            self.__hooks = kept + added
+            self._on_hooks_changed()
 
     def remove_hook(self, hook_name: str) -> None:
         """
         Removes a hook from hooks based on its name.
         """
         with self.__lock:
-            if hook_name in self.__hooks:
-                self.__hooks.pop(hook_name)
+            self.__hooks = \
+                tuple(h for h in self.__hooks if h[0] != hook_name)
+            self._on_hooks_changed()
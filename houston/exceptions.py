@@ -72,3 +72,10 @@ class UnsupportedVariableType(HoustonException):
         msg = "Houston and/or Z3 does not support variable type: {}"
         msg = msg.format(type_py.__name__)
         super().__init__(msg)
+
+
+class UnsupportedExpression(HoustonException):
+    """
+    The s-expression uses an operator or symbol that cannot be compiled into
+    a native Python predicate.
+    """
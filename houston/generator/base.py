@@ -6,6 +6,7 @@ from bugzoo.client import Client as BugZooClient
 import logging
 from typing import Dict, Callable, List, Type, Optional
 
+from ..cache import OutcomeCache
 from ..runner import MissionRunnerPool
 from ..system import System
 from ..mission import Mission, MissionSuite, MissionOutcome
@@ -230,8 +231,14 @@ class MissionGenerator(object):
                          resource_limits: ResourceLimits,
                          bz: BugZooClient,
                          snapshot: str,
-                         with_coverage: bool = False
+                         with_coverage: bool = False,
+                         outcome_cache: Optional[OutcomeCache] = None
                          ) -> MissionGeneratorReport:
+        """
+        Generates and runs missions until the given resource limits are
+        reached. If an outcome cache is given, missions that already have a
+        trusted outcome in that cache are not re-run.
+        """
         self.__runner_pool = None
 
         try:
@@ -243,7 +250,8 @@ class MissionGenerator(object):
                                                    self.threads,
                                                    stream,
                                                    self.record_outcome,
-                                                   with_coverage)
+                                                   with_coverage,
+                                                   outcome_cache=outcome_cache)
             self.__resource_usage = ResourceUsage()
             self.__start_time = timeit.default_timer()
             self.tick()
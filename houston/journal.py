@@ -0,0 +1,227 @@
+__all__ = ['CampaignJournal', 'JournalEntry', 'RetryPolicy', 'mission_key']
+
+from typing import Any, Dict, Iterator, List, Optional
+from timeit import default_timer as timer
+import json
+import logging
+import os
+import threading
+import time
+
+import attr
+
+from .mission import Mission, MissionOutcome
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+
+def mission_key(mission: Mission) -> str:
+    """
+    Returns a key that identifies a given mission across processes and
+    machines.
+    """
+    return mission.digest
+
+
+@attr.s(frozen=True)
+class JournalEntry(object):
+    """
+    Records a single attempt to run a mission as part of a campaign.
+    Missions that are run without an oracle (e.g., when building traces)
+    are recorded as COMPLETED rather than PASSED or FAILED.
+    """
+    PASSED = 'passed'
+    FAILED = 'failed'
+    COMPLETED = 'completed'
+    CRASHED = 'crashed'
+
+    key = attr.ib(type=str)
+    status = attr.ib(type=str)
+    attempt = attr.ib(type=int)
+    time_elapsed = attr.ib(type=float)
+    timestamp = attr.ib(type=float)
+    outcome = attr.ib(type=Optional[Dict[str, Any]], default=None)
+
+    @property
+    def completed(self) -> bool:
+        """
+        Indicates whether the mission was run to completion (regardless of
+        whether or not it passed).
+        """
+        return self.status != JournalEntry.CRASHED
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> 'JournalEntry':
+        return JournalEntry(d['key'],
+                            d['status'],
+                            d['attempt'],
+                            d['time_elapsed'],
+                            d['timestamp'],
+                            d.get('outcome'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'key': self.key,
+                'status': self.status,
+                'attempt': self.attempt,
+                'time_elapsed': self.time_elapsed,
+                'timestamp': self.timestamp,
+                'outcome': self.outcome}
+
+
+@attr.s(frozen=True)
+class RetryPolicy(object):
+    """
+    Determines whether a mission that crashed should be attempted again.
+
+    Attributes:
+        max_attempts: the maximum number of times that a mission may be
+            attempted, including its first attempt.
+    """
+    max_attempts = attr.ib(type=int, default=3)
+
+    def should_retry(self, attempts: int) -> bool:
+        return attempts < self.max_attempts
+
+
+class CampaignJournal(object):
+    """
+    An append-only journal that records the outcome of each attempt to run a
+    mission during a (possibly multi-day) campaign. Upon reopening the
+    journal of an interrupted campaign, completed missions can be skipped,
+    and crashed missions can be retried.
+
+    Entries are written to disk as soon as they are recorded, but, to avoid
+    synchronising the disk after every mission, they are only synchronised
+    after a given number of entries have been recorded, or after a given
+    number of seconds have passed since the last synchronisation, whichever
+    comes first.
+    """
+    def __init__(self,
+                 filename: str,
+                 *,
+                 sync_every: int = 16,
+                 sync_interval: float = 30.0
+                 ) -> None:
+        self.__filename = filename
+        self.__lock = threading.Lock()
+        self.__sync_every = sync_every
+        self.__sync_interval = sync_interval
+        self.__entries = {}  # type: Dict[str, List[JournalEntry]]
+        self.__num_unsynced = 0
+        self.__time_synced = timer()
+
+        if os.path.exists(filename):
+            for entry in self._read(filename):
+                self.__entries.setdefault(entry.key, []).append(entry)
+            logger.info("loaded %d missions from campaign journal: %s",
+                        len(self.__entries), filename)
+        self.__file = open(filename, 'a')
+        # ensure that new entries are not appended to an incomplete entry
+        if self.__file.tell() > 0:
+            with open(filename, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.__file.write('\n')
+
+    @staticmethod
+    def _read(filename: str) -> Iterator[JournalEntry]:
+        with open(filename, 'r') as f:
+            for line in f:
+                try:
+                    yield JournalEntry.from_dict(json.loads(line))
+                except ValueError:
+                    # the last entry may be incomplete if the campaign was
+                    # interrupted whilst it was being written
+                    logger.warning("ignoring incomplete journal entry: %s",
+                                   line)
+
+    def __enter__(self) -> 'CampaignJournal':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def filename(self) -> str:
+        return self.__filename
+
+    def entries(self, mission: Mission) -> List[JournalEntry]:
+        """
+        Returns the entries for each attempt to run a given mission.
+        """
+        with self.__lock:
+            return list(self.__entries.get(mission_key(mission), []))
+
+    def attempts(self, mission: Mission) -> int:
+        """
+        Returns the number of attempts that have been made to run a given
+        mission.
+        """
+        return len(self.entries(mission))
+
+    def is_completed(self, mission: Mission) -> bool:
+        """
+        Determines whether a given mission has been run to completion.
+        """
+        return any(e.completed for e in self.entries(mission))
+
+    def should_run(self,
+                   mission: Mission,
+                   policy: Optional[RetryPolicy] = None
+                   ) -> bool:
+        """
+        Determines whether a given mission should be run, given its prior
+        attempts and a policy for retrying crashed missions. If no policy
+        is given, crashed missions are not retried.
+        """
+        entries = self.entries(mission)
+        if not entries:
+            return True
+        if any(e.completed for e in entries):
+            return False
+        return policy is not None and policy.should_retry(len(entries))
+
+    def record(self,
+               mission: Mission,
+               status: str,
+               time_elapsed: float,
+               outcome: Optional[MissionOutcome] = None
+               ) -> JournalEntry:
+        """
+        Records an attempt to run a given mission.
+        """
+        key = mission_key(mission)
+        jsn_outcome = outcome.to_dict() if outcome else None
+        with self.__lock:
+            attempt = len(self.__entries.get(key, [])) + 1
+            entry = JournalEntry(key, status, attempt, time_elapsed,
+                                 time.time(), jsn_outcome)
+            self.__entries.setdefault(key, []).append(entry)
+            self.__file.write(json.dumps(entry.to_dict()))
+            self.__file.write('\n')
+            self.__file.flush()
+            self.__num_unsynced += 1
+            time_since_sync = timer() - self.__time_synced
+            if self.__num_unsynced >= self.__sync_every \
+               or time_since_sync >= self.__sync_interval:
+                self._sync()
+        return entry
+
+    def _sync(self) -> None:
+        os.fsync(self.__file.fileno())
+        self.__num_unsynced = 0
+        self.__time_synced = timer()
+
+    def sync(self) -> None:
+        """
+        Synchronises all recorded entries to disk.
+        """
+        with self.__lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self.__lock:
+            if not self.__file.closed:
+                self._sync()
+                self.__file.close()
@@ -13,7 +13,9 @@ from .configuration import Configuration
 from .command import Command, CommandOutcome
 from .state import State
 from .environment import Environment
+from .pool import SandboxPool
 from .system import System
+from .util import digest
 
 
 @attr.s(frozen=True)
@@ -28,6 +30,21 @@ class Mission(object):
     commands = attr.ib(type=Tuple[Command], converter=tuple)
     system = attr.ib(type=Type[System])
 
+    @property
+    def digest(self) -> str:
+        """
+        A deterministic digest of the contents of this mission, suitable for
+        identifying the mission across processes and machines. The digest
+        is computed upon first use, and cached thereafter.
+        """
+        try:
+            return self.__digest
+        except AttributeError:
+            # missions are frozen, and so the cache bypasses their __setattr__
+            object.__setattr__(self, '_Mission__digest',
+                               digest(self.to_dict()))
+            return self.__digest
+
     @staticmethod
     def from_dict(jsn: Dict[str, Any]) -> 'Mission':
         system = System.get_by_name(jsn['system'])
@@ -74,18 +91,45 @@ class Mission(object):
 
     def run(self,
             bz: BugZooClient,
-            snapshot_or_name: Union[str, Snapshot]
+            snapshot_or_name: Union[str, Snapshot],
+            *,
+            pool: Optional[SandboxPool] = None,
+            cache: Optional['OutcomeCache'] = None
             ) -> 'MissionOutcome':
         """
         Creates a sandbox and runs the commands and returns the outcome.
-        """
-        with self.system.sandbox.for_snapshot(bz,
-                                              snapshot_or_name,
-                                              self.initial_state,
-                                              self.environment,
-                                              self.configuration) as sandbox:
+        If a sandbox pool is provided, the sandbox is leased from one of the
+        warm containers within that pool rather than from a freshly
+        provisioned container.
+
+        If an outcome cache is provided, a trusted outcome for this mission
+        and snapshot is returned from that cache, if there is one, without
+        running the mission. Otherwise, the outcome of the mission is stored
+        in the cache.
+        """
+        if cache:
+            outcome = cache.lookup(snapshot_or_name, self)
+            if outcome is not None:
+                return outcome
+
+        if pool:
+            sandbox_cm = pool.lease(self.system.sandbox,
+                                    self.initial_state,
+                                    self.environment,
+                                    self.configuration)
+        else:
+            sandbox_cm = \
+                self.system.sandbox.for_snapshot(bz,
+                                                 snapshot_or_name,
+                                                 self.initial_state,
+                                                 self.environment,
+                                                 self.configuration)
+        with sandbox_cm as sandbox:
             outcome = sandbox.run(self.commands)
-            return outcome
+
+        if cache:
+            cache.store(snapshot_or_name, self, outcome)
+        return outcome
 
 
 @attr.s(frozen=True)
@@ -99,8 +143,11 @@ class MissionOutcome(object):
     time_total = attr.ib(type=float)
 
     @staticmethod
-    def from_dict(dkt: Dict[str, Any]) -> 'CommandOutcome':
-        cmds = tuple(CommandOutcome.from_json(a) for a in jsn['commands'])
+    def from_dict(dkt: Dict[str, Any],
+                  state_class: Type[State]
+                  ) -> 'MissionOutcome':
+        cmds = tuple(CommandOutcome.from_json(a, state_class)
+                     for a in dkt['commands'])
         return MissionOutcome(dkt['passed'],
                               cmds,
                               dkt['time_total'])
@@ -0,0 +1,169 @@
+__all__ = ['SandboxPool']
+
+from typing import Iterator, Optional, Set, Type, Union
+from contextlib import contextmanager
+import concurrent.futures
+import logging
+import queue
+import threading
+
+from bugzoo import Bug as Snapshot
+from bugzoo.client import Client as BugZooClient
+from bugzoo.core.container import Container
+
+from .configuration import Configuration
+from .environment import Environment
+from .sandbox import Sandbox
+from .state import State
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+
+class SandboxPool(object):
+    """
+    Keeps a fixed number of BugZoo containers provisioned for a given
+    snapshot, and leases sandboxes within those containers. Rather than
+    destroying a container at the end of each lease, the system under test
+    is stopped and later restarted with its persistent state (e.g., the
+    EEPROM of an ArduPilot SITL) wiped. Containers that fail during a lease
+    are destroyed and replaced by freshly provisioned ones.
+
+    Containers accumulate coverage data across leases; pools should not be
+    used when per-mission coverage is required.
+    """
+    def __init__(self,
+                 client_bugzoo: BugZooClient,
+                 snapshot_or_name: Union[str, Snapshot],
+                 size: int
+                 ) -> None:
+        assert size > 0
+        if isinstance(snapshot_or_name, str):
+            snapshot = client_bugzoo.bugs[snapshot_or_name]
+        else:
+            snapshot = snapshot_or_name
+
+        self.__bugzoo = client_bugzoo
+        self.__snapshot = snapshot
+        self.__size = size
+        self.__lock = threading.Lock()
+        self.__closed = False
+        self.__containers = set()  # type: Set[str]
+        # holds idle containers alongside a flag that indicates whether they
+        # have been used before
+        self.__idle = queue.Queue()  # type: queue.Queue
+
+        logger.debug("provisioning %d containers for pool", size)
+        with concurrent.futures.ThreadPoolExecutor(size) as executor:
+            futures = [executor.submit(self._provision) for _ in range(size)]
+        errors = [f.exception() for f in futures if f.exception()]
+        for future in futures:
+            if not future.exception():
+                self.__idle.put((future.result(), False))
+        if errors:
+            self.close()
+            raise errors[0]
+        logger.debug("provisioned %d containers for pool", size)
+
+    def __enter__(self) -> 'SandboxPool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        """
+        The number of containers that are kept by this pool.
+        """
+        return self.__size
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """
+        The snapshot used to provision containers.
+        """
+        return self.__snapshot
+
+    def _provision(self) -> Container:
+        container = self.__bugzoo.containers.provision(self.__snapshot)
+        with self.__lock:
+            self.__containers.add(container.uid)
+        logger.debug("provisioned container: %s", container.uid)
+        return container
+
+    def _destroy(self, container: Container) -> None:
+        with self.__lock:
+            self.__containers.discard(container.uid)
+        try:
+            del self.__bugzoo.containers[container.uid]
+        except Exception:
+            logger.exception("failed to destroy container: %s",
+                             container.uid)
+        logger.debug("destroyed container: %s", container.uid)
+
+    @contextmanager
+    def lease(self,
+              sandbox_cls: Type[Sandbox],
+              state_initial: State,
+              environment: Environment,
+              configuration: Configuration,
+              *,
+              timeout: Optional[float] = None,
+              **kwargs
+              ) -> Iterator[Sandbox]:
+        """
+        Blocks until a container becomes available, before launching an
+        interactive sandbox instance inside that container. The sandbox is
+        stopped and the container is returned to the pool upon leaving the
+        context.
+
+        Raises:
+            queue.Empty: if no container became available before the given
+                timeout.
+        """
+        if self.__closed:
+            raise ValueError("sandbox pool has been closed")
+        container, used = self.__idle.get(timeout=timeout)
+        healthy = False
+        try:
+            logger.debug("leasing container: %s", container.uid)
+            with sandbox_cls.for_container(self.__bugzoo,
+                                           container,
+                                           state_initial,
+                                           environment,
+                                           configuration,
+                                           wipe=used,
+                                           **kwargs) as sandbox:
+                yield sandbox
+            healthy = True
+        finally:
+            self._release(container, healthy)
+
+    def _release(self, container: Container, healthy: bool) -> None:
+        if self.__closed:
+            self._destroy(container)
+            return
+        if healthy:
+            self.__idle.put((container, True))
+            return
+        logger.debug("replacing container after failed lease: %s",
+                     container.uid)
+        self._destroy(container)
+        try:
+            self.__idle.put((self._provision(), False))
+        except Exception:
+            logger.exception("failed to provision replacement container")
+
+    def close(self) -> None:
+        """
+        Destroys all of the containers that belong to this pool. Containers
+        that are currently leased are destroyed when they are returned.
+        """
+        self.__closed = True
+        while True:
+            try:
+                container, _ = self.__idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(container)
@@ -0,0 +1,191 @@
+__all__ = ['SpecificationResolver', 'ResolverStats']
+
+from typing import Dict, Any, List, Optional, Type, Tuple
+from timeit import default_timer as timer
+import logging
+import threading
+
+import attr
+import z3
+
+from .configuration import Configuration
+from .environment import Environment
+from .specification import Specification, Expression
+from .state import State
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+
+@attr.s
+class ResolverStats(object):
+    """
+    Summarises the work performed by a specification resolver.
+    """
+    num_resolutions = attr.ib(type=int, default=0)
+    num_compiled_checks = attr.ib(type=int, default=0)
+    num_solver_checks = attr.ib(type=int, default=0)
+    time_solver = attr.ib(type=float, default=0.0)
+    resolved = attr.ib(type=Dict[str, int], factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'num_resolutions': self.num_resolutions,
+                'num_compiled_checks': self.num_compiled_checks,
+                'num_solver_checks': self.num_solver_checks,
+                'time_solver': self.time_solver,
+                'resolved': dict(self.resolved)}
+
+
+class SpecificationResolver(object):
+    """
+    Determines which specification a command of a given type is expected
+    to satisfy. Preconditions are checked using their compiled predicates
+    where possible. The remaining preconditions are checked by a single,
+    incremental Z3 solver that is kept for the lifetime of the resolver:
+    the values of the state and command parameters are asserted once per
+    resolution, within a solver scope, and each of those preconditions is
+    then pushed and popped in turn.
+
+    The shared solver is only locked once a resolution first needs it, so
+    resolutions whose preconditions are all compiled run in parallel.
+    """
+    def __init__(self, command_class: Type['Command']) -> None:
+        self.__command_class = command_class
+        # protects the statistics of the resolver
+        self.__lock = threading.Lock()
+        # protects the shared solver and the expressions built for it
+        self.__solver_lock = threading.Lock()
+        self.__ctx = None  # type: Optional[z3.Context]
+        self.__solver = None  # type: Optional[z3.Solver]
+        self.__decls = {}  # type: Dict[Type[State], Dict[str, Any]]
+        self.__exprs = \
+            {}  # type: Dict[Tuple[str, Type[State]], List[z3.ExprRef]]
+        self.__stats = ResolverStats()
+
+    @property
+    def command_class(self) -> Type['Command']:
+        """
+        The type of command whose specifications are resolved.
+        """
+        return self.__command_class
+
+    @property
+    def stats(self) -> ResolverStats:
+        """
+        A snapshot of the statistics for this resolver.
+        """
+        with self.__lock:
+            return attr.evolve(self.__stats,
+                               resolved=dict(self.__stats.resolved))
+
+    def reset_stats(self) -> None:
+        with self.__lock:
+            self.__stats = ResolverStats()
+
+    def resolve(self,
+                command: 'Command',
+                state: State,
+                environment: Environment,
+                config: Configuration
+                ) -> Specification:
+        """
+        Returns the first specification of the command whose precondition
+        is satisfied in a given state, environment, and configuration.
+        """
+        cls = self.__command_class
+        num_compiled_checks = 0
+        num_solver_checks = 0
+        time_solver = 0.0
+        resolved = None  # type: Optional[Specification]
+        locked = False
+        entered = False
+        try:
+            for spec in cls.specifications:
+                precondition = spec.precondition
+                predicate = precondition.compiled(cls, state.__class__)
+                if predicate and not predicate.uses_after:
+                    num_compiled_checks += 1
+                    is_sat = predicate(command, state, None)
+                else:
+                    num_solver_checks += 1
+                    time_start = timer()
+                    if not locked:
+                        self.__solver_lock.acquire()
+                        locked = True
+                        self._enter(precondition, command, state)
+                        entered = True
+                    is_sat = self._check(spec, command, state)
+                    time_solver += timer() - time_start
+                if is_sat:
+                    resolved = spec
+                    break
+        finally:
+            if entered:
+                self.__solver.pop()
+            if locked:
+                self.__solver_lock.release()
+
+        with self.__lock:
+            stats = self.__stats
+            stats.num_resolutions += 1
+            stats.num_compiled_checks += num_compiled_checks
+            stats.num_solver_checks += num_solver_checks
+            stats.time_solver += time_solver
+            if resolved:
+                stats.resolved[resolved.name] = \
+                    stats.resolved.get(resolved.name, 0) + 1
+        if resolved is None:
+            raise Exception("failed to resolve specification")
+        return resolved
+
+    def _enter(self,
+               expression: Expression,
+               command: 'Command',
+               state: State
+               ) -> None:
+        """
+        Opens a solver scope that asserts the values of the command
+        parameters and state variables. Called whilst the solver is locked.
+        """
+        if self.__solver is None:
+            self.__ctx = z3.Context()
+            self.__solver = z3.SolverFor("QF_NRA", ctx=self.__ctx)
+        state_class = state.__class__
+        try:
+            decls = self.__decls[state_class]
+        except KeyError:
+            decls = expression.get_declarations(self.__ctx, command, state)
+            self.__decls[state_class] = decls
+        smt = Expression.values_to_smt('$', command, decls)
+        smt.extend(Expression.values_to_smt('_', state, decls))
+        self.__solver.push()
+        self.__solver.add(smt)
+
+    def _check(self,
+               spec: Specification,
+               command: 'Command',
+               state: State
+               ) -> bool:
+        """
+        Checks the precondition of a given specification for a given command
+        and state using the shared solver. Called whilst the solver is
+        locked, within the scope that was opened for that command and state
+        (see _enter).
+        """
+        solver = self.__solver
+        key = (spec.name, state.__class__)
+        try:
+            expr = self.__exprs[key]
+        except KeyError:
+            decls = self.__decls[state.__class__]
+            expr = spec.precondition.get_expression(decls, state)
+            self.__exprs[key] = expr
+        solver.push()
+        try:
+            solver.add(expr)
+            result = solver.check()
+        finally:
+            solver.pop()
+        logger.debug("checked precondition of [%s] using Z3: %s",
+                     spec.name, result)
+        return result == z3.sat
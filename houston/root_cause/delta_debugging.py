@@ -1,13 +1,23 @@
-from typing import Set, Optional, Tuple, Dict, List, Type
+from typing import Set, Iterator, Optional, Tuple, Dict, List, Type
+import concurrent.futures
+import contextlib
+import logging
+import random
+
 from bugzoo.client import Client as BugZooClient
 
 from .root_cause import RootCauseFinder, MissionDomain
+from ..cache import OutcomeCache
+from ..pool import SandboxPool
 from ..system import System
 from ..state import State
 from ..environment import Environment
 from ..mission import Mission
 from ..configuration import Configuration
 
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
 
 class DeltaDebugging(RootCauseFinder):
     """
@@ -21,12 +31,47 @@ class DeltaDebugging(RootCauseFinder):
                  config: Configuration,
                  initial_failing_missions: List[Mission],
                  bz: BugZooClient,
-                 snapshot: str
+                 snapshot: str,
+                 outcome_cache: Optional[OutcomeCache] = None,
+                 *,
+                 workers: int = 1,
+                 sandbox_pool: Optional[SandboxPool] = None,
+                 granularity: Optional[int] = None,
+                 repeats: int = 1
                  ) -> None:
+        """
+        To cope with nondeterministic outcomes, each probe mission is run up
+        to a given number of times, and is judged by a majority vote over
+        those runs. Runs of the same probe are carried out concurrently, and
+        the remaining runs are cancelled as soon as the vote is decided.
+
+        If an outcome cache is given, the outcome of each run is stored in
+        that cache, and previously observed outcomes for a probe mission
+        count towards its vote.
+
+        Up to a given number of probe missions are run concurrently. If a
+        sandbox pool is given, probes lease their sandboxes from that pool,
+        which should hold at least as many containers as there are workers.
+        Once a probe fails, any probes that were speculatively queued
+        alongside it, and that cannot affect the result, are cancelled.
+
+        If a granularity is given, the root cause is found using ddmin,
+        starting with that number of partitions, rather than by splitting
+        the domain in two at each step.
+        """
+        assert workers > 0
+        assert granularity is None or granularity >= 2
+        assert repeats > 0
         self.__domain = MissionDomain.from_initial_mission(
             initial_failing_missions[0], discrete_params=True)
         self.__bz = bz
         self.__snapshot = snapshot
+        self.__outcome_cache = outcome_cache
+        self.__workers = workers
+        self.__sandbox_pool = sandbox_pool
+        self.__granularity = granularity
+        self.__repeats = repeats
+        self.__executor = None  # type: Optional[concurrent.futures.Executor]
 
         super(DeltaDebugging, self).__init__(system, initial_state,
                                              environment, config,
@@ -40,13 +85,37 @@ class DeltaDebugging(RootCauseFinder):
         return self.__domain
 
     def find_root_cause(self, time_limit: float = 0.0) -> MissionDomain:
-        empty_domain = MissionDomain(self.system)
-        final_domain = self._dd2(self.domain, empty_domain)
+        with self._executing():
+            if self.__granularity:
+                final_domain = self._ddmin(self.domain, self.__granularity)
+            else:
+                empty_domain = MissionDomain(self.system)
+                final_domain = self._dd2(self.domain, empty_domain, self.rng)
         print("FINISHED: {}".format(str(final_domain)))
 
         return final_domain
 
-    def _dd2(self, c: MissionDomain, r: MissionDomain) -> MissionDomain:
+    @contextlib.contextmanager
+    def _executing(self) -> Iterator[None]:
+        """
+        Provides an executor for running probe missions, unless one has
+        already been provided.
+        """
+        if self.__executor is not None:
+            yield
+            return
+        with concurrent.futures.ThreadPoolExecutor(self.__workers) as e:
+            self.__executor = e
+            try:
+                yield
+            finally:
+                self.__executor = None
+
+    def _dd2(self,
+             c: MissionDomain,
+             r: MissionDomain,
+             rng: random.Random
+             ) -> MissionDomain:
 
         print("****** C: {}\n****** R: {}".format(str(c), str(r)))
 
@@ -56,31 +125,183 @@ class DeltaDebugging(RootCauseFinder):
         c1, c2 = DeltaDebugging._divide(c)
 
         m1 = DeltaDebugging._union(c1, r)
-        res = self._run(m1)
-        if not res:
-            return self._dd2(c1, r)
-
         m2 = DeltaDebugging._union(c2, r)
-        res = self._run(m2)
-        if not res:
-            return self._dd2(c2, r)
+        failed = self._first_failure([m1, m2], rng)
+        if failed == 0:
+            return self._dd2(c1, r, rng)
+        if failed == 1:
+            return self._dd2(c2, r, rng)
 
-        final_domain = DeltaDebugging._union(self._dd2(c1, m2),
-                                             self._dd2(c2, m1))
+        # the two branches are independent, and so their probes are
+        # interleaved when more than one worker is available. each branch
+        # generates its missions using its own random number generator, so
+        # that its missions do not depend on the order in which the probes
+        # of both branches are generated.
+        rng1 = random.Random(rng.getrandbits(64))
+        rng2 = random.Random(rng.getrandbits(64))
+        if self.__workers == 1:
+            d1 = self._dd2(c1, m2, rng1)
+            d2 = self._dd2(c2, m1, rng2)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(1) as branch:
+                future = branch.submit(self._dd2, c1, m2, rng1)
+                d2 = self._dd2(c2, m1, rng2)
+                d1 = future.result()
+        final_domain = DeltaDebugging._union(d1, d2)
         return final_domain
 
-    def _run(self, mission_domain: MissionDomain) -> bool:
+    def _ddmin(self, c: MissionDomain, n: int) -> MissionDomain:
         """
-        runs a mission using sandbox and returns whether the mission passed.
+        Minimises a failing domain by splitting it into n partitions, and
+        testing each partition and its complement, before increasing the
+        granularity of the partitions.
         """
-        mission = mission_domain.generate_mission(self.environment,
-                                                  self.initial_state,
-                                                  self.configuration,
-                                                  self.rng)
-        res = mission.run(self.__bz, self.__snapshot)
+        while c.command_size >= 2:
+            n = min(n, c.command_size)
+            partitions = DeltaDebugging._partition(c, n)
+            subsets = [s for (s, _) in partitions]
+            failed = self._first_failure(subsets)
+            if failed is not None:
+                c, n = subsets[failed], 2
+                continue
+
+            # when n is 2, each complement is the other subset
+            if n > 2:
+                complements = [r for (_, r) in partitions]
+                failed = self._first_failure(complements)
+                if failed is not None:
+                    c, n = complements[failed], max(n - 1, 2)
+                    continue
+
+            if n >= c.command_size:
+                break
+            n = min(2 * n, c.command_size)
+        return c
+
+    def _first_failure(self,
+                       domains: List[MissionDomain],
+                       rng: Optional[random.Random] = None
+                       ) -> Optional[int]:
+        """
+        Concurrently runs a probe mission for each of the given domains, and
+        returns the lowest position of a domain whose probe was voted as
+        failing, or None if all probes were voted as passing. Runs that have
+        not yet started when their vote is decided, or when the probe of a
+        domain at a lower position is voted as failing, are cancelled.
+
+        Missions are generated using a given random number generator, or
+        the generator of this finder, if none is given.
+        """
+        # missions are generated up front so that the random number
+        # generator is used in a deterministic order
+        missions = [self._generate(d, rng) for d in domains]
+        votes = [self._cached_votes(m) for m in missions]
+        running = [0] * len(missions)
+        futures = {}  # type: Dict[concurrent.futures.Future, int]
+        # the lowest position of a probe that was voted as failing
+        failed = None  # type: Optional[int]
+
+        def schedule(i: int) -> None:
+            num_passed, num_failed = votes[i]
+            num_runs = self.__repeats - num_passed - num_failed - running[i]
+            # ties are broken by running the mission once more
+            if num_runs <= 0 and running[i] == 0:
+                num_runs = 1
+            for _ in range(num_runs):
+                future = self.__executor.submit(self._probe, missions[i])
+                futures[future] = i
+                running[i] += 1
 
+        def cancel(i: int) -> None:
+            for future in [f for (f, j) in futures.items() if j == i]:
+                future.cancel()
+                del futures[future]
+
+        # outcomes in the cache may already decide the vote
+        decisions = [self._decide(v) for v in votes]
+        if False in decisions:
+            failed = decisions.index(False)
+        for i, decision in enumerate(decisions[:failed]):
+            if decision is None:
+                schedule(i)
+
+        try:
+            while futures:
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    i = futures.pop(future, None)
+                    if i is None:
+                        continue
+                    running[i] -= 1
+                    num_passed, num_failed = votes[i]
+                    if future.result():
+                        votes[i] = (num_passed + 1, num_failed)
+                    else:
+                        votes[i] = (num_passed, num_failed + 1)
+                    decision = self._decide(votes[i])
+                    if decision is False:
+                        # only probes at lower positions may still change
+                        # the result
+                        failed = i
+                        for j in range(i, len(missions)):
+                            cancel(j)
+                    elif decision is True:
+                        cancel(i)
+                    elif running[i] == 0:
+                        schedule(i)
+            return failed
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _cached_votes(self, mission: Mission) -> Tuple[int, int]:
+        """
+        Returns the number of times that a given mission has previously
+        been observed to pass and to fail.
+        """
+        if not self.__outcome_cache:
+            return 0, 0
+        return self.__outcome_cache.observations(self.__snapshot, mission)
+
+    def _decide(self, votes: Tuple[int, int]) -> Optional[bool]:
+        """
+        Decides whether a probe passed, given the number of its runs that
+        passed and failed, or returns None if the vote is undecided.
+        """
+        num_passed, num_failed = votes
+        quorum = self.__repeats // 2 + 1
+        if num_passed == num_failed or max(votes) < quorum:
+            return None
+        return num_passed > num_failed
+
+    def _generate(self,
+                  mission_domain: MissionDomain,
+                  rng: Optional[random.Random] = None
+                  ) -> Mission:
+        return mission_domain.generate_mission(self.environment,
+                                               self.initial_state,
+                                               self.configuration,
+                                               rng or self.rng)
+
+    def _probe(self, mission: Mission) -> bool:
+        """
+        Runs a given mission once using a sandbox and returns whether the
+        mission passed.
+        """
+        res = mission.run(self.__bz, self.__snapshot,
+                          pool=self.__sandbox_pool)
+        if self.__outcome_cache:
+            self.__outcome_cache.store(self.__snapshot, mission, res)
         return res.passed
 
+    def _run(self, mission_domain: MissionDomain) -> bool:
+        """
+        runs a mission using sandbox and returns whether the mission passed.
+        """
+        with self._executing():
+            return self._first_failure([mission_domain]) is None
+
     @staticmethod
     def _divide(c: MissionDomain) -> Tuple[MissionDomain, MissionDomain]:
         """
@@ -91,6 +312,24 @@ class DeltaDebugging(RootCauseFinder):
         c2 = MissionDomain(c.system, c.domain[mid:])
         return c1, c2
 
+    @staticmethod
+    def _partition(c: MissionDomain,
+                   n: int
+                   ) -> List[Tuple[MissionDomain, MissionDomain]]:
+        """
+        Divides a domain into n almost equal, contiguous subsets, and
+        returns each subset alongside its complement.
+        """
+        size = c.command_size
+        bounds = [(i * size) // n for i in range(n + 1)]
+        partitions = []
+        for start, end in zip(bounds, bounds[1:]):
+            subset = MissionDomain(c.system, c.domain[start:end])
+            complement = MissionDomain(c.system,
+                                       c.domain[:start] + c.domain[end:])
+            partitions.append((subset, complement))
+        return partitions
+
     @staticmethod
     def _union(c1: MissionDomain, c2: MissionDomain) -> MissionDomain:
         """
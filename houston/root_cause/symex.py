@@ -2,9 +2,9 @@ import random
 import logging
 import re
 import z3
-import copy
+from timeit import default_timer as timer
 from typing import Set, Optional, Tuple, Dict, List, Any,\
-    Type
+    Type, Iterator
 
 from ..system import System
 from ..specification import Specification, Expression
@@ -47,115 +47,177 @@ class SymbolicExecution(object):
     def configuration(self) -> Configuration:
         return self.__configuration
 
-    def execute_symbolically(self, mission: Mission) -> List[Mission]:
+    def execute_symbolically(self,
+                             mission: Mission,
+                             *,
+                             max_paths: Optional[int] = None,
+                             time_limit: Optional[float] = None
+                             ) -> List[Mission]:
         """
         Having the sequense of actions in `mission` this function
         will generate parameters for those actions in order to
         explore all possible action branches.
         """
-
+        return list(self.explore(mission,
+                                 max_paths=max_paths,
+                                 time_limit=time_limit))
+
+    def explore(self,
+                mission: Mission,
+                *,
+                max_paths: Optional[int] = None,
+                time_limit: Optional[float] = None
+                ) -> Iterator[Mission]:
+        """
+        Lazily generates a mission for each feasible branch path through
+        the sequence of actions in `mission`.
+
+        Branch paths are explored depth-first using a single incremental
+        solver: the constraints for each action are pushed onto the solver
+        as the path is extended, and prefixes that are unsatisfiable are
+        pruned immediately, along with every path that extends them.
+
+        Parameters:
+            max_paths: the maximum number of complete branch paths that
+                should be solved.
+            time_limit: the maximum number of seconds that should be
+                spent exploring branch paths.
+        """
         rng = random.Random(1000)
         commands = mission.commands
-        all_paths = []  # type List[List[Specification]]
-        all_missions = []
-        self._dfs(commands, 0, [], all_paths)
-
-        for bp in all_paths:
-            logger.info("BP: " + str(bp))
-            logger.info("CMD: " + str(commands))
-            ctx = z3.Context()
-            solver = z3.Optimize(ctx=ctx)
-            smts = []
-            soft_smts = []
-            seq_id = 0
-            mappings = {}
-            for b in bp:
-                smt, decls = b.get_constraint(ctx,
-                                              commands[seq_id],
-                                              self.initial_state,
-                                              "__{}".format(seq_id))
-
-                for pb in commands[seq_id].specifications:
-                    if pb.name == b.name:
-                        break
+        ctx = z3.Context()
+        solver = z3.Solver(ctx=ctx)
+        time_start = timer()
+        num_paths = 0
+
+        def exhausted() -> bool:
+            if max_paths is not None and num_paths >= max_paths:
+                return True
+            if time_limit is not None and timer() - time_start >= time_limit:
+                logger.info("symbolic execution reached its time limit")
+                return True
+            return False
+
+        def dfs(seq_id: int,
+                path: List[Specification],
+                smts: List[z3.ExprRef],
+                soft_smts: List[z3.ExprRef],
+                mappings: Dict[int, Dict[str, Any]]
+                ) -> Iterator[Mission]:
+            nonlocal num_paths
+            if seq_id == len(commands):
+                num_paths += 1
+                logger.info("BP: " + str(path))
+                mission = self._solve(ctx, commands, smts, soft_smts,
+                                      mappings, rng)
+                if mission:
+                    yield mission
+                return
+
+            command = commands[seq_id]
+            postfix = "__{}".format(seq_id)
+            specs = command.specifications
+            for index, spec in enumerate(specs):
+                if exhausted():
+                    return
+                smt, decls = spec.get_constraint(ctx,
+                                                 command,
+                                                 self.initial_state,
+                                                 postfix)
+                # earlier specifications must not apply
+                for pb in specs[:index]:
                     smt.append(z3.Not(pb.precondition.get_expression(
-                        decls, self.initial_state,
-                        "__{}".format(seq_id))[0]))
-
-                logger.debug("SSS {}".format(smt))
-                mappings[seq_id] = decls
-                smts.extend(smt)
-                soft_smts.extend(Expression.values_to_smt("$",
-                                                          commands[seq_id],
-                                                          decls))
-                seq_id += 1
-
-            smts.extend(self._connect_pre_and_post(seq_id - 1, mappings))
-            logger.debug("Final " + str(smts))
-#            solver.from_string(smt)
-            solver.add(smts)
-            for s in soft_smts:
-                solver.add_soft(s)
-
-            if not solver.check() == z3.sat:
-                logger.info("UNSAT")
-                continue
-
-            logger.info("SAT")
-
-            model = solver.model()
-            logger.debug("Model: {}".format(model))
-            commands_list = []
-            seq_id = 0
-            for b in bp:
-                parameters = {}
-                for p in commands[seq_id].parameters:
-                    val = model[mappings[seq_id]["${}".format(p.name)]]
-                    parameters[p.name] = eval(str(val))
-                    if parameters[p.name] is None:
-                        v = p.generate(rng)
-                        logger.debug("PP {} {}".format(p.name, v))
-                        parameters[p.name] = v
-                logger.debug("Parameters: {}".format(parameters))
-                commands_list.append(commands[seq_id].__class__(**parameters))
-                seq_id += 1
-
-            logger.debug("Added: {}".format(commands_list))
-            all_missions.append(Mission(self.configuration,
-                                        self.environment,
-                                        self.initial_state,
-                                        commands_list,
-                                        self.system))
-
-        return all_missions
+                        decls, self.initial_state, postfix)[0]))
+                smt.extend(self._connect_pre_and_post(seq_id,
+                                                      mappings,
+                                                      decls))
+
+                solver.push()
+                try:
+                    solver.add(smt)
+                    # prefixes are only pruned if they are known to be
+                    # unsatisfiable; those whose satisfiability is unknown
+                    # are left for the final solver to decide
+                    if solver.check() == z3.unsat:
+                        logger.debug("pruning unsatisfiable prefix: %s",
+                                     path + [spec])
+                        continue
+                    soft = Expression.values_to_smt("$", command, decls)
+                    mappings[seq_id] = decls
+                    yield from dfs(seq_id + 1,
+                                   path + [spec],
+                                   smts + smt,
+                                   soft_smts + soft,
+                                   mappings)
+                finally:
+                    solver.pop()
+
+        yield from dfs(0, [], [], [], {})
+
+    def _solve(self,
+               ctx: z3.Context,
+               commands: List[Command],
+               smts: List[z3.ExprRef],
+               soft_smts: List[z3.ExprRef],
+               mappings: Dict[int, Dict[str, Any]],
+               rng: random.Random
+               ) -> Optional[Mission]:
+        """
+        Finds parameters for a complete branch path that stay as close as
+        possible to the original parameters of its commands, and returns
+        the corresponding mission, or None if the path is unsatisfiable.
+        """
+        logger.debug("Final " + str(smts))
+        solver = z3.Optimize(ctx=ctx)
+        solver.add(smts)
+        for s in soft_smts:
+            solver.add_soft(s)
+
+        result = solver.check()
+        if result != z3.sat:
+            logger.info("failed to solve branch path: %s", result)
+            return None
+
+        logger.info("SAT")
+
+        model = solver.model()
+        logger.debug("Model: {}".format(model))
+        commands_list = []
+        for seq_id, command in enumerate(commands):
+            parameters = {}
+            for p in command.parameters:
+                val = model[mappings[seq_id]["${}".format(p.name)]]
+                parameters[p.name] = eval(str(val))
+                if parameters[p.name] is None:
+                    v = p.generate(rng)
+                    logger.debug("PP {} {}".format(p.name, v))
+                    parameters[p.name] = v
+            logger.debug("Parameters: {}".format(parameters))
+            commands_list.append(command.__class__(**parameters))
+
+        logger.debug("Added: {}".format(commands_list))
+        return Mission(self.configuration,
+                       self.environment,
+                       self.initial_state,
+                       commands_list,
+                       self.system)
 
     def _connect_pre_and_post(self,
-                              number: int,
-                              mappings: Dict[int, Dict[str, Any]]
+                              seq_id: int,
+                              mappings: Dict[int, Dict[str, Any]],
+                              decls: Dict[str, Any]
                               ) -> List[z3.ExprRef]:
-        assert(number >= 0)
+        """
+        Connects the pre-state of the command at a given position to the
+        post-state of its predecessor or, for the first command, to the
+        initial state.
+        """
+        assert(seq_id >= 0)
+        if seq_id == 0:
+            return Expression.values_to_smt('_', self.initial_state, decls)
         s = []
         for v in self.initial_state:
-            for i in range(0, number):
-                m1 = mappings[i]['__{}'.format(v.name)]
-                m2 = mappings[i + 1]['_{}'.format(v.name)]
-                s.append(m1 == m2)
-        s.extend(Expression.values_to_smt('_',
-                                          self.initial_state,
-                                          mappings[0]))
+            m1 = mappings[seq_id - 1]['__{}'.format(v.name)]
+            m2 = decls['_{}'.format(v.name)]
+            s.append(m1 == m2)
         return s
-
-    def _dfs(self,
-             commands: List[Command],
-             start_index: int,
-             path: List[Specification],
-             all_paths: List[List[Specification]]
-             ) -> None:
-
-        if start_index == len(commands):
-            all_paths.append(path)
-            return
-        for s in commands[start_index].specifications:
-            new_path = copy.deepcopy(path)
-            new_path.append(s)
-            self._dfs(commands, start_index + 1, new_path, all_paths)
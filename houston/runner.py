@@ -1,5 +1,13 @@
-from typing import Optional, Tuple
+from typing import AsyncIterable, Callable, Iterable, List, Optional, \
+    Tuple, Union
+import asyncio
+import concurrent.futures
+import functools
+import json
 import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
 
 import threading
 import time
@@ -7,7 +15,10 @@ import signal
 from bugzoo.client import Client as BugZooClient
 
 from .util import TimeoutError, printflush
-from .mission import Mission
+from .cache import OutcomeCache
+from .journal import CampaignJournal, JournalEntry, RetryPolicy
+from .mission import Mission, MissionOutcome
+from .pool import SandboxPool
 
 logger = logging.getLogger(__name__)   # type: logging.Logger
 logger.setLevel(logging.DEBUG)
@@ -23,8 +34,12 @@ class MissionRunner(threading.Thread):
                  bz: BugZooClient,
                  snapshot_name: str,
                  with_coverage: bool = False,
-                 record: bool = False
+                 record: bool = False,
+                 sandbox_pool: Optional[SandboxPool] = None,
+                 outcome_cache: Optional[OutcomeCache] = None
                  ) -> None:
+        if record:
+            raise ValueError("recording is not supported by mission runners")
         super().__init__()
         self.daemon = True
         self.__pool = pool
@@ -32,43 +47,229 @@ class MissionRunner(threading.Thread):
         self.__bz = bz
         self.__snapshot_name = snapshot_name
         self.__record = record
+        self.__sandbox_pool = sandbox_pool
+        self.__outcome_cache = outcome_cache
 
     def run(self) -> None:
         """
         Continues to process jobs.
         """
-        while True:
-            index, mission = self.__pool.fetch()
-            if mission is None:
-                return
+        try:
+            while True:
+                index, mission = self.__pool.fetch()
+                if mission is None:
+                    break
 
-            if self.__with_coverage:
-                # FIXME
-                raise NotImplementedError
-            else:
-                if self.__record:
+                if self.__with_coverage:
                     # FIXME
-                    recorder_filename = "record/mission#{}.jsn"
-                    recorder_filename = recorder_filename.format(index)
+                    raise NotImplementedError
                 else:
-                    recorder_filename = None
-                logger.info("Running mission #%d", index)
-                start_time = time.time()
-                outcome = mission.run(self.__bz,
-                                      self.__snapshot_name,
-                                      recorder_filename)
-                logger.info("Finished running mission %d in %f seconds."
-                            " Passed: %s",
-                            index,
-                            time.time() - start_time,
-                            outcome.passed)
-                coverage = None
-            self.__pool.report(mission, outcome, coverage)
+                    logger.info("Running mission #%d", index)
+                    start_time = time.time()
+                    try:
+                        outcome = self._lookup_or_execute(mission)
+                    except Exception:
+                        logger.exception("Mission %d crashed", index)
+                        outcome = None
+                    if outcome is None:
+                        logger.error("Failed to run mission %d", index)
+                        self.__pool.report_crash(mission,
+                                                 time.time() - start_time)
+                        continue
+                    logger.info("Finished running mission %d in %f seconds."
+                                " Passed: %s",
+                                index,
+                                time.time() - start_time,
+                                outcome.passed)
+                    coverage = None
+                self.__pool.report(mission, outcome, coverage,
+                                   time.time() - start_time)
+        finally:
+            self._finish()
+
+    def _lookup_or_execute(self,
+                           mission: Mission
+                           ) -> Optional[MissionOutcome]:
+        """
+        Returns the cached outcome of a given mission, if there is one, or
+        else executes the mission and caches its outcome.
+        """
+        cache = self.__outcome_cache
+        if not cache:
+            return self._execute(mission)
+        outcome = cache.lookup(self.__snapshot_name, mission)
+        if outcome is not None:
+            logger.debug("using cached outcome for mission: %s",
+                         mission.digest)
+            return outcome
+        outcome = self._execute(mission)
+        if outcome is not None:
+            cache.store(self.__snapshot_name, mission, outcome)
+        return outcome
+
+    def _execute(self, mission: Mission) -> Optional[MissionOutcome]:
+        """
+        Executes a given mission and returns its outcome.
+        """
+        return mission.run(self.__bz,
+                           self.__snapshot_name,
+                           pool=self.__sandbox_pool)
+
+    def _finish(self) -> None:
+        """
+        Called once there are no more missions left for this runner.
+        """
+        return
 
     def shutdown(self):
         return
 
 
+def _run_worker_process(connection,
+                        url_bugzoo: Optional[str],
+                        snapshot_name: str,
+                        reuse_containers: bool
+                        ) -> None:
+    """
+    Runs inside a worker process of a process-based mission runner pool.
+    The worker owns its own BugZoo client, and, if containers are reused,
+    its own warm container. Missions are received over a given connection,
+    and outcomes are sent back over that connection, both in their JSON
+    form. None is sent back if a mission could not be run.
+    """
+    bz = BugZooClient(url_bugzoo)
+    sandbox_pool = None  # type: Optional[SandboxPool]
+    try:
+        while True:
+            jsn_mission = connection.recv()
+            if jsn_mission is None:
+                return
+            try:
+                mission = Mission.from_dict(json.loads(jsn_mission))
+                if reuse_containers and sandbox_pool is None:
+                    sandbox_pool = SandboxPool(bz, snapshot_name, 1)
+                outcome = mission.run(bz, snapshot_name, pool=sandbox_pool)
+                connection.send(json.dumps(outcome.to_dict()))
+            except Exception:
+                logger.exception("failed to run mission")
+                connection.send(None)
+    finally:
+        if sandbox_pool:
+            sandbox_pool.close()
+
+
+class ProcessMissionRunner(MissionRunner):
+    """
+    A mission runner that executes its missions inside a dedicated worker
+    process, rather than inside the current interpreter. The runner thread
+    itself only fetches missions from its pool, forwards them to its worker,
+    and reports the outcomes that are sent back.
+
+    If the worker process dies whilst it is running a mission, that mission
+    is reported as a crash, and a new worker process is started for the
+    remaining missions.
+    """
+    # the function that is run by each worker process
+    _worker = staticmethod(_run_worker_process)
+    # the number of seconds that a worker is given to close its containers
+    # and exit once it has been asked to stop
+    STOP_TIMEOUT = 60.0
+    # the number of seconds that a worker is given to exit once it has been
+    # terminated, before it is killed
+    TERMINATE_TIMEOUT = 5.0
+
+    def __init__(self,
+                 pool,
+                 url_bugzoo: Optional[str],
+                 snapshot_name: str,
+                 with_coverage: bool = False,
+                 record: bool = False,
+                 reuse_containers: bool = False,
+                 outcome_cache: Optional[OutcomeCache] = None
+                 ) -> None:
+        super().__init__(pool, None, snapshot_name, with_coverage, record,
+                         outcome_cache=outcome_cache)
+        self.__args = (url_bugzoo, snapshot_name, reuse_containers)
+        self.__connection = None  # type: Optional[Connection]
+        self.__process = None  # type: Optional[multiprocessing.Process]
+
+    @property
+    def process(self) -> Optional[multiprocessing.Process]:
+        """
+        The current worker process, if it has been started.
+        """
+        return self.__process
+
+    def _start_worker(self) -> None:
+        context = multiprocessing.get_context('spawn')
+        self.__connection, connection_worker = context.Pipe()
+        args = (connection_worker,) + self.__args
+        self.__process = context.Process(target=self._worker, args=args)
+        self.__process.daemon = True
+        self.__process.start()
+        # ensures that the connection is closed if the worker dies
+        connection_worker.close()
+
+    def _stop_worker(self, timeout: Optional[float] = None) -> None:
+        """
+        Asks the worker process to exit, and waits for up to a given number
+        of seconds (or STOP_TIMEOUT, if none is given) for it to do so. A
+        worker that fails to exit is terminated, and, failing that, killed.
+        """
+        if self.__process is None:
+            return
+        if timeout is None:
+            timeout = self.STOP_TIMEOUT
+        process = self.__process
+        try:
+            self.__connection.send(None)
+        except OSError:
+            pass
+        process.join(timeout)
+        if process.is_alive():
+            logger.error("worker process failed to exit: terminating it")
+            process.terminate()
+            process.join(self.TERMINATE_TIMEOUT)
+        if process.is_alive():
+            logger.error("worker process failed to terminate: killing it")
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        self.__connection.close()
+
+    def run(self) -> None:
+        self._start_worker()
+        super().run()
+
+    def _execute(self, mission: Mission) -> Optional[MissionOutcome]:
+        try:
+            self.__connection.send(json.dumps(mission.to_dict()))
+            jsn_outcome = self.__connection.recv()
+        except (EOFError, OSError):
+            # the worker may be wedged, rather than dead
+            self._stop_worker(self.TERMINATE_TIMEOUT)
+            logger.error("worker process terminated unexpectedly"
+                         " (exit code: %s): starting a new worker",
+                         self.__process.exitcode)
+            self._start_worker()
+            return None
+        if jsn_outcome is None:
+            return None
+        return MissionOutcome.from_dict(json.loads(jsn_outcome),
+                                        mission.system.state)
+
+    def _finish(self) -> None:
+        self._stop_worker()
+
+    def shutdown(self):
+        process = self.__process
+        if process and process.is_alive():
+            process.terminate()
+            process.join(self.TERMINATE_TIMEOUT)
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGKILL)
+                process.join()
+
+
 class MissionRunnerPool(object):
     """
     Mission runner pools are used to distribute the execution of a stream
@@ -83,9 +284,46 @@ class MissionRunnerPool(object):
                  source,  # FIXME
                  callback,  # FIXMe
                  with_coverage=False,
-                 record=False):
+                 record=False,
+                 sandbox_pool: Optional[SandboxPool] = None,
+                 *,
+                 processes: bool = False,
+                 url_bugzoo: Optional[str] = None,
+                 reuse_containers: bool = False,
+                 journal: Optional[CampaignJournal] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 outcome_cache: Optional[OutcomeCache] = None):
+        """
+        If a sandbox pool is given, the runners lease their sandboxes from
+        the warm containers within that pool; the pool should hold at least
+        as many containers as there are runners.
+
+        If processes is set, each runner executes its missions inside its
+        own worker process, which connects to the BugZoo server at the given
+        URL (or the default URL, if none is given) using its own client.
+        Missions and their outcomes are passed to and from the workers in
+        their JSON form. If reuse_containers is also set, each worker keeps
+        a single warm container that it uses for all of its missions.
+
+        If a campaign journal is given, the outcome of each attempt to run a
+        mission is recorded in that journal, and missions that the journal
+        records as completed are skipped. Missions that crash are retried
+        (both immediately, and when the campaign is resumed) according to
+        the given retry policy; if no policy is given, they are not retried.
+
+        If an outcome cache is given, missions with a trusted outcome in
+        that cache are not run; instead, their cached outcome is reported.
+
+        Raises:
+            ValueError: if record is set, since missions that are run by
+                the pool cannot be recorded.
+        """
+        if record:
+            raise ValueError("recording is not supported by mission runners")
         assert callable(callback)
         assert size > 0
+        assert not (processes and sandbox_pool), \
+            "sandbox pools cannot be shared with worker processes"
 
         # if a list is provided, use an iterator for that list
         if isinstance(source, list):
@@ -96,11 +334,22 @@ class MissionRunnerPool(object):
         self.__callback = callback
         self.__index = -1
         self._lock = threading.Lock()
+        self.__journal = journal
+        self.__retry_policy = retry_policy
+        self.__retries = []  # type: List[Mission]
 
         # provision desired number of runners
-        self.__runners = \
-            [MissionRunner(self, bz, snapshot_name, with_coverage, record)
-                for _ in range(size)]
+        if processes:
+            self.__runners = \
+                [ProcessMissionRunner(self, url_bugzoo, snapshot_name,
+                                      with_coverage, record, reuse_containers,
+                                      outcome_cache)
+                    for _ in range(size)]
+        else:
+            self.__runners = \
+                [MissionRunner(self, bz, snapshot_name, with_coverage, record,
+                               sandbox_pool, outcome_cache)
+                    for _ in range(size)]
 
     def run(self) -> None:
         """
@@ -148,15 +397,44 @@ class MissionRunnerPool(object):
         """
         return self.__runners.length()
 
-    def report(self, mission, outcome, coverage=None) -> None:
+    def report(self,
+               mission,
+               outcome,
+               coverage=None,
+               time_elapsed: float = 0.0
+               ) -> None:
         """
         Used to report the outcome of a mission.
 
         WARNING: It is the responsibility of the callback to guarantee
             thread safety (if necessary).
         """
+        if self.__journal:
+            if outcome.passed:
+                status = JournalEntry.PASSED
+            else:
+                status = JournalEntry.FAILED
+            self.__journal.record(mission, status, time_elapsed, outcome)
         self.__callback(mission, outcome, coverage)
 
+    def report_crash(self, mission: Mission, time_elapsed: float) -> None:
+        """
+        Used to report that a mission crashed before it could be completed.
+        If the pool has a journal, the crash is recorded, and the mission is
+        scheduled to be run again if the retry policy allows it.
+        """
+        if not self.__journal:
+            return
+        self.__journal.record(mission, JournalEntry.CRASHED, time_elapsed)
+        attempts = self.__journal.attempts(mission)
+        policy = self.__retry_policy
+        if policy and policy.should_retry(attempts):
+            logger.info("Scheduling crashed mission to be retried"
+                        " (attempt %d of %d)",
+                        attempts + 1, policy.max_attempts)
+            with self._lock:
+                self.__retries.append(mission)
+
     def fetch(self) -> Tuple[int, Optional[Mission]]:
         """
         Returns the next mission from the (lazily-generated) queue, or None if
@@ -169,10 +447,145 @@ class MissionRunnerPool(object):
         self._lock.acquire()
         try:
             self.__index += 1
-            return self.__index, self.__source.__next__()
+            if self.__retries:
+                return self.__index, self.__retries.pop(0)
+            while True:
+                mission = self.__source.__next__()
+                journal = self.__journal
+                if journal and \
+                   not journal.should_run(mission, self.__retry_policy):
+                    logger.info("Skipping mission (recorded in journal)")
+                    continue
+                return self.__index, mission
 
         except StopIteration:
             return self.__index, None
 
         finally:
             self._lock.release()
+
+
+class _MissionSource(object):
+    """
+    Adapts a synchronous or an asynchronous iterable of missions to an
+    asynchronous iterator. Asynchronous generators are avoided, since they
+    require Python 3.6.
+    """
+    def __init__(self,
+                 source: Union[Iterable[Mission], AsyncIterable[Mission]]
+                 ) -> None:
+        self.__is_async = hasattr(source, '__aiter__')
+        if self.__is_async:
+            self.__iterator = source.__aiter__()
+        else:
+            self.__iterator = iter(source)
+
+    def __aiter__(self) -> '_MissionSource':
+        return self
+
+    async def __anext__(self) -> Mission:
+        if self.__is_async:
+            return await self.__iterator.__anext__()
+        try:
+            return next(self.__iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class ExecutorMissionRunnerPool(object):
+    """
+    Uses asyncio to schedule a stream of missions from a single controller
+    thread, with at most a given number of missions running at once. Each
+    mission is still run, from start to finish, by a blocking call on a
+    thread of an executor (by default, a thread pool with one thread per
+    concurrent mission); only scheduling, and the reporting of outcomes,
+    take place on the event loop. Unlike MissionRunnerPool, callbacks are
+    therefore never called concurrently, and missions may be produced by an
+    asynchronous source.
+    """
+    def __init__(self,
+                 bz: BugZooClient,
+                 snapshot_name: str,
+                 size: int,
+                 *,
+                 sandbox_pool: Optional[SandboxPool] = None,
+                 executor: Optional[concurrent.futures.Executor] = None
+                 ) -> None:
+        assert size > 0
+        self.__bz = bz
+        self.__snapshot_name = snapshot_name
+        self.__size = size
+        self.__sandbox_pool = sandbox_pool
+        self.__executor = executor
+
+    @property
+    def size(self) -> int:
+        """
+        The maximum number of missions that may be run at once.
+        """
+        return self.__size
+
+    async def run_mission(self, mission: Mission) -> MissionOutcome:
+        """
+        Runs a single mission and returns its outcome.
+        """
+        return await self._execute(mission, self.__executor)
+
+    async def _execute(self,
+                       mission: Mission,
+                       executor: Optional[concurrent.futures.Executor]
+                       ) -> MissionOutcome:
+        loop = asyncio.get_event_loop()
+        run = functools.partial(mission.run,
+                                self.__bz,
+                                self.__snapshot_name,
+                                pool=self.__sandbox_pool)
+        return await loop.run_in_executor(executor, run)
+
+    async def run(self,
+                  source: Union[Iterable[Mission], AsyncIterable[Mission]],
+                  callback: Callable[[Mission, MissionOutcome, None], None]
+                  ) -> None:
+        """
+        Runs each mission produced by a given source, and reports the
+        outcome of each mission to a given callback. Missions whose
+        execution raises an exception are logged and are not reported.
+        """
+        assert callable(callback)
+        executor = self.__executor
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(self.__size)
+        semaphore = asyncio.Semaphore(self.__size)
+        tasks = set()
+
+        async def run_one(index: int, mission: Mission) -> None:
+            try:
+                logger.info("Running mission #%d", index)
+                start_time = time.time()
+                try:
+                    outcome = await self._execute(mission, executor)
+                except Exception:
+                    logger.exception("Failed to run mission %d", index)
+                    return
+                logger.info("Finished running mission %d in %f seconds."
+                            " Passed: %s",
+                            index,
+                            time.time() - start_time,
+                            outcome.passed)
+                callback(mission, outcome, None)
+            finally:
+                semaphore.release()
+
+        try:
+            index = -1
+            async for mission in _MissionSource(source):
+                index += 1
+                await semaphore.acquire()
+                task = asyncio.ensure_future(run_one(index, mission))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            if executor is not self.__executor:
+                executor.shutdown(wait=False)
@@ -2,7 +2,6 @@ from typing import Set, Optional, Tuple, Dict, Sequence, Iterator, Union
 from timeit import default_timer as timer
 from contextlib import contextmanager
 import math
-import time
 import threading
 import signal
 import logging
@@ -19,7 +18,8 @@ from .environment import Environment
 from .configuration import Configuration
 from .state import State
 from .command import Command, CommandOutcome
-from .trace import MissionTrace, CommandTrace, TraceRecorder
+from .trace import MissionTrace, CommandTrace, TraceRecorder, \
+    ColumnarTraceRecorder, SamplingPolicy
 
 logger = logging.getLogger(__name__)  # type: logging.Logger
 logger.setLevel(logging.DEBUG)
@@ -101,10 +101,13 @@ class Sandbox(object):
                  environment: Environment,
                  configuration: Configuration,
                  *,
-                 prefix: str = ''
+                 prefix: str = '',
+                 wipe: bool = False
                  ) -> None:
         self.__lock = threading.Lock()
         self.__state_lock = threading.Lock()
+        # notified whenever a new state is observed
+        self.__state_changed = threading.Condition(self.__state_lock)
         self._bugzoo = client_bugzoo
         self.__container = container
         self.__state = state_initial
@@ -115,6 +118,7 @@ class Sandbox(object):
         self.__recorder = None
         self.__lock_recorder = threading.Lock()
         self.__prefix = prefix
+        self.__wipe = wipe
 
     def read_logs(self) -> str:
         raise NotImplementedError
@@ -123,6 +127,15 @@ class Sandbox(object):
     def prefix(self) -> str:
         return self.__prefix
 
+    @property
+    def wipe(self) -> bool:
+        """
+        Indicates whether any persistent state left behind in the container
+        by a previous session (e.g., stored parameters) should be wiped when
+        the system under test is started.
+        """
+        return self.__wipe
+
     @property
     def running_time(self) -> float:
         """
@@ -204,20 +217,30 @@ class Sandbox(object):
 
         env = self.environment
         config = self.configuration
-        time_start = self.running_time
         state_after = state_before = self.state
 
         # determine which spec the system should observe
         spec = command.resolve(state_before, env, config)
         postcondition = spec.postcondition
 
-        def is_sat() -> bool:
+        def is_sat(state_after: State) -> bool:
             return postcondition.is_satisfied(command,
                                               state_before,
                                               state_after,
                                               env,
                                               config)
 
+        # the postcondition only needs to be rechecked when one of the
+        # variables that it refers to has changed
+        predicate = postcondition.compiled(command.__class__,
+                                           state_before.__class__)
+        relevant = predicate.after_variables if predicate else None
+
+        def has_changed(state_old: State, state_new: State) -> bool:
+            if relevant is None:
+                return True
+            return any(state_old[v] != state_new[v] for v in relevant)
+
         logger.debug('enforcing specification: %s', spec)
 
         # determine timeout using specification is no timeout
@@ -228,16 +251,25 @@ class Sandbox(object):
 
         self.issue(command)
 
-        # FIXME block until completion message or timeout occurs
-        time_elapsed = 0.0
+        # block until the postcondition is satisfied or a timeout occurs,
+        # waking up whenever a new state is observed
         time_start = timer()
-        while not is_sat() and time_elapsed < timeout:
-            self.observe()
-            state_after = self.state
-            time.sleep(0.1)
-            time_elapsed = timer() - time_start
+        passed = is_sat(state_after)
+        state_checked = state_after
+        while not passed:
+            time_remaining = timeout - (timer() - time_start)
+            if time_remaining <= 0.0:
+                break
+            with self.__state_changed:
+                self.__state_changed.wait_for(
+                    lambda: self.__state is not state_after,
+                    time_remaining)
+                state_after = self.__state
+            if has_changed(state_checked, state_after):
+                passed = is_sat(state_after)
+                state_checked = state_after
+        time_elapsed = timer() - time_start
 
-        passed = is_sat()
         outcome = CommandOutcome(command,
                                  passed,
                                  state_before,
@@ -246,32 +278,90 @@ class Sandbox(object):
         return outcome
 
     @contextmanager
-    def record(self) -> Iterator[TraceRecorder]:
-        """
-        Attaches a recorder to this sandbox.
-        """
+    def record(self,
+               columnar: bool = True,
+               sink: 'Optional[TraceSink]' = None,
+               *,
+               dedup: Optional[str] = None,
+               sampling: Optional[SamplingPolicy] = None,
+               retain: bool = True
+               ) -> Iterator[TraceRecorder]:
+        """
+        Attaches a recorder to this sandbox. If columnar is set, the states
+        are recorded into a columnar buffer, and flushing the recorder
+        returns a lazy view over those states. If a trace sink is given, the
+        recorded states are also streamed to that sink. If a mode of
+        deduplication is given (see StateBuffer), consecutive states whose
+        variables are unchanged are only recorded by their time offsets. If
+        a sampling policy is given, only the states that are chosen by that
+        policy (and the last state of each command) are recorded; if the
+        configuration has a speedup, the policy measures simulated time.
+        If retain is not set, the recorded states are only streamed to the
+        sink.
+
+        Raises:
+            ValueError: if deduplication is requested for a recorder that is
+                not columnar, or if retain is not set and no sink is given.
+        """
+        if dedup and not columnar:
+            raise ValueError("deduplication requires a columnar recorder")
+        config = self.configuration
+        if sampling and config and 'speedup' in config._indices:
+            sampling = sampling.at_speedup(config['speedup'])
         with self.__lock_recorder:
-            self.__recorder = TraceRecorder()
+            if columnar:
+                state_class = self.state_initial.__class__
+                self.__recorder = ColumnarTraceRecorder(state_class,
+                                                        sink,
+                                                        dedup=dedup,
+                                                        sampling=sampling,
+                                                        retain=retain)
+            else:
+                self.__recorder = TraceRecorder(sink,
+                                                sampling=sampling,
+                                                retain=retain)
             yield self.__recorder
             self.__recorder = None
 
     def run_and_trace(self,
                       commands: Sequence[Command],
-                      collect_coverage: bool = False
+                      collect_coverage: bool = False,
+                      sink: 'Optional[TraceSink]' = None,
+                      *,
+                      dedup: Optional[str] = None,
+                      sampling: Optional[SamplingPolicy] = None,
+                      retain: bool = True
                       ) -> MissionTrace:
         """
         Runs a given sequence of commands and records its execution trace.
+        If a trace sink is given, the trace is also streamed to that sink,
+        and the trace for each command is sealed as soon as it completes.
+        If a mode of deduplication is given, unchanged states are recorded
+        by their time offsets alone (see StateBuffer). If a sampling policy
+        is given, only the states chosen by that policy are recorded. If
+        retain is not set, states are only streamed to the sink, and the
+        returned trace holds the commands, but not the states, that were
+        executed.
         """
         traces = []  # type: List[CommandTrace]
-        with self.record() as recorder:
-            for cmd in commands:
+        if sink:
+            sink.begin_trace()
+        with self.record(sink=sink,
+                         dedup=dedup,
+                         sampling=sampling,
+                         retain=retain) as recorder:
+            for index, cmd in enumerate(commands):
                 outcome = self.run_command(cmd)
                 if collect_coverage:
                     # TODO fetch coverage
                     pass
                 states, messages = recorder.flush()
                 traces.append(CommandTrace(cmd, states))
-        return MissionTrace(tuple(command_traces))
+                if sink:
+                    sink.seal(index, cmd)
+        if sink:
+            sink.end_trace()
+        return MissionTrace(tuple(traces))
 
     def run(self, commands: Sequence[Command]) -> 'MissionOutcome':
         """
@@ -304,11 +394,13 @@ class Sandbox(object):
         state_new = state_class(**values)
         with self.__state_lock:
             self.__state = state_new
+            self.__state_changed.notify_all()
 
     def update(self, message: Message) -> None:
         with self.__state_lock:
             state = self.__state.evolve(message, self.running_time)
             self.__state = state
+            self.__state_changed.notify_all()
             if self.__recorder:
                 self.__recorder.record_state(state)
                 self.__recorder.record_message(message)
@@ -5,12 +5,15 @@ from typing import List, Dict, Any, Tuple, Type, \
 import logging
 import random
 import math
+import threading
 
 import attr
+import numpy as np
 import sexpdata
 import z3
 
 from . import exceptions
+from .compiler import CompiledExpression, compile_expression
 from .configuration import Configuration
 from .state import State
 from .environment import Environment
@@ -28,11 +31,49 @@ class Expression(object):
             raise exceptions.InvalidExpression
 
         self.__expression = s_expression
+        self.__lock = threading.Lock()
+        self.__ctx = None  # type: Optional[z3.Context]
+        self.__asts = {}  # type: Dict[Tuple[Any, ...], z3.ExprRef]
+        self.__compiled = \
+            {}  # type: Dict[Tuple[Type, Type], Optional[CompiledExpression]]
 
     @property
     def expression(self) -> str:
         return self.__expression
 
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'Expression':
+        # expressions are immutable, and their caches may safely be shared
+        return self
+
+    def compiled(self,
+                 command_class: Type['Command'],
+                 state_class: Type[State],
+                 *,
+                 vectorised: bool = False
+                 ) -> Optional[CompiledExpression]:
+        """
+        Returns a native Python predicate for this expression, compiled for a
+        given command and state class. The predicate is compiled once and
+        reused by all subsequent calls. If this expression cannot be
+        compiled, None is returned, and it should be checked using Z3.
+        """
+        key = (command_class, state_class, vectorised)
+        try:
+            return self.__compiled[key]
+        except KeyError:
+            pass
+        try:
+            compiled = compile_expression(self.__expression,
+                                          command_class,
+                                          state_class,
+                                          vectorised=vectorised)
+        except exceptions.HoustonException:
+            logger.debug("failed to compile expression: %s",
+                         self.__expression, exc_info=True)
+            compiled = None
+        self.__compiled[key] = compiled
+        return compiled
+
     @staticmethod
     def is_valid(string: str) -> bool:
         """
@@ -50,47 +91,62 @@ class Expression(object):
                      state_before: State,
                      state_after: State,
                      environment: Environment,
-                     config: Configuration
+                     config: Configuration,
+                     *,
+                     use_solver: bool = False
                      ) -> bool:
         """
         Determines whether this specification is satisfied by a given
         before and after state in a particular context (i.e, command
         arguments, configuration and environment).
+
+        Unless use_solver is set, the check is performed by a compiled
+        predicate. Z3 is only used if the expression cannot be compiled, or
+        if it refers to the after state but no after state is given.
         """
+        if not use_solver:
+            predicate = self.compiled(command.__class__,
+                                      state_before.__class__)
+            if predicate and \
+                    (state_after is not None or not predicate.uses_after):
+                return predicate(command, state_before, state_after)
+
         logger.debug("Checking for command: %s", command.name)  # FIXME
         ctx = z3.Context()
         solver = z3.SolverFor("QF_NRA", ctx=ctx)
-        smt, decls = self._prepare_query(ctx,
-                                         command,
-                                         state_before,
-                                         state_after)
+        subs, decls = self._prepare_query(ctx,
+                                          command,
+                                          state_before,
+                                          state_after)
         expr = self.get_expression(decls, state_before)
-        smt.extend(expr)
+        smt = [z3.substitute(e, *subs) for e in expr]
         logger.info("SMT: {}".format(smt))
         solver.add(smt)
-        logger.debug("Z3 result: {}".format(str(solver.check())))
-        return solver.check() == z3.sat
+        result = solver.check()
+        logger.debug("Z3 result: {}".format(str(result)))
+        return result == z3.sat
 
     def _prepare_query(self,
                        ctx: z3.Context,
                        command: 'Command',
                        state_before: State,
                        state_after: State = None
-                       ) -> Tuple[List[z3.ExprRef], Dict[str, Any]]:
+                       ) -> Tuple[List[Tuple[z3.ExprRef, z3.ExprRef]],
+                                  Dict[str, Any]]:
         """
-        Prepares the declarations and value assignment for a query
-        given the command and states before and after.
+        Prepares the declarations and the substitutions of their values for
+        a query given the command and states before and after.
         """
         decls = self.get_declarations(ctx, command, state_before)
-        smt = Expression.values_to_smt('$', command, decls)
-        smt.extend(Expression.values_to_smt('_',
-                                            state_before,
-                                            decls))
+        subs = Expression.values_to_substitutions('$', command, decls)
+        subs.extend(Expression.values_to_substitutions('_',
+                                                       state_before,
+                                                       decls))
         if state_after:
-            smt.extend(Expression.values_to_smt('__',
-                                                state_after,
-                                                decls))
-        return smt, decls
+            subs.extend(Expression.values_to_substitutions('__',
+                                                           state_after,
+                                                           decls))
+        return subs, decls
 
     def get_declarations(self,
                          ctx: z3.Context,
@@ -199,6 +255,38 @@ class Expression(object):
         logger.debug("converted values to SMT: %s", smt)
         return smt
 
+    @staticmethod
+    def create_z3_val(var: z3.ExprRef, val: Any) -> z3.ExprRef:
+        """
+        Creates a Z3 value with the same sort as a given Z3 variable.
+        """
+        ctx = var.ctx
+        if z3.is_string(var):
+            return z3.StringVal(val, ctx=ctx)
+        if z3.is_bool(var):
+            return z3.BoolVal(val, ctx=ctx)
+        if z3.is_int(var):
+            return z3.IntVal(val, ctx=ctx)
+        return z3.RealVal(val, ctx=ctx)
+
+    @staticmethod
+    def values_to_substitutions(prefix: str,
+                                state_or_command: Union[State, 'Command'],
+                                declarations: Dict[str, Any]
+                                ) -> List[Tuple[z3.ExprRef, z3.ExprRef]]:
+        """
+        Creates a list of (variable, value) pairs that can be passed to
+        z3.substitute to replace the Z3 variables for a given state or
+        command by their values.
+        """
+        subs = []
+        for param_or_variable in state_or_command:
+            name = param_or_variable.name
+            d = declarations['{}{}'.format(prefix, name)]
+            val = Expression.create_z3_val(d, state_or_command[name])
+            subs.append((d, val))
+        return subs
+
     def is_satisfiable(self,
                        command: 'Command',
                        state: State,
@@ -218,11 +306,19 @@ class Expression(object):
         Returns:
             True if satisfiable, false if not.
         """
+        # only a solver can decide expressions with free variables
+        predicate = self.compiled(command.__class__, state.__class__)
+        is_closed = predicate and \
+            not (predicate.uses_parameters or predicate.uses_after)
+        if is_closed:
+            return predicate(command, state, None)
+
         ctx = z3.Context()
         s = z3.SolverFor("QF_NRA", ctx=ctx)
         decls = self.get_declarations(ctx, command, state)
-        smt = Expression.values_to_smt('_', state, decls)
-        smt.extend(self.get_expression(decls, state))
+        subs = Expression.values_to_substitutions('_', state, decls)
+        smt = [z3.substitute(e, *subs)
+               for e in self.get_expression(decls, state)]
         s.add(smt)
         return s.check() == z3.sat
 
@@ -234,12 +330,46 @@ class Expression(object):
         """
         Constructs a Z3 expression from this expression for a particular
         state and set of declaration mappings.
+
+        The expression is only parsed and rewritten with noise once for each
+        state class, postfix, and set of declarations; subsequent calls
+        translate the cached expression into the context of the given
+        declarations.
         """
         ctx = None
         if decls:
             ctx = list(decls.values())[0].ctx
+        if ctx is None:
+            ctx = z3.main_ctx()
+        signature = tuple((n, d.sort().kind()) for (n, d) in decls.items())
+        key = (state.__class__, postfix, signature)
+        with self.__lock:
+            try:
+                expr = self.__asts[key]
+            except KeyError:
+                logger.debug("building Z3 expression: %s", key)
+                expr = self._build_expression(decls, state, postfix)
+                self.__asts[key] = expr
+            return [expr.translate(ctx)]
+
+    def _build_expression(self,
+                          decls: Dict[str, Any],
+                          state: State,
+                          postfix: str
+                          ) -> z3.ExprRef:
+        """
+        Parses this expression and rewrites it with noise within the
+        private context of this expression.
+        """
+        if self.__ctx is None:
+            self.__ctx = z3.Context()
+        ctx = self.__ctx
+        decls = {n: d.translate(ctx) for (n, d) in decls.items()}
         s_expr = '(assert {})'.format(self.expression)
         expr = z3.parse_smt2_string(s_expr, decls=decls, ctx=ctx)
+        # newer versions of Z3 return a vector of assertions
+        if isinstance(expr, z3.AstVector):
+            expr = expr[0]
         logger.debug('generated (non-noisy) expression: %s', expr)
         variables = {}
         logger.debug('computing variable noise')
@@ -250,7 +380,7 @@ class Expression(object):
                 if v.is_noisy else 0.0
         logger.debug('computed variable noise: %s', variables)
         logger.debug('adding noise to expression')
-        expr_with_noise = [Expression.recreate_with_noise(expr, variables)]
+        expr_with_noise = Expression.recreate_with_noise(expr, variables)
         logger.debug('added noise to expression')
         logger.debug('generated expression: %s', expr_with_noise)
         return expr_with_noise
@@ -344,6 +474,49 @@ class Specification(object):
         """
         return self.__timeout(command, state, environment, config)
 
+    def check_trace(self,
+                    command_trace: 'CommandTrace',
+                    state_before: Optional[State] = None
+                    ) -> Tuple[np.ndarray, Optional[int]]:
+        """
+        Evaluates the postcondition of this specification over every state
+        within a given command trace at once.
+
+        Parameters:
+            command_trace: the trace of the command.
+            state_before: the state of the system immediately prior to the
+                execution of the command. If omitted, the first state of the
+                trace is used.
+
+        Returns:
+            a tuple of the form (mask, first), where mask is a boolean array
+            that indicates whether the postcondition is satisfied by each
+            state in the trace, and first is the index of the first state
+            that satisfies the postcondition, or None if no state does.
+
+        Raises:
+            UnsupportedExpression: if the postcondition cannot be compiled.
+        """
+        states = command_trace.states
+        if not states:
+            return np.zeros(0, dtype=bool), None
+        command = command_trace.command
+        if state_before is None:
+            state_before = states[0]
+        predicate = self.postcondition.compiled(command.__class__,
+                                                state_before.__class__,
+                                                vectorised=True)
+        if not predicate:
+            msg = "failed to compile postcondition: {}"
+            msg = msg.format(self.postcondition.expression)
+            raise exceptions.UnsupportedExpression(msg)
+
+        columns = command_trace.columns()
+        mask = predicate(command, state_before, columns)
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), (len(states),))
+        first = int(np.argmax(mask)) if mask.any() else None
+        return mask, first
+
     def get_constraint(self,
                        ctx: z3.Context,
                        command: 'Command',
@@ -1,7 +1,7 @@
 __all__ = ['State', 'var', 'Variable']
 
 from typing import Dict, Any, Optional, Union, TypeVar, Generic, Type, \
-    Callable, FrozenSet, Iterator
+    Callable, FrozenSet, Iterable, Iterator, Sequence
 import logging
 import copy
 import json
@@ -11,6 +11,7 @@ import attr
 
 from . import exceptions
 from .connection import Message
+from .util import digest
 
 logger = logging.getLogger(__name__)  # type: logging.Logger
 logger.setLevel(logging.DEBUG)
@@ -58,13 +59,6 @@ class Variable(object):
         """
         return self.__noise
 
-    @property
-    def _field(self) -> str:
-        """
-        The name of the field used to store the value of this variable.
-        """
-        return "__{}".format(self.__name)
-
     @property
     def name(self) -> str:
         return self.__name
@@ -123,6 +117,22 @@ def var(typ: Type,
     return VariableBuilder(typ, getter, noise)
 
 
+def _build_init(cls_name: str, fields: Sequence[str]) -> Callable:
+    """
+    Generates a constructor that accepts the value of each field of a state
+    class as a keyword-only argument, and stores those values, in order,
+    within the `_values` slot of the state.
+    """
+    args = ', '.join(fields)
+    src = "def __init__(self, *, {0}) -> None:\n" \
+          "    self._values = ({0},)\n".format(args)
+    ns = {}  # type: Dict[str, Any]
+    exec(src, ns)
+    init = ns['__init__']
+    init.__qualname__ = "{}.__init__".format(cls_name)
+    return init
+
+
 class StateMeta(type):
     def __new__(mcl,
                 cls_name: str,
@@ -136,21 +146,32 @@ class StateMeta(type):
                 logger.debug("found variable: %s", name)
                 variable_builders[name] = ns[name]
         logger.debug("building variables")
+        # variables are inherited from any base state classes
+        variables = {}  # type: Dict[str, Variable]
+        for base in reversed(bases):
+            variables.update(getattr(base, 'variables', {}))
         # FIXME build frozen dictionary
-        variables = {
+        variables.update({
             name: b.build(name) for (name, b) in variable_builders.items()
-        }  # type: Dict[str, Variable]
+        })
         logger.debug("built variables: %s", variables)
 
         logger.debug("storing variables in variables property")
         ns['variables'] = variables
         logger.debug("stored variables in variables property")
 
+        # the values of a state are stored as a tuple, in the order given
+        # by its fields; the time offset is always the first field
+        fields = ('time_offset',) + tuple(variables)
+        ns['_fields'] = fields
+        ns['_indices'] = {name: i for (i, name) in enumerate(fields)}
+        ns.setdefault('__slots__', ())
+        ns['__init__'] = _build_init(cls_name, fields)
+
         logger.debug("constructing properties")
-        for name, variable in variables.items():
-            field = variable._field
-            getter = lambda self, f=field: getattr(self, f)
-            ns[variable.name] = property(getter)
+        for index, name in enumerate(fields[1:], 1):
+            getter = lambda self, i=index: self._values[i]
+            ns[name] = property(getter)
         logger.debug("constructed properties")
 
         return super().__new__(mcl, cls_name, bases, ns)
@@ -160,7 +181,17 @@ class State(object, metaclass=StateMeta):
     """
     Describes the state of the system at a given moment in time, in terms of
     its internal and external variables.
+
+    States are immutable. Their values are held in a single tuple, ordered
+    by the `_fields` of the state class, and each state class is given a
+    generated constructor that accepts the time offset and the value of each
+    variable as keyword-only arguments.
     """
+    __slots__ = ('_values', '_digest')
+    # the types of message that may change the state, or None if the state
+    # may be changed by messages of any type
+    message_types = None  # type: Optional[FrozenSet[str]]
+
     @classmethod
     def from_file(cls: Type['State'], fn: str) -> 'State':
         """
@@ -175,61 +206,40 @@ class State(object, metaclass=StateMeta):
     def from_dict(cls: Type['State'], d: Dict[str, Any]) -> 'State':
         return cls(**d)
 
-    def __init__(self, *args, **kwargs) -> None:
-        cls_name = self.__class__.__name__
-        variables = self.__class__.variables  # type: Dict[str, Variable]
-
-        try:
-            self.__time_offset = kwargs['time_offset']
-        except KeyError:
-            msg = "missing keyword argument [time_offset] to constructor [{}]"
-            msg = msg.format(cls_name)
-            raise TypeError(msg)
-
-        # were any positional arguments passed to the constructor?
-        if args:
-            msg = "constructor [{}] accepts no positional arguments but {} {} given"  # noqa: pycodestyle
-            msg = msg.format(cls_name,
-                             "was" if len(args) == 1 else "were",
-                             len(args))
-            raise TypeError(msg)
-
-        # set values for each variable
-        for name, v in variables.items():
-            try:
-                val = kwargs[name]
-            except KeyError:
-                msg = "missing keyword argument [{}] to constructor [{}]"
-                msg = msg.format(name, cls_name)
-                raise TypeError(msg)
-
-            # TODO perform run-time type checking?
-
-            setattr(self, v._field, val)
-
-        # did we pass any unexpected keyword arguments?
-        if len(kwargs) > len(variables) + 1:
-            actual_args = set(n for n in kwargs)
-            expected_args = \
-                set(name for name in variables) | {'time_offset'}
-            unexpected_arguments = list(actual_args - expected_args)
-            msg = "unexpected keyword arguments [{}] supplied to constructor [{}]"  # noqa: pycodestyle
-            msg = msg.format('; '.join(unexpected_arguments), cls_name)
-            raise TypeError(msg)
+    @classmethod
+    def _make(cls: Type['State'], values: Iterable[Any]) -> 'State':
+        """
+        Constructs a state from an iterable of values, given in the order of
+        the `_fields` of this state class (i.e., time offset first). Unlike
+        the constructor, no checks are performed on the given values.
+        """
+        state = cls.__new__(cls)
+        state._values = tuple(values)
+        return state
 
     @property
     def time_offset(self) -> float:
-        return self.__time_offset
+        return self._values[0]
+
+    @property
+    def digest(self) -> str:
+        """
+        A deterministic digest of the contents of this state. The digest is
+        computed upon first use, rather than at construction, to avoid
+        slowing down the recording of states.
+        """
+        try:
+            return self._digest
+        except AttributeError:
+            self._digest = digest([self.__class__.__name__, self._values])
+            return self._digest
 
     def equiv(self, other: 'State') -> bool:
         if type(self) != type(other):
             msg = "illegal comparison of states: [{}] vs. [{}]"
-            msg = msg.format(self.__class__.__name__, state.__class__.__name__)
+            msg = msg.format(self.__class__.__name__, other.__class__.__name__)
             raise exceptions.HoustonException(msg)
-        for n, v in self.__class__.variables.items():
-            if self.__dict__[v._field] != other.__dict__[v._field]:
-                return False
-        return True
+        return self._values[1:] == other._values[1:]
 
     def exact(self, other: 'State') -> bool:
         return self.equiv(other) and self.time_offset == other.time_offset
@@ -237,25 +247,19 @@ class State(object, metaclass=StateMeta):
     __eq__ = exact
 
     def __hash__(self) -> int:
-        all_vars = (self.time_offset,)
-        all_vars += tuple(self[v] for v in self.__class__.variables)
-        return hash(all_vars)
+        return hash(self._values)
 
     def __getitem__(self, name: str) -> Any:
         try:
-            var = self.__class__.variables[name]
-        except StopIteration:
+            index = self._indices[name]
+        except KeyError:
             msg = "no variable [{}] in state [{}]"
-            msg.format(name, self.__class__.__name__)
+            msg = msg.format(name, self.__class__.__name__)
             raise KeyError(msg)
-        return getattr(self, var._field)
+        return self._values[index]
 
     def to_dict(self) -> Dict[str, Any]:
-        fields = {}  # type: Dict[str, Any]
-        fields['time_offset'] = self.__time_offset
-        for name, var in self.__class__.variables.items():
-            fields[name] = getattr(self, var._field)
-        return fields
+        return dict(zip(self._fields, self._values))
 
     def __repr__(self) -> str:
         fields = self.to_dict()
@@ -1,10 +1,17 @@
-__all__ = ['MissionTrace', 'CommandTrace', 'TraceRecorder']
+__all__ = ['MissionTrace', 'CommandTrace', 'TraceRecorder',
+           'ColumnarTraceRecorder', 'StateBuffer', 'StateSequence',
+           'SamplingPolicy', 'RecordAll', 'FixedRateSampling',
+           'MaxGapSampling', 'LastStatePerCommand']
 
-from typing import Tuple, Iterator, Dict, Any, Optional, Type
+from typing import Tuple, Iterator, Dict, Any, Optional, Type, Iterable, \
+    List, Sequence, Union
+import array
 import attr
 import json
 import threading
 
+import numpy as np
+
 from bugzoo.core.fileline import FileLineSet
 
 from .command import Command
@@ -12,11 +19,155 @@ from .state import State
 from .connection import Message
 
 
+def _unchanged(state_class: Type[State],
+               values: Tuple[Any, ...],
+               last: Tuple[Any, ...]
+               ) -> bool:
+    """
+    Determines whether the values of each variable of a given state class
+    are equal, within their noise, to a prior set of values.
+    """
+    for variable, x, y in zip(state_class.variables.values(), values, last):
+        if x is None or y is None:
+            if x is not y:
+                return False
+        elif not variable.eq(x, y):
+            return False
+    return True
+
+
+class SamplingPolicy(object):
+    """
+    Determines which of the states that are observed during the execution
+    of a command should be recorded. Regardless of the policy, the last
+    state that was observed during each command is always recorded when
+    the recorder is flushed.
+    """
+    def should_record(self, state: State, last: Optional[State]) -> bool:
+        """
+        Determines whether a given state should be recorded, given the last
+        state that was recorded for the current command, if any.
+        """
+        raise NotImplementedError
+
+    def at_speedup(self, speedup: float) -> 'SamplingPolicy':
+        """
+        Returns a version of this policy for a simulation that runs a given
+        number of times faster than real time.
+        """
+        return self
+
+
+@attr.s(frozen=True)
+class RecordAll(SamplingPolicy):
+    """
+    Records every observed state.
+    """
+    def should_record(self, state: State, last: Optional[State]) -> bool:
+        return True
+
+
+@attr.s(frozen=True)
+class FixedRateSampling(SamplingPolicy):
+    """
+    Records states at a fixed rate, given in Hz of simulated time. Since the
+    time offsets of states are measured in wall-clock seconds, they are
+    scaled by the speedup of the simulation (see at_speedup).
+    """
+    rate = attr.ib(type=float)
+    speedup = attr.ib(type=float, default=1.0)
+
+    @rate.validator
+    def validate_rate(self, attribute, value) -> None:
+        if value <= 0:
+            raise ValueError("sampling rate must be positive")
+
+    def should_record(self, state: State, last: Optional[State]) -> bool:
+        if last is None:
+            return True
+        elapsed = (state.time_offset - last.time_offset) * self.speedup
+        return elapsed >= 1.0 / self.rate
+
+    def at_speedup(self, speedup: float) -> 'FixedRateSampling':
+        return attr.evolve(self, speedup=speedup)
+
+
+@attr.s(frozen=True)
+class MaxGapSampling(SamplingPolicy):
+    """
+    Records a state whenever any of its variables have changed beyond their
+    noise since the last recorded state, or whenever a given number of
+    seconds of simulated time have passed since the last recorded state.
+    As with FixedRateSampling, time offsets are scaled by the speedup of
+    the simulation.
+    """
+    max_gap = attr.ib(type=float)
+    speedup = attr.ib(type=float, default=1.0)
+
+    def at_speedup(self, speedup: float) -> 'MaxGapSampling':
+        return attr.evolve(self, speedup=speedup)
+
+    def should_record(self, state: State, last: Optional[State]) -> bool:
+        if last is None:
+            return True
+        elapsed = (state.time_offset - last.time_offset) * self.speedup
+        if elapsed >= self.max_gap:
+            return True
+        return not _unchanged(state.__class__,
+                              state._values[1:],
+                              last._values[1:])
+
+
+@attr.s(frozen=True)
+class LastStatePerCommand(SamplingPolicy):
+    """
+    Only records the last state that was observed during each command.
+    """
+    def should_record(self, state: State, last: Optional[State]) -> bool:
+        return False
+
+
 class TraceRecorder(object):
-    def __init__(self) -> None:
+    def __init__(self,
+                 sink: 'Optional[TraceSink]' = None,
+                 *,
+                 sampling: Optional[SamplingPolicy] = None,
+                 retain: bool = True
+                 ) -> None:
+        """
+        Constructs a new recorder. If a trace sink is given, each recorded
+        state is also streamed to that sink. If a sampling policy is given,
+        only the states that are chosen by that policy are recorded. If
+        retain is not set, recorded states are only streamed to the sink,
+        and are not returned by flush.
+
+        Raises:
+            ValueError: if retain is not set and no sink is given.
+        """
+        if not retain and sink is None:
+            raise ValueError("states must be retained if no sink is given")
         self.__lock = threading.Lock()
         self.__states = []
         self.__messages = []
+        self.__sink = sink
+        self.__sampling = sampling
+        self.__retain = retain
+        # the last state that was recorded for the current command, and the
+        # last state that was observed, if it was not recorded
+        self.__last = None  # type: Optional[State]
+        self.__pending = None  # type: Optional[State]
+
+    @property
+    def sink(self) -> 'Optional[TraceSink]':
+        return self.__sink
+
+    @property
+    def sampling(self) -> Optional[SamplingPolicy]:
+        return self.__sampling
+
+    @property
+    def retain(self) -> bool:
+        return self.__retain
 
     def record_message(self, message: Message) -> None:
         with self.__lock:
@@ -24,21 +175,326 @@ class TraceRecorder(object):
 
     def record_state(self, state: State) -> None:
         with self.__lock:
+            sampling = self.__sampling
+            if sampling and not sampling.should_record(state, self.__last):
+                self.__pending = state
+            else:
+                self._append(state)
+
+    def _append(self, state: State) -> None:
+        self.__last = state
+        self.__pending = None
+        self._store(state)
+
+    def _store(self, state: State) -> None:
+        """
+        Stores a recorded state. Called whilst the recorder is locked.
+        """
+        if self.__retain:
             self.__states.append(state)
+        if self.__sink:
+            self.__sink.write_state(state)
 
-    def flush(self) -> Tuple[Tuple[State, ...], Tuple[Message, ...]]:
+    def _take(self) -> Sequence[State]:
+        """
+        Returns the states that were stored since the last flush. Called
+        whilst the recorder is locked.
+        """
+        states = tuple(self.__states)
+        self.__states = []
+        return states
+
+    def flush(self) -> Tuple[Sequence[State], Tuple[Message, ...]]:
         with self.__lock:
-            states = tuple(self.__states)
+            if self.__pending is not None:
+                self._append(self.__pending)
+            self.__last = None
+            states = self._take()
             messages = tuple(self.__messages)
-            self.__states = []
             self.__messages = []
         return (states, messages)
 
 
+class StateBuffer(object):
+    """
+    A growable, columnar store of states that belong to a given state class.
+    The values of each numeric variable (and the time offset) are held in a
+    typed array. String variables (e.g., mode) are stored as integer codes
+    into a shared table of interned values.
+
+    Consecutive states may also be deduplicated. Rather than storing the
+    values of a state whose variables have not changed since the previously
+    stored state, only its time offset is stored, alongside a reference to
+    the previously stored values. Two modes of deduplication are supported:
+
+        exact: variables must have identical values, and so every state is
+            reconstructed exactly.
+        noise: variables must be equal within their noise (see Variable.eq).
+            States are reconstructed with their exact time offsets, but with
+            the values of the state that was last stored.
+
+    States are only ever appended to the buffer; the buffer is safe to read
+    whilst another thread appends to it.
+    """
+    _TYPECODES = {float: 'd', int: 'q', bool: 'b', str: 'i'}
+    DEDUP_MODES = ('exact', 'noise')
+
+    def __init__(self,
+                 state_class: Type[State],
+                 dedup: Optional[str] = None
+                 ) -> None:
+        if dedup is not None and dedup not in self.DEDUP_MODES:
+            raise ValueError("unknown deduplication mode: {}".format(dedup))
+        self.__state_class = state_class
+        self.__fields = state_class._fields
+        self.__types = \
+            (float,) + tuple(v.typ for v in state_class.variables.values())
+        self.__dedup = dedup
+        # the values of each variable are stored in a column for each
+        # (distinct) row, and the time offset of each state is stored
+        # separately, together with the row that holds its values
+        self.__times = array.array('d')
+        self.__rows = array.array('q') if dedup else None
+        self.__last = None  # type: Optional[Tuple[Any, ...]]
+        self.__num_rows = 0
+        self.__columns = [None]  # type: List[Any]
+        self.__categories = {}  # type: Dict[int, List[str]]
+        self.__codes = {}  # type: Dict[int, Dict[str, int]]
+        for i, typ in enumerate(self.__types[1:], 1):
+            try:
+                self.__columns.append(array.array(self._TYPECODES[typ]))
+            except KeyError:
+                self.__columns.append([])
+            if typ is str:
+                self.__categories[i] = []
+                self.__codes[i] = {}
+        self.__size = 0
+
+    @property
+    def state_class(self) -> Type[State]:
+        return self.__state_class
+
+    @property
+    def dedup(self) -> Optional[str]:
+        """
+        The mode of deduplication used by this buffer, if any.
+        """
+        return self.__dedup
+
+    @property
+    def num_rows(self) -> int:
+        """
+        The number of distinct sets of variable values that are stored by
+        this buffer.
+        """
+        return self.__num_rows
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def _is_duplicate(self, values: Tuple[Any, ...]) -> bool:
+        last = self.__last
+        if last is None:
+            return False
+        if self.__dedup == 'exact':
+            return values == last
+        return _unchanged(self.__state_class, values, last)
+
+    def append(self, state: State) -> bool:
+        """
+        Appends a state to the end of this buffer. Must not be called by
+        more than one thread at a time.
+
+        Returns:
+            False if the values of the state were deduplicated, or True if
+            they were stored.
+        """
+        time_offset = state._values[0]
+        values = state._values[1:]
+        stored = not (self.__dedup and self._is_duplicate(values))
+        if stored:
+            self._append_row(values)
+        self.__times.append(time_offset)
+        if self.__rows is not None:
+            self.__rows.append(self.__num_rows - 1)
+        self.__size += 1
+        return stored
+
+    def _append_row(self, values: Tuple[Any, ...]) -> None:
+        categories = self.__categories
+        columns = self.__columns
+        for i, val in enumerate(values, 1):
+            column = columns[i]
+            if i in categories:
+                codes = self.__codes[i]
+                try:
+                    val = codes[val]
+                except KeyError:
+                    codes[val] = len(categories[i])
+                    categories[i].append(val)
+                    val = codes[val]
+            try:
+                column.append(val)
+            except TypeError:
+                # values that cannot be stored in a typed array (e.g., None)
+                # force the column to fall back to a list
+                column = columns[i] = list(column)
+                column.append(val)
+        self.__last = values
+        self.__num_rows += 1
+
+    def _row(self, index: int) -> int:
+        return index if self.__rows is None else self.__rows[index]
+
+    def state(self, index: int) -> State:
+        """
+        Reconstructs the state at a given position in this buffer.
+        """
+        if not 0 <= index < self.__size:
+            raise IndexError("state index out of range")
+        row = self._row(index)
+        values = [self.__times[index]]
+        for i, column in enumerate(self.__columns[1:], 1):
+            val = column[row]
+            if i in self.__categories:
+                val = self.__categories[i][val]
+            elif self.__types[i] is bool and isinstance(column, array.array):
+                val = bool(val)
+            values.append(val)
+        return self.__state_class._make(values)
+
+    def column(self, name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Returns the values of a given variable (or the time offset) for the
+        states within a given range of positions in this buffer.
+        """
+        if name == 'time_offset':
+            return np.frombuffer(self.__times[start:stop], dtype='d')
+        i = self.__state_class._indices[name]
+        if self.__rows is None:
+            return self._decode(i, start, stop)
+        if start >= stop:
+            return self._decode(i, 0, 0)
+        rows = np.frombuffer(self.__rows[start:stop], dtype='q')
+        first = int(rows[0])
+        values = self._decode(i, first, int(rows[-1]) + 1)
+        return values[rows - first]
+
+    def _decode(self, i: int, start: int, stop: int) -> np.ndarray:
+        """
+        Returns the values of the variable at a given index for a given
+        range of rows.
+        """
+        typ = self.__types[i]
+        values = self.__columns[i][start:stop]
+        if i in self.__categories:
+            codes = np.frombuffer(values, dtype=np.intc)
+            table = np.array(self.__categories[i], dtype=object)
+            return table[codes].astype(str)
+        if isinstance(values, array.array):
+            return np.frombuffer(values, dtype=values.typecode).astype(typ)
+        return np.array(values, dtype=typ)
+
+
+class StateSequence(Sequence[State]):
+    """
+    A lazy, read-only view over a contiguous range of states within a
+    state buffer. States are only reconstructed when they are accessed.
+    """
+    def __init__(self, buffer: StateBuffer, start: int, stop: int) -> None:
+        assert 0 <= start <= stop <= len(buffer)
+        self.__buffer = buffer
+        self.__start = start
+        self.__stop = stop
+
+    def __len__(self) -> int:
+        return self.__stop - self.__start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("state index out of range")
+        return self.__buffer.state(self.__start + index)
+
+    def __iter__(self) -> Iterator[State]:
+        buffer = self.__buffer
+        for i in range(self.__start, self.__stop):
+            yield buffer.state(i)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __repr__(self) -> str:
+        return "StateSequence({})".format(list(self))
+
+    def columns(self,
+                names: Optional[Iterable[str]] = None
+                ) -> Dict[str, np.ndarray]:
+        """
+        Returns the values of the given state variables (or all variables,
+        and the time offset, if no names are given) across this sequence as
+        a dictionary of arrays, indexed by variable name.
+        """
+        if names is None:
+            names = self.__buffer.state_class._fields
+        return {name: self.__buffer.column(name, self.__start, self.__stop)
+                for name in names}
+
+
+class ColumnarTraceRecorder(TraceRecorder):
+    """
+    Records states into a columnar state buffer rather than a list of state
+    objects. Flushing the recorder returns a lazy view over the states that
+    were recorded since the last flush, rather than a copy of them. Messages
+    are still held as a list of objects, and are copied by each flush.
+
+    If a mode of deduplication is given (see StateBuffer), the values of
+    states that have not changed since the last stored state are not stored
+    again, and only their time offsets are written to the trace sink.
+
+    If states are not retained, the buffer only holds the states of the
+    current command, and is replaced by each flush.
+    """
+    def __init__(self,
+                 state_class: Type[State],
+                 sink: 'Optional[TraceSink]' = None,
+                 *,
+                 dedup: Optional[str] = None,
+                 sampling: Optional[SamplingPolicy] = None,
+                 retain: bool = True
+                 ) -> None:
+        super().__init__(sink, sampling=sampling, retain=retain)
+        self.__buffer = StateBuffer(state_class, dedup)
+        self.__start = 0
+
+    def _store(self, state: State) -> None:
+        stored = self.__buffer.append(state)
+        if self.sink:
+            if stored:
+                self.sink.write_state(state)
+            else:
+                self.sink.write_repeat(state.time_offset)
+
+    def _take(self) -> Sequence[State]:
+        if not self.retain:
+            buffer = self.__buffer
+            self.__buffer = StateBuffer(buffer.state_class, buffer.dedup)
+            return ()
+        stop = len(self.__buffer)
+        states = StateSequence(self.__buffer, self.__start, stop)
+        self.__start = stop
+        return states
+
+
 @attr.s  # (frozen=True)
 class CommandTrace(object):
     command = attr.ib(type=Command)
-    states = attr.ib(type=Tuple[State, ...])
+    states = attr.ib(type=Sequence[State])
     # messages = attr.ib(type=Tuple[Message, ...])
 
     # TODO messages
@@ -55,6 +511,32 @@ class CommandTrace(object):
         return {'command': self.command.to_dict(),
                 'states': [s.to_dict() for s in self.states]}
 
+    def columns(self,
+                names: Optional[Iterable[str]] = None
+                ) -> Dict[str, np.ndarray]:
+        """
+        Returns the values of the given state variables (or all variables,
+        and the time offset, if no names are given) across the states of
+        this trace as a dictionary of arrays, indexed by variable name.
+        """
+        if not self.states:
+            return {}
+        if isinstance(self.states, StateSequence):
+            return self.states.columns(names)
+        variables = self.states[0].__class__.variables
+        if names is None:
+            names = ['time_offset'] + list(variables)
+        columns = {}  # type: Dict[str, np.ndarray]
+        for name in names:
+            if name == 'time_offset':
+                typ = float
+                values = [s.time_offset for s in self.states]
+            else:
+                typ = variables[name].typ
+                values = [s[name] for s in self.states]
+            columns[name] = np.array(values, dtype=typ)
+        return columns
+
 
 @attr.s  # (frozen=True)
 class MissionTrace(object):
@@ -65,14 +547,39 @@ class MissionTrace(object):
     def from_file(filename: str,
                   system: 'Type[System]'
                   ) -> 'MissionTrace':
+        """
+        Reads a mission trace from a given file, which may either be a JSON
+        file, a binary trace file, or a trace stream.
+        """
+        from .tracefile import TraceFile, is_trace_file, is_trace_stream, \
+            read_trace_stream
+        if is_trace_file(filename):
+            return TraceFile(filename, system).trace(0)
+        if is_trace_stream(filename):
+            _, traces = read_trace_stream(filename, system)
+            return next(traces)
         with open(filename, 'r') as f:
             jsn = json.load(f)
         return MissionTrace.from_dict(jsn, system)
 
     def to_file(self, filename: str) -> None:
+        """
+        Writes this mission trace to a given file as JSON.
+        """
         with open(filename, 'w') as f:
             json.dump(self.to_dict(), f)
 
+    def to_binary_file(self,
+                       filename: str,
+                       system: 'Type[System]'
+                       ) -> None:
+        """
+        Writes this mission trace, produced by a given system, to a given
+        file using the binary trace format (see TraceFile).
+        """
+        from .tracefile import TraceFile
+        TraceFile.write(filename, [self], system=system)
+
     @staticmethod
     def from_dict(d: Dict[str, Any],
                   system: 'Type[System]'
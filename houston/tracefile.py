@@ -0,0 +1,642 @@
+"""
+Provides a compact, binary, column-oriented file format for execution traces.
+
+A trace file begins with a fixed-size preamble, composed of a magic string,
+a format version, and the size of the header, followed by a JSON header.
+The header describes the mission (if any), the name of the system, the
+state schema (i.e., the name, type, and on-disk layout of each column), and
+the commands and their boundaries for each trace within the file.
+
+The header is followed by one contiguous column for each state variable
+(and the time offset). The states of all traces within the file are stored
+back to back within each column, and each command of each trace occupies a
+contiguous range of rows, given by the command boundaries in the header.
+String variables are stored as integer codes into a table of categories
+that is kept in the header. Columns are aligned to eight bytes, allowing
+them to be memory-mapped and read independently of one another.
+
+Since the layout of a trace file is only known once all of its states have
+been collected, this module also provides an append-only trace stream,
+which is written one line at a time whilst a mission is running (see
+TraceSink).
+"""
+__all__ = ['TraceFile', 'is_trace_file', 'TraceSink', 'is_trace_stream',
+           'read_trace_stream']
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, \
+    Tuple, Type
+import json
+import logging
+import math
+import os
+import struct
+import threading
+
+import numpy as np
+
+from bugzoo.core.fileline import FileLineSet
+
+from .command import Command
+from .mission import Mission
+from .state import State
+from .system import System
+from .trace import CommandTrace, MissionTrace
+
+logger = logging.getLogger(__name__)  # type: logging.Logger
+logger.setLevel(logging.DEBUG)
+
+MAGIC = b'HTRC'
+VERSION = 1
+_PREAMBLE = struct.Struct('<4sIQ')
+_ALIGNMENT = 8
+_DTYPES = {float: '<f8', int: '<i8', bool: '|b1', str: '<i4'}
+
+
+def is_trace_file(filename: str) -> bool:
+    """
+    Determines whether a given file uses the binary trace format.
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+class TraceFile(object):
+    """
+    Provides read access to a binary trace file. Only the header is read
+    when the file is opened; columns are memory-mapped when requested.
+    """
+    @staticmethod
+    def write(filename: str,
+              traces: Sequence[MissionTrace],
+              mission: Optional[Mission] = None,
+              system: Optional[Type[System]] = None
+              ) -> None:
+        """
+        Writes a sequence of mission traces, and optionally the mission that
+        produced them, to a given file.
+
+        Raises:
+            ValueError: if the name of the system cannot be determined, or if
+                the traces contain states of more than one class.
+        """
+        if system is None and mission is not None:
+            system = mission.system
+        if system is None:
+            raise ValueError("system must be given if mission is omitted")
+        state_class = system.state
+
+        # determine the command boundaries within each trace
+        jsn_traces = []  # type: List[Dict[str, Any]]
+        states = []  # type: List[State]
+        for trace in traces:
+            commands = []  # type: List[Dict[str, Any]]
+            boundaries = [len(states)]
+            for ct in trace.commands:
+                for state in ct.states:
+                    if state.__class__ is not state_class:
+                        msg = "unexpected state class: {}"
+                        msg = msg.format(state.__class__.__name__)
+                        raise ValueError(msg)
+                    states.append(state)
+                commands.append(ct.command.to_dict())
+                boundaries.append(len(states))
+            jsn_trace = {'commands': commands, 'boundaries': boundaries}
+            if trace.coverage:
+                jsn_trace['coverage'] = trace.coverage.to_dict()
+            jsn_traces.append(jsn_trace)
+
+        # build each column
+        types = [('time_offset', float)]
+        types += [(n, v.typ) for (n, v) in state_class.variables.items()]
+        rows = list(zip(*(s._values for s in states)))
+        if not rows:
+            rows = [()] * len(types)
+        schema = []  # type: List[Dict[str, Any]]
+        columns = []  # type: List[np.ndarray]
+        for (name, typ), values in zip(types, rows):
+            column = {'name': name, 'type': typ.__name__}
+            # values that cannot be held by a typed column (e.g., a missing
+            # boolean) are stored as categories instead
+            is_categorical = typ is str or typ not in _DTYPES \
+                or (typ is not float and None in values)
+            if is_categorical:
+                categories = []  # type: List[Any]
+                codes = {}  # type: Dict[Any, int]
+                for val in values:
+                    if val not in codes:
+                        codes[val] = len(categories)
+                        categories.append(val)
+                column['categories'] = categories
+                dtype = _DTYPES[str]
+                data = np.array([codes[v] for v in values], dtype=dtype)
+            else:
+                dtype = _DTYPES[typ]
+                if typ is float and None in values:
+                    column['nullable'] = True
+                    values = [math.nan if v is None else v for v in values]
+                data = np.array(values, dtype=dtype)
+            column['dtype'] = dtype
+            schema.append(column)
+            columns.append(data)
+
+        header = {'system': system.name,
+                  'mission': mission.to_dict() if mission else None,
+                  'num_states': len(states),
+                  'schema': schema,
+                  'traces': jsn_traces}
+
+        # compute the offset of each column, relative to the start of the
+        # data section, which immediately follows the (aligned) header
+        offset = 0
+        for column, data in zip(schema, columns):
+            column['offset'] = offset
+            offset = _align(offset + data.nbytes)
+        jsn_header = json.dumps(header).encode('utf-8')
+        size_header = _align(_PREAMBLE.size + len(jsn_header)) \
+            - _PREAMBLE.size
+
+        with open(filename, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, VERSION, size_header))
+            f.write(jsn_header.ljust(size_header, b' '))
+            for column, data in zip(schema, columns):
+                f.seek(_PREAMBLE.size + size_header + column['offset'])
+                f.write(data.tobytes())
+            f.truncate(_PREAMBLE.size + size_header + offset)
+
+    def __init__(self,
+                 filename: str,
+                 system: Optional[Type[System]] = None
+                 ) -> None:
+        """
+        Opens a given trace file and reads its header.
+
+        Raises:
+            ValueError: if the file is not a trace file, or uses an
+                unsupported version of the format.
+        """
+        with open(filename, 'rb') as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise ValueError("not a trace file: {}".format(filename))
+            magic, version, size_header = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError("not a trace file: {}".format(filename))
+            if version != VERSION:
+                msg = "unsupported trace file version: {}".format(version)
+                raise ValueError(msg)
+            header = json.loads(f.read(size_header).decode('utf-8'))
+
+        self.__filename = filename
+        self.__header = header
+        self.__offset_data = _PREAMBLE.size + size_header
+        self.__schema = {c['name']: c for c in header['schema']}
+        self.__system = system
+        self.__mission = None  # type: Optional[Mission]
+
+    @property
+    def filename(self) -> str:
+        return self.__filename
+
+    @property
+    def system(self) -> Type[System]:
+        if self.__system is None:
+            self.__system = System.get_by_name(self.__header['system'])
+        return self.__system
+
+    @property
+    def mission(self) -> Optional[Mission]:
+        """
+        The mission that produced the traces within this file, if known.
+        """
+        if self.__mission is None and self.__header['mission']:
+            self.__mission = Mission.from_dict(self.__header['mission'])
+        return self.__mission
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        """
+        The names of the columns within this file.
+        """
+        return tuple(c['name'] for c in self.__header['schema'])
+
+    @property
+    def num_traces(self) -> int:
+        return len(self.__header['traces'])
+
+    @property
+    def num_states(self) -> int:
+        return self.__header['num_states']
+
+    def commands(self, trace: int) -> Tuple[Command, ...]:
+        """
+        Returns the sequence of commands that were executed by a given trace.
+        """
+        jsn_trace = self.__header['traces'][trace]
+        return tuple(Command.from_dict(c) for c in jsn_trace['commands'])
+
+    def boundaries(self, trace: int) -> Tuple[int, ...]:
+        """
+        Returns the rows at which each command of a given trace begins,
+        followed by the row at which the trace ends.
+        """
+        return tuple(self.__header['traces'][trace]['boundaries'])
+
+    def _rows(self,
+              trace: Optional[int],
+              command: Optional[int]
+              ) -> Tuple[int, int]:
+        if trace is None:
+            assert command is None
+            return 0, self.num_states
+        boundaries = self.__header['traces'][trace]['boundaries']
+        if command is None:
+            return boundaries[0], boundaries[-1]
+        return boundaries[command], boundaries[command + 1]
+
+    def codes(self,
+              name: str,
+              trace: Optional[int] = None,
+              command: Optional[int] = None
+              ) -> np.ndarray:
+        """
+        Returns a read-only, memory-mapped view of the raw values that are
+        stored for a given column. For categorical columns, these values are
+        codes into the categories of that column. The rows may be restricted
+        to a given trace, or a given command within a given trace.
+        """
+        start, stop = self._rows(trace, command)
+        return self._read(name, start, stop)
+
+    def _read(self, name: str, start: int, stop: int) -> np.ndarray:
+        column = self.__schema[name]
+        dtype = np.dtype(column['dtype'])
+        if start == stop:
+            return np.zeros(0, dtype=dtype)
+        offset = self.__offset_data + column['offset'] + start * dtype.itemsize
+        return np.memmap(self.__filename,
+                         dtype=dtype,
+                         mode='r',
+                         offset=offset,
+                         shape=(stop - start,))
+
+    def categories(self, name: str) -> Optional[List[Any]]:
+        """
+        Returns the categories for a given categorical column, or None if the
+        column is not categorical.
+        """
+        return self.__schema[name].get('categories')
+
+    def column(self,
+               name: str,
+               trace: Optional[int] = None,
+               command: Optional[int] = None
+               ) -> np.ndarray:
+        """
+        Returns the values of a given column, optionally restricted to a given
+        trace, or a given command within a given trace. Categorical columns
+        are decoded into an array of their values.
+        """
+        codes = self.codes(name, trace, command)
+        categories = self.categories(name)
+        if categories is None:
+            return codes
+        table = np.empty(len(categories), dtype=object)
+        table[:] = categories
+        values = table[codes]
+        if self.__schema[name]['type'] == 'str':
+            values = values.astype(str)
+        return values
+
+    def _states(self,
+                state_class: Type[State],
+                start: int,
+                stop: int
+                ) -> Tuple[State, ...]:
+        columns = []  # type: List[Iterable[Any]]
+        for name in state_class._fields:
+            column = self.__schema[name]
+            codes = self._read(name, start, stop)
+            categories = column.get('categories')
+            if categories is not None:
+                values = [categories[c] for c in codes.tolist()]
+            else:
+                values = codes.tolist()
+                if column.get('nullable'):
+                    values = [None if v != v else v for v in values]
+            columns.append(values)
+        return tuple(state_class._make(v) for v in zip(*columns))
+
+    def trace(self, index: int) -> MissionTrace:
+        """
+        Reconstructs a given mission trace from this file.
+        """
+        state_class = self.system.state
+        jsn_trace = self.__header['traces'][index]
+        boundaries = jsn_trace['boundaries']
+        command_traces = []  # type: List[CommandTrace]
+        for i, jsn_command in enumerate(jsn_trace['commands']):
+            command = Command.from_dict(jsn_command)
+            states = self._states(state_class,
+                                  boundaries[i],
+                                  boundaries[i + 1])
+            command_traces.append(CommandTrace(command, states))
+        if 'coverage' in jsn_trace:
+            coverage = FileLineSet.from_dict(jsn_trace['coverage'])
+        else:
+            coverage = None
+        return MissionTrace(tuple(command_traces), coverage)
+
+    def traces(self) -> List[MissionTrace]:
+        """
+        Reconstructs all of the mission traces within this file.
+        """
+        return [self.trace(i) for i in range(self.num_traces)]
+
+
+STREAM_MAGIC = b'{"houston-trace-stream": '
+
+
+def is_trace_stream(filename: str) -> bool:
+    """
+    Determines whether a given file is a trace stream.
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(STREAM_MAGIC)) == STREAM_MAGIC
+
+
+class TraceSink(object):
+    """
+    Writes the traces of a mission to an append-only stream, as they are
+    recorded. The stream is a file of JSON lines: a header, describing the
+    system, the mission, and the fields of each state, is followed by a line
+    for each state, interspersed with lines that mark the start and end of
+    each trace and the completion of each command. A state whose variables
+    are unchanged from those of the last state that was written may instead
+    be written as a repeat, which only records its time offset.
+
+    States are written as soon as they are received. When a command is
+    completed, the states that were written since the previous command was
+    completed are sealed, together with that command, and the stream is
+    flushed to disk. The stream can therefore be read, up to the last sealed
+    command, whilst the mission is still running, and only the command that
+    was in progress is lost if the mission is interrupted.
+
+    An existing stream may also be resumed, in which case its completed
+    traces are kept, and its unfinished trace, if any, is discarded.
+    """
+    def __init__(self,
+                 filename: str,
+                 mission: Optional[Mission] = None,
+                 system: Optional[Type[System]] = None,
+                 *,
+                 fsync: bool = False,
+                 append: bool = False
+                 ) -> None:
+        """
+        Creates a new trace stream at a given file, replacing any existing
+        file. If fsync is set, the stream is synchronised to disk, rather
+        than only flushed, whenever a command is sealed. If append is set,
+        and the file already exists, the existing stream is resumed after
+        its last completed trace.
+
+        Raises:
+            ValueError: if the system cannot be determined, or if an existing
+                file cannot be resumed.
+        """
+        if system is None and mission is not None:
+            system = mission.system
+        if system is None:
+            raise ValueError("system must be given if mission is omitted")
+        self.__lock = threading.Lock()
+        self.__fsync = fsync
+        if append and os.path.exists(filename):
+            size, self.__num_traces = self._scan(filename, system)
+            os.truncate(filename, size)
+            self.__file = open(filename, 'a')
+            return
+        self.__file = open(filename, 'w')
+        self.__num_traces = 0
+        header = {'system': system.name,
+                  'mission': mission.to_dict() if mission else None,
+                  'fields': list(system.state._fields)}
+        self.__file.write(STREAM_MAGIC.decode('utf-8'))
+        self.__file.write('1, ')
+        self.__file.write(json.dumps(header)[1:])
+        self.__file.write('\n')
+        self._sync()
+
+    @staticmethod
+    def _scan(filename: str, system: Type[System]) -> Tuple[int, int]:
+        """
+        Scans an existing stream for a given system, and returns the number
+        of bytes up to the end of its last completed trace, together with
+        the number of completed traces.
+
+        Raises:
+            ValueError: if the file is not a trace stream for the system.
+        """
+        with open(filename, 'rb') as f:
+            line = f.readline()
+            if not line.startswith(STREAM_MAGIC) or not line.endswith(b'\n'):
+                raise ValueError("not a trace stream: {}".format(filename))
+            header = json.loads(line.decode('utf-8'))
+            if header['system'] != system.name \
+               or tuple(header['fields']) != system.state._fields:
+                raise ValueError("trace stream was produced by a different "
+                                 "system: {}".format(filename))
+            size = offset = len(line)
+            num_traces = 0
+            for line in f:
+                offset += len(line)
+                # the final line may be incomplete if the stream was
+                # interrupted
+                if not line.endswith(b'\n'):
+                    break
+                if line.startswith(b'{"end"'):
+                    size = offset
+                    num_traces += 1
+        return size, num_traces
+
+    @property
+    def num_traces(self) -> int:
+        """
+        The number of traces that have been started within this stream,
+        including the completed traces of a resumed stream.
+        """
+        return self.__num_traces
+
+    def __enter__(self) -> 'TraceSink':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self.__file.write(json.dumps(record))
+        self.__file.write('\n')
+
+    def _sync(self) -> None:
+        self.__file.flush()
+        if self.__fsync:
+            os.fsync(self.__file.fileno())
+
+    def begin_trace(self) -> None:
+        """
+        Marks the start of a new mission trace.
+        """
+        with self.__lock:
+            self._write({'trace': self.__num_traces})
+            self.__num_traces += 1
+
+    def write_state(self, state: State) -> None:
+        """
+        Appends a state to the command that is currently in progress.
+        """
+        with self.__lock:
+            self._write({'state': list(state._values)})
+
+    def write_repeat(self, time_offset: float) -> None:
+        """
+        Appends a state whose variables are unchanged from those of the last
+        state that was written to the current trace, observed at a given
+        time offset.
+        """
+        with self.__lock:
+            self._write({'repeat': time_offset})
+
+    def seal(self, index: int, command: Command) -> None:
+        """
+        Seals the states that were written since the last seal (or discard)
+        as the trace for the command at a given position in the mission. If
+        a command at the same position has already been sealed within the
+        current trace, its states are replaced.
+        """
+        with self.__lock:
+            self._write({'command': command.to_dict(), 'index': index})
+            self._sync()
+
+    def discard(self) -> None:
+        """
+        Discards the states that were written since the last seal (or
+        discard).
+        """
+        with self.__lock:
+            self._write({'discard': True})
+
+    def end_trace(self, coverage: Optional[FileLineSet] = None) -> None:
+        """
+        Marks the end of the current mission trace.
+        """
+        record = {'end': True}  # type: Dict[str, Any]
+        if coverage:
+            record['coverage'] = coverage.to_dict()
+        with self.__lock:
+            self._write(record)
+            self._sync()
+
+    def close(self) -> None:
+        with self.__lock:
+            if not self.__file.closed:
+                self._sync()
+                self.__file.close()
+
+
+def read_trace_stream(filename: str,
+                      system: Optional[Type[System]] = None,
+                      *,
+                      include_incomplete: bool = False
+                      ) -> Tuple[Optional[Mission], Iterator[MissionTrace]]:
+    """
+    Reads a trace stream from a given file.
+
+    Parameters:
+        filename: the name of the file.
+        system: the system that produced the stream. If omitted, the system
+            is determined using the header of the stream.
+        include_incomplete: if set, the commands that have been sealed by an
+            unfinished trace (e.g., because its mission is still running, or
+            because it was interrupted) are also returned as a trace.
+
+    Returns:
+        a tuple of the form (mission, traces), where traces is an iterator
+        that lazily reads the mission traces within the stream, one at a time.
+
+    Raises:
+        ValueError: if the file is not a trace stream.
+    """
+    f = open(filename, 'r')
+    try:
+        line = f.readline()
+        if not line.startswith(STREAM_MAGIC.decode('utf-8')):
+            raise ValueError("not a trace stream: {}".format(filename))
+        header = json.loads(line)
+        if system is None:
+            system = System.get_by_name(header['system'])
+        mission = None  # type: Optional[Mission]
+        if header['mission']:
+            mission = Mission.from_dict(header['mission'])
+    except Exception:
+        f.close()
+        raise
+
+    state_class = system.state
+    assert tuple(header['fields']) == state_class._fields
+
+    def build(segments: Dict[int, CommandTrace],
+              coverage: Optional[FileLineSet] = None
+              ) -> MissionTrace:
+        traces = tuple(segments[k] for k in sorted(segments))
+        return MissionTrace(traces, coverage)
+
+    def read() -> Iterator[MissionTrace]:
+        with f:
+            segments = None  # type: Optional[Dict[int, CommandTrace]]
+            states = []  # type: List[State]
+            # the last state written to the current trace; repeated states
+            # are reconstructed from its variables
+            last = None  # type: Optional[State]
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the final line may be incomplete if the stream was
+                    # interrupted
+                    logger.debug("ignoring incomplete line in stream: %s",
+                                 filename)
+                    break
+                if 'state' in record:
+                    last = state_class._make(record['state'])
+                    states.append(last)
+                elif 'repeat' in record:
+                    assert last is not None
+                    values = (record['repeat'],) + last._values[1:]
+                    states.append(state_class._make(values))
+                elif 'command' in record:
+                    command = Command.from_dict(record['command'])
+                    if segments is not None:
+                        segments[record['index']] = \
+                            CommandTrace(command, tuple(states))
+                    states = []
+                elif 'discard' in record:
+                    states = []
+                elif 'trace' in record:
+                    segments = {}
+                    states = []
+                    last = None
+                elif 'end' in record:
+                    if segments is not None:
+                        coverage = None
+                        if 'coverage' in record:
+                            coverage = \
+                                FileLineSet.from_dict(record['coverage'])
+                        yield build(segments, coverage)
+                    segments = None
+                    states = []
+            if include_incomplete and segments:
+                yield build(segments)
+
+    return mission, read()
@@ -1,3 +1,6 @@
+from typing import Any
+import hashlib
+import json
 import sys
 from timeit import default_timer as timer
 
@@ -63,3 +66,13 @@ class Stopwatch(object):
 def printflush(s):
     print(s)
     sys.stdout.flush()
+
+
+def digest(jsn: Any) -> str:
+    """
+    Computes a deterministic BLAKE2 digest of a given JSON-serialisable
+    object. Unlike the built-in hash function, the digest is stable across
+    processes and machines.
+    """
+    encoded = json.dumps(jsn, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
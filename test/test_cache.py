@@ -0,0 +1,43 @@
+from houston.cache import OutcomeCache
+from houston.mission import MissionOutcome
+
+from .util import build_mission
+
+
+def test_lookup_and_store(tmpdir):
+    fn = str(tmpdir.join('outcomes.db'))
+    mission = build_mission(3.0)
+    passed = MissionOutcome(True, (), 1.0)
+    failed = MissionOutcome(False, (), 2.0)
+
+    with OutcomeCache(fn, min_observations=2) as cache:
+        assert cache.lookup('snapshot', mission) is None
+        cache.store('snapshot', mission, passed)
+        assert cache.lookup('snapshot', mission) is None
+        cache.store('snapshot', mission, passed)
+        assert cache.lookup('snapshot', mission) == passed
+        assert cache.lookup('other', mission) is None
+
+        stats = cache.stats
+        assert (stats.hits, stats.misses, stats.untrusted) == (1, 3, 1)
+        assert stats.stores == 2
+
+    # outcomes persist, but are no longer trusted once they disagree
+    with OutcomeCache(fn, min_observations=2) as cache:
+        assert cache.lookup('snapshot', mission) == passed
+        cache.store('snapshot', mission, failed)
+        assert cache.lookup('snapshot', mission) is None
+
+
+def test_eviction():
+    missions = [build_mission(float(i)) for i in range(3)]
+    outcome = MissionOutcome(True, (), 1.0)
+    with OutcomeCache(max_entries=2) as cache:
+        cache.store('snapshot', missions[0], outcome)
+        cache.store('snapshot', missions[1], outcome)
+        assert cache.lookup('snapshot', missions[0]) == outcome
+        cache.store('snapshot', missions[2], outcome)
+        assert len(cache) == 2
+        assert cache.stats.evictions == 1
+        assert cache.lookup('snapshot', missions[1]) is None
+        assert cache.lookup('snapshot', missions[0]) == outcome
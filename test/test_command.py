@@ -1,3 +1,4 @@
+import concurrent.futures
 import pytest
 import attr
 
@@ -56,6 +57,30 @@ def test_hash():
     assert {c1, c2, c3, c4} == {C(foo=0), C(foo=1)}
 
 
+def test_getitem():
+    class C(Command):
+        name = 'c3'
+        parameters = [
+            Parameter('foo', DiscreteValueRange([0, 1])),
+            Parameter('bar', DiscreteValueRange([0, 1]))
+        ]
+        specifications = [Idle]
+
+        def to_message(self) -> Message:
+            raise NotImplementedError
+
+    cmd = C(foo=0, bar=1)
+    assert C._fields == ('foo', 'bar')
+    assert cmd['foo'] == cmd.foo == 0
+    assert cmd['bar'] == cmd.bar == 1
+    with pytest.raises(KeyError):
+        cmd['baz']
+        pytest.fail("expected KeyError (no parameter 'baz')")
+    with pytest.raises(AttributeError):
+        cmd.foo = 1
+        pytest.fail("expected AttributeError (can't set foo)")
+
+
 def test_to_and_from_dict():
     @attr.s(frozen=True)
     class M1(Message):
@@ -84,3 +109,87 @@ def test_to_and_from_dict():
 
     y = Command.from_dict(d_actual)
     assert y.to_dict() == d_actual
+
+
+def test_resolve():
+    from houston.state import State, var
+    from houston.specification import Specification
+
+    class S(State):
+        foo = var(int, lambda c: 0)
+
+    Positive = Specification('positive', '(> _foo 0)', '(= __foo _foo)')
+    Stable = Specification('stable', '(= __foo _foo)', '(= __foo _foo)')
+    Always = Specification('always', 'true', '(= __foo _foo)')
+
+    class C(Command):
+        uid = 'test:resolve'
+        name = 'resolve'
+        parameters = []
+        specifications = [Positive, Stable, Always]
+
+        def to_message(self):
+            raise NotImplementedError
+
+    cmd = C()
+    assert cmd.resolve(S(foo=1, time_offset=0.0), None, None) is Positive
+    assert cmd.resolve(S(foo=0, time_offset=0.0), None, None) is Stable
+
+    stats = C.resolver.stats
+    assert stats.num_resolutions == 2
+    assert stats.num_compiled_checks == 2
+    assert stats.num_solver_checks == 1
+    assert stats.resolved == {'positive': 1, 'stable': 1}
+
+    # concurrent resolutions share the solver
+    C.resolver.reset_stats()
+    states = [S(foo=i % 2, time_offset=0.0) for i in range(40)]
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        specs = list(executor.map(lambda s: cmd.resolve(s, None, None),
+                                  states))
+    assert specs == [Stable, Positive] * 20
+    stats = C.resolver.stats
+    assert stats.num_resolutions == 40
+    assert stats.num_solver_checks == 20
+    assert stats.resolved == {'positive': 20, 'stable': 20}
+
+    C.resolver.reset_stats()
+    assert C.resolver.stats.num_resolutions == 0
+
+
+def test_resolve_with_solver(monkeypatch):
+    from houston.resolver import SpecificationResolver
+    from houston.state import State, var
+    from houston.specification import Specification
+
+    class S(State):
+        foo = var(int, lambda c: 0)
+
+    # both preconditions refer to the next state, and so use the solver
+    Large = Specification('large', '(and (= __foo _foo) (> _foo 5))',
+                          '(= __foo _foo)')
+    Stable = Specification('stable', '(= __foo _foo)', '(= __foo _foo)')
+
+    class C(Command):
+        uid = 'test:resolve-with-solver'
+        name = 'resolve-with-solver'
+        parameters = []
+        specifications = [Large, Stable]
+
+        def to_message(self):
+            raise NotImplementedError
+
+    entered = []
+    enter = SpecificationResolver._enter
+
+    def count(self, *args):
+        entered.append(args)
+        return enter(self, *args)
+    monkeypatch.setattr(SpecificationResolver, '_enter', count)
+
+    # the values of the state are only asserted once per resolution
+    cmd = C()
+    assert cmd.resolve(S(foo=0, time_offset=0.0), None, None) is Stable
+    assert cmd.resolve(S(foo=6, time_offset=0.0), None, None) is Large
+    assert len(entered) == 2
+    assert C.resolver.stats.num_solver_checks == 3
@@ -92,3 +92,16 @@ def test_to_and_from_dict():
     jsn = {'foo': 1, 'bar': 2}
     assert conf.to_dict() == jsn
     assert X.from_dict(jsn) == conf
+
+
+def test_getitem():
+    class X(Configuration):
+        foo = option(int)
+        bar = option(int)
+
+    conf = X(foo=1, bar=2)
+    assert conf['foo'] == 1
+    assert conf['bar'] == 2
+    with pytest.raises(KeyError):
+        conf['baz']
+        pytest.fail("expected KeyError (no option 'baz')")
@@ -0,0 +1,67 @@
+import threading
+
+from houston.connection import Connection
+
+
+class FakeConnection(Connection[str]):
+    def _message_type(self, message: str) -> str:
+        return message.split(':')[0]
+
+    def close(self) -> None:
+        self._stop_worker()
+
+
+def test_filters():
+    received = []
+    connection = FakeConnection({'all': lambda m: received.append(('all', m))})
+    connection.add_hooks(
+        {'mission': lambda m: received.append(('mission', m))},
+        {'mission': ['MISSION_CURRENT']})
+    connection.receive('HEARTBEAT:1')
+    connection.receive('MISSION_CURRENT:2')
+    assert received == [('all', 'HEARTBEAT:1'),
+                        ('all', 'MISSION_CURRENT:2'),
+                        ('mission', 'MISSION_CURRENT:2')]
+
+    # hooks may remove themselves whilst a message is being dispatched
+    del received[:]
+    connection.add_hooks({'all': lambda m: connection.remove_hook('all')})
+    connection.receive('HEARTBEAT:3')
+    connection.receive('MISSION_CURRENT:4')
+    assert received == [('mission', 'MISSION_CURRENT:4')]
+
+
+def test_subscriptions():
+    connection = FakeConnection({'a': print, 'b': print},
+                                filters={'a': ['HEARTBEAT'],
+                                         'b': ['HEARTBEAT', 'ATTITUDE']})
+    assert connection.subscriptions() == frozenset(['HEARTBEAT', 'ATTITUDE'])
+    connection.add_hooks({'c': print})
+    assert connection.subscriptions() is None
+    connection.remove_hook('c')
+    connection.remove_hook('b')
+    assert connection.subscriptions() == frozenset(['HEARTBEAT'])
+
+
+def test_queue():
+    received = []
+    blocked = threading.Event()
+    release = threading.Event()
+
+    def slow(message: str) -> None:
+        blocked.set()
+        release.wait()
+        received.append(message)
+
+    connection = FakeConnection({'slow': slow}, queue_size=2)
+    connection.receive('A:1')
+    assert blocked.wait(5)
+
+    # the receiving thread is not blocked by the slow hook
+    for i in range(2, 6):
+        connection.receive('A:{}'.format(i))
+    assert connection.num_dropped == 2
+
+    release.set()
+    connection.close()
+    assert received == ['A:1', 'A:2', 'A:3']
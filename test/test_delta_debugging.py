@@ -0,0 +1,111 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from houston.mission import Mission
+from houston.root_cause import MissionDomain
+from houston.root_cause.delta_debugging import DeltaDebugging
+
+from .util import build_mission
+
+
+class FakeDeltaDebugging(DeltaDebugging):
+    """
+    Treats a mission as failing if it contains takeoffs to both 2 and 5
+    metres, rather than running it.
+    """
+    def _probe(self, mission: Mission) -> bool:
+        altitudes = {c.altitude for c in mission.commands}
+        return not {2.0, 5.0} <= altitudes
+
+
+def build_takeoffs() -> Mission:
+    from houston.ardu.copter.takeoff import Takeoff
+
+    template = build_mission(1.0)
+    return Mission(template.configuration,
+                   template.environment,
+                   template.initial_state,
+                   [Takeoff(altitude=float(a)) for a in range(1, 7)],
+                   template.system)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('granularity', [None, 2, 3])
+def test_find_root_cause(workers, granularity):
+    mission = build_takeoffs()
+    dd = FakeDeltaDebugging(mission.system,
+                            mission.initial_state,
+                            mission.environment,
+                            mission.configuration,
+                            [mission],
+                            None,
+                            'snapshot',
+                            workers=workers,
+                            granularity=granularity)
+    domain = dd.find_root_cause()
+    assert [i for (i, _, _) in domain.domain] == [1, 4]
+
+
+class FlakyDeltaDebugging(FakeDeltaDebugging):
+    """
+    Gives the wrong outcome for the first of every three runs of each
+    mission.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.__lock = threading.Lock()
+        self.__runs = collections.Counter()
+
+    def _probe(self, mission: Mission) -> bool:
+        with self.__lock:
+            self.__runs[mission.digest] += 1
+            flip = self.__runs[mission.digest] % 3 == 1
+        return super()._probe(mission) != flip
+
+
+def test_find_root_cause_with_votes():
+    mission = build_takeoffs()
+    dd = FlakyDeltaDebugging(mission.system,
+                             mission.initial_state,
+                             mission.environment,
+                             mission.configuration,
+                             [mission],
+                             None,
+                             'snapshot',
+                             repeats=3)
+    domain = dd.find_root_cause()
+    assert [i for (i, _, _) in domain.domain] == [1, 4]
+
+
+class SlowDeltaDebugging(DeltaDebugging):
+    """
+    Treats every mission as failing, but takes longer to run missions with
+    more than one command.
+    """
+    def _probe(self, mission: Mission) -> bool:
+        if len(mission.commands) > 1:
+            time.sleep(0.2)
+        return False
+
+
+def test_first_failure():
+    mission = build_takeoffs()
+    dd = SlowDeltaDebugging(mission.system,
+                            mission.initial_state,
+                            mission.environment,
+                            mission.configuration,
+                            [mission],
+                            None,
+                            'snapshot',
+                            workers=2)
+    single = MissionDomain(mission.system, dd.domain.domain[:1])
+
+    # probes may be run outside of find_root_cause, and the lowest failing
+    # position is returned, regardless of which probe fails first
+    assert not dd._run(dd.domain)
+    with dd._executing():
+        assert dd._first_failure([dd.domain, single]) == 0
+        assert dd._first_failure([single, dd.domain]) == 0
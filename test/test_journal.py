@@ -0,0 +1,43 @@
+from houston.journal import CampaignJournal, JournalEntry, RetryPolicy
+from houston.mission import Mission
+
+from .util import build_mission
+
+
+def test_journal(tmpdir):
+    fn = str(tmpdir.join('campaign.jsonl'))
+    completed = build_mission(3.0)
+    crashed = build_mission(5.0)
+    unseen = build_mission(7.0)
+    policy = RetryPolicy(max_attempts=2)
+
+    with CampaignJournal(fn) as journal:
+        journal.record(completed, JournalEntry.PASSED, 1.5)
+        journal.record(crashed, JournalEntry.CRASHED, 0.5)
+
+    # simulate a campaign that was interrupted mid-write
+    with open(fn, 'a') as f:
+        f.write('{"key": "abc", "sta')
+
+    with CampaignJournal(fn) as journal:
+        assert journal.is_completed(completed)
+        assert not journal.should_run(completed, policy)
+        assert journal.should_run(unseen)
+        assert not journal.should_run(crashed)
+        assert journal.should_run(crashed, policy)
+        entry = journal.record(crashed, JournalEntry.CRASHED, 0.5)
+        assert entry.attempt == 2
+        assert not journal.should_run(crashed, policy)
+        assert journal.entries(completed)[0].time_elapsed == 1.5
+
+    with CampaignJournal(fn) as journal:
+        assert journal.attempts(crashed) == 2
+        assert journal.attempts(unseen) == 0
+
+
+def test_mission_digest():
+    mission = build_mission(3.0)
+    same = Mission.from_dict(mission.to_dict())
+    assert mission.digest == same.digest
+    assert mission.commands[0].digest == same.commands[0].digest
+    assert mission.digest != build_mission(5.0).digest
@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+
+import attr
+import pytest
+
+from houston.pool import SandboxPool
+
+
+@attr.s(frozen=True)
+class FakeContainer(object):
+    uid = attr.ib(type=str)
+
+
+class FakeContainers(object):
+    def __init__(self) -> None:
+        self.provisioned = []
+        self.destroyed = []
+
+    def provision(self, snapshot: str) -> FakeContainer:
+        container = FakeContainer('{}:{}'.format(snapshot,
+                                                 len(self.provisioned)))
+        self.provisioned.append(container.uid)
+        return container
+
+    def __delitem__(self, uid: str) -> None:
+        self.destroyed.append(uid)
+
+
+class FakeBugZoo(object):
+    def __init__(self) -> None:
+        self.bugs = {'snapshot': 'snapshot'}
+        self.containers = FakeContainers()
+
+
+@attr.s(frozen=True)
+class FakeSandbox(object):
+    container = attr.ib(type=FakeContainer)
+    wipe = attr.ib(type=bool)
+
+    @classmethod
+    @contextmanager
+    def for_container(cls, bz, container, state, environment, configuration,
+                      *, wipe: bool = False):
+        yield FakeSandbox(container, wipe)
+
+
+def test_lease():
+    bz = FakeBugZoo()
+    pool = SandboxPool(bz, 'snapshot', 1)
+    assert bz.containers.provisioned == ['snapshot:0']
+
+    # containers are reused, but are wiped after their first lease
+    with pool.lease(FakeSandbox, None, None, None) as sandbox:
+        assert sandbox == FakeSandbox(FakeContainer('snapshot:0'), False)
+    with pool.lease(FakeSandbox, None, None, None) as sandbox:
+        assert sandbox == FakeSandbox(FakeContainer('snapshot:0'), True)
+    assert bz.containers.destroyed == []
+
+    # containers that fail during a lease are replaced
+    with pytest.raises(RuntimeError):
+        with pool.lease(FakeSandbox, None, None, None) as sandbox:
+            raise RuntimeError
+    assert bz.containers.destroyed == ['snapshot:0']
+    with pool.lease(FakeSandbox, None, None, None) as sandbox:
+        assert sandbox == FakeSandbox(FakeContainer('snapshot:1'), False)
+
+    # closing the pool destroys its idle containers
+    pool.close()
+    assert bz.containers.destroyed == ['snapshot:0', 'snapshot:1']
+    with pytest.raises(ValueError):
+        with pool.lease(FakeSandbox, None, None, None):
+            pass
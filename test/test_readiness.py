@@ -0,0 +1,34 @@
+from collections import namedtuple
+
+from pymavlink.mavutil import mavlink
+
+from houston.ardu.connection import MAVLinkMessage
+from houston.ardu.readiness import ReadinessMonitor
+
+GPSRawInt = namedtuple('GPSRawInt', ['fix_type'])
+EKFStatusReport = namedtuple('EKFStatusReport', ['flags'])
+
+
+def test_readiness():
+    monitor = ReadinessMonitor()
+    assert monitor.pending == frozenset(ReadinessMonitor.PHASES)
+    assert not monitor.wait(0.01)
+
+    monitor.observe(MAVLinkMessage('GPS_RAW_INT', GPSRawInt(1)))
+    assert 'gps_fix' in monitor.pending
+    monitor.observe(MAVLinkMessage('GPS_RAW_INT', GPSRawInt(3)))
+    assert 'gps_fix' not in monitor.pending
+
+    flags = mavlink.EKF_ATTITUDE | mavlink.EKF_POS_HORIZ_ABS
+    const_pos = flags | mavlink.EKF_CONST_POS_MODE
+    monitor.observe(MAVLinkMessage('EKF_STATUS_REPORT',
+                                   EKFStatusReport(const_pos)))
+    assert 'ekf' in monitor.pending
+    monitor.observe(MAVLinkMessage('EKF_STATUS_REPORT',
+                                   EKFStatusReport(flags)))
+    assert monitor.pending == frozenset(['home'])
+
+    monitor.observe(MAVLinkMessage('HOME_POSITION', None))
+    assert monitor.ready
+    assert monitor.wait(0.01)
+    assert set(monitor.timings) == set(ReadinessMonitor.PHASES)
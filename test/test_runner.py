@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from houston.mission import Mission, MissionOutcome
+from houston.runner import ExecutorMissionRunnerPool, MissionRunnerPool, \
+    ProcessMissionRunner
+
+from .util import build_mission
+
+
+def _echo_worker(connection, url_bugzoo, snapshot_name, reuse_containers):
+    # reports that each mission passed, dies upon receiving a mission with
+    # an altitude of -1, and becomes wedged upon receiving a mission with an
+    # altitude of -2
+    while True:
+        jsn_mission = connection.recv()
+        if jsn_mission is None:
+            return
+        mission = Mission.from_dict(json.loads(jsn_mission))
+        if mission.commands[0].altitude == -1.0:
+            os._exit(1)
+        if mission.commands[0].altitude == -2.0:
+            connection.close()
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            time.sleep(600)
+        outcome = MissionOutcome(True, [], 0.0)
+        connection.send(json.dumps(outcome.to_dict()))
+
+
+class EchoMissionRunner(ProcessMissionRunner):
+    _worker = staticmethod(_echo_worker)
+    TERMINATE_TIMEOUT = 0.5
+
+
+class FakePool(object):
+    def __init__(self, missions):
+        self.missions = list(missions)
+        self.reported = []
+        self.crashed = []
+
+    def fetch(self):
+        if not self.missions:
+            return -1, None
+        return 0, self.missions.pop(0)
+
+    def report(self, mission, outcome, coverage, time_elapsed):
+        self.reported.append(mission)
+
+    def report_crash(self, mission, time_elapsed):
+        self.crashed.append(mission)
+
+
+def test_record_is_rejected():
+    with pytest.raises(ValueError):
+        MissionRunnerPool(None, 'snapshot', None, 1, [], print, record=True)
+
+
+def test_process_runner():
+    missions = [build_mission(altitude)
+                for altitude in (3.0, -1.0, 5.0, -2.0, 7.0)]
+    pool = FakePool(missions)
+    runner = EchoMissionRunner(pool, None, 'snapshot')
+    runner.start()
+    runner.join(60)
+    assert not runner.is_alive()
+
+    # missions that kill or wedge the worker are reported as crashes, and
+    # the remaining missions are run by a new worker, which exits cleanly
+    assert pool.reported == [missions[0], missions[2], missions[4]]
+    assert pool.crashed == [missions[1], missions[3]]
+    assert runner.process.exitcode == 0
+
+
+class FakeMission(object):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def __init__(self, passed):
+        self.passed = passed
+
+    def run(self, bz, snapshot_name, pool=None):
+        cls = FakeMission
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.running -= 1
+        if self.passed is None:
+            raise RuntimeError
+        return MissionOutcome(self.passed, [], 0.05)
+
+
+class AsyncSource(object):
+    def __init__(self, missions):
+        self.missions = list(missions)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        if not self.missions:
+            raise StopAsyncIteration
+        return self.missions.pop(0)
+
+
+def test_executor_pool():
+    missions = [FakeMission(i % 2 == 0) for i in range(6)]
+    missions.append(FakeMission(None))
+    reported = []
+
+    # at most two missions are run at once, and outcomes are reported for
+    # each mission that does not raise an exception
+    pool = ExecutorMissionRunnerPool(None, 'snapshot', 2)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(pool.run(
+            AsyncSource(missions),
+            lambda mission, outcome, coverage:
+                reported.append((mission, outcome.passed))))
+        outcome = loop.run_until_complete(pool.run_mission(missions[0]))
+    finally:
+        loop.close()
+    assert outcome.passed
+    assert sorted(reported, key=lambda r: missions.index(r[0])) == \
+        [(m, m.passed) for m in missions[:-1]]
+    assert FakeMission.max_running == 2
+
+    # synchronous sources are also accepted
+    del reported[:]
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(pool.run(
+            missions[:2],
+            lambda mission, outcome, coverage:
+                reported.append((mission, outcome.passed))))
+    finally:
+        loop.close()
+    assert len(reported) == 2
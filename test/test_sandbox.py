@@ -0,0 +1,73 @@
+import threading
+
+import attr
+
+from houston.command import Command, Parameter
+from houston.connection import Message
+from houston.sandbox import Sandbox
+from houston.specification import Expression, Specification
+from houston.state import State, var
+from houston.valueRange import DiscreteValueRange
+
+
+class S(State):
+    foo = var(int, lambda c: 0)
+
+    def evolve(self, message: 'Set', time_offset: float) -> 'S':
+        return S(foo=message.foo, time_offset=time_offset)
+
+
+@attr.s(frozen=True)
+class Set(Message):
+    foo = attr.ib(type=int)
+
+
+class FakeSandbox(Sandbox):
+    def __init__(self) -> None:
+        super().__init__(None, None, S(foo=0, time_offset=0.0), None, None)
+
+
+class Cmd(Command):
+    uid = 'test:sandbox'
+    name = 'sandbox'
+    parameters = [Parameter('foo', DiscreteValueRange([1, 3]))]
+    specifications = [Specification('set', 'true', '(= __foo 1)')]
+
+    def dispatch(self, sandbox, state, environment, configuration) -> None:
+        # the vehicle reports an irrelevant state, followed by the requested
+        # state, some time after the command is issued
+        def report() -> None:
+            sandbox.update(Set(2))
+            sandbox.update(Set(self.foo))
+        threading.Timer(0.2, report).start()
+
+    def to_message(self):
+        raise NotImplementedError
+
+
+def test_run_command(monkeypatch):
+    checks = []
+    is_satisfied = Expression.is_satisfied
+
+    def count(self, *args, **kwargs):
+        checks.append(self)
+        return is_satisfied(self, *args, **kwargs)
+    monkeypatch.setattr(Expression, 'is_satisfied', count)
+
+    # the command wakes up as soon as the expected state is observed, and
+    # only checks the postcondition when the state changes
+    sandbox = FakeSandbox()
+    outcome = sandbox.run_command(Cmd(foo=1), timeout=5.0)
+    assert outcome.successful
+    assert outcome.end_state.foo == 1
+    assert 0.2 <= outcome.time_elapsed < 1.0
+    assert len(checks) <= 3
+
+    # the command times out if the expected state is never observed
+    del checks[:]
+    sandbox = FakeSandbox()
+    outcome = sandbox.run_command(Cmd(foo=3), timeout=0.5)
+    assert not outcome.successful
+    assert outcome.end_state.foo == 3
+    assert 0.5 <= outcome.time_elapsed < 1.0
+    assert len(checks) <= 3
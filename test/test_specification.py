@@ -37,3 +37,147 @@ def test_specification():
         assert Specification("s2", "(= a true))", "(= b false)")
         pytest.fail("expected InvalidExpression")
 
+
+def test_compiled():
+    from houston.command import Command, Parameter
+    from houston.state import State, var
+    from houston.valueRange import ContinuousValueRange, DiscreteValueRange
+
+    class S(State):
+        altitude = var(float, lambda c: 0.0, noise=0.5)
+        mode = var(str, lambda c: 'GUIDED')
+        armed = var(bool, lambda c: False)
+
+    class C(Command):
+        uid = 'test:compiled'
+        name = 'compiled'
+        parameters = [
+            Parameter('altitude', ContinuousValueRange(0.0, 10.0)),
+            Parameter('mode', DiscreteValueRange(['GUIDED', 'LOITER']))
+        ]
+        specifications = []
+
+        def to_message(self):
+            raise NotImplementedError
+
+    before = S(altitude=0.0, mode='GUIDED', armed=True, time_offset=0.0)
+    after = S(altitude=4.6, mode='LOITER', armed=True, time_offset=1.0)
+    cmd = C(altitude=5.0, mode='LOITER')
+
+    pre = Expression('(and (= _armed true) (= $mode "LOITER") (< _altitude 0.3))')  # noqa: pycodestyle
+    compiled = pre.compiled(C, S)
+    assert compiled is pre.compiled(C, S)
+    assert compiled.uses_parameters
+    assert not compiled.uses_after
+    assert compiled(cmd, before, None)
+
+    # equality over noisy variables is relaxed by their noise
+    post = Expression('(and (= __altitude $altitude) (= __mode $mode))')
+    assert post.is_satisfied(cmd, before, after, None, None)
+    after = S(altitude=4.4, mode='LOITER', armed=True, time_offset=1.0)
+    assert not post.is_satisfied(cmd, before, after, None, None)
+
+    post = Expression('(ite (> _altitude 1.0) (= __armed _armed) (not (= __mode _mode)))')  # noqa: pycodestyle
+    assert post.is_satisfied(cmd, before, after, None, None)
+
+    # unknown symbols and operators are left to Z3
+    assert Expression('(= a true)').compiled(C, S) is None
+    assert Expression('(bvand _altitude 1.0)').compiled(C, S) is None
+
+    # the division of integers is left to Z3, which rounds the result
+    assert Expression('(= (/ 7 2) 3)').compiled(C, S) is None
+    assert Expression('(< (/ _altitude 2) 3.0)').compiled(C, S) is not None
+
+    # as is division by zero, or by a term that may be zero
+    assert Expression('(< (/ _altitude $altitude) 3.0)').compiled(C, S) is None
+    post = Expression('(< (/ __altitude 0.0) 3.0)')
+    assert post.compiled(C, S) is None
+    assert post.is_satisfied(cmd, before, after, None, None)
+
+
+def test_cached_expression():
+    from houston.command import Command, Parameter
+    from houston.state import State, var
+    from houston.valueRange import ContinuousValueRange
+
+    class S(State):
+        altitude = var(float, lambda c: 0.0, noise=0.5)
+
+    class C(Command):
+        uid = 'test:cached'
+        name = 'cached'
+        parameters = [
+            Parameter('altitude', ContinuousValueRange(0.0, 10.0))
+        ]
+        specifications = []
+
+        def to_message(self):
+            raise NotImplementedError
+
+    state = S(altitude=0.0, time_offset=0.0)
+    cmd = C(altitude=5.0)
+    expr = Expression('(= __altitude $altitude)')
+
+    ctx1 = z3.Context()
+    decls1 = expr.get_declarations(ctx1, cmd, state)
+    e1 = expr.get_expression(decls1, state)[0]
+    ctx2 = z3.Context()
+    decls2 = expr.get_declarations(ctx2, cmd, state)
+    e2 = expr.get_expression(decls2, state)[0]
+    assert e1.ctx == ctx1
+    assert e2.ctx == ctx2
+    assert e1.sexpr() == e2.sexpr()
+
+    after = S(altitude=4.6, time_offset=1.0)
+    assert expr.is_satisfied(cmd, state, after, None, None, use_solver=True)
+    after = S(altitude=4.4, time_offset=1.0)
+    assert not expr.is_satisfied(cmd, state, after, None, None,
+                                 use_solver=True)
+
+
+def test_check_trace():
+    from houston.command import Command, Parameter
+    from houston.state import State, var
+    from houston.trace import CommandTrace
+    from houston.valueRange import ContinuousValueRange
+
+    class S(State):
+        altitude = var(float, lambda c: 0.0, noise=0.5)
+        mode = var(str, lambda c: 'GUIDED')
+
+    class C(Command):
+        uid = 'test:check-trace'
+        name = 'check-trace'
+        parameters = [
+            Parameter('altitude', ContinuousValueRange(0.0, 10.0))
+        ]
+        specifications = []
+
+        def to_message(self):
+            raise NotImplementedError
+
+    altitudes = [0.0, 2.0, 4.6, 5.2, 5.0]
+    modes = ['GUIDED', 'GUIDED', 'LOITER', 'GUIDED', 'GUIDED']
+    states = tuple(S(altitude=alt, mode=mode, time_offset=float(i))
+                   for (i, (alt, mode)) in enumerate(zip(altitudes, modes)))
+    trace = CommandTrace(C(altitude=5.0), states)
+
+    spec = Specification('s', 'true',
+                         '(and (= __altitude $altitude) (= __mode _mode))')
+    mask, first = spec.check_trace(trace)
+    assert list(mask) == [False, False, False, True, True]
+    assert first == 3
+    for state, expected in zip(states, mask):
+        assert spec.postcondition.is_satisfied(trace.command, states[0],
+                                               state, None, None) == expected
+
+    spec = Specification('s', 'true',
+                         '(or (< __altitude 1.0) (not (= __mode _mode)))')
+    mask, first = spec.check_trace(trace)
+    assert list(mask) == [True, False, True, False, False]
+    assert first == 0
+
+    spec = Specification('s', 'true', '(> _altitude 1.0)')
+    mask, first = spec.check_trace(trace)
+    assert not mask.any()
+    assert first is None
@@ -104,3 +104,62 @@ def test_to_and_from_dict():
     d = {'foo': 1, 'bar': 2, 'time_offset': 0.0}
     assert state.to_dict() == d
     assert S.from_dict(d) == state
+
+
+def test_make():
+    class S(State):
+        foo = var(int, lambda c: 0)
+        bar = var(int, lambda c: 0)
+
+    assert S._fields == ('time_offset', 'foo', 'bar')
+    state = S._make([0.0, 1, 2])
+    assert state == S(foo=1, bar=2, time_offset=0.0)
+    assert state['bar'] == 2
+    with pytest.raises(KeyError):
+        state['baz']
+
+
+def test_inheritance():
+    class S(State):
+        foo = var(int, lambda c: 0)
+
+    class T(S):
+        bar = var(int, lambda c: 0)
+
+    assert set(T.variables) == {'foo', 'bar'}
+    state = T(foo=1, bar=2, time_offset=0.0)
+    assert state.foo == 1
+    assert state.bar == 2
+
+
+def test_digest():
+    class S(State):
+        foo = var(int, lambda c: 0)
+        mode = var(str, lambda c: 'GUIDED')
+
+    state = S(foo=1, mode='GUIDED', time_offset=0.0)
+    assert state.digest == S._make([0.0, 1, 'GUIDED']).digest
+    assert state.digest != S(foo=1, mode='AUTO', time_offset=0.0).digest
+    assert state.digest == '154ea62f00cc467efaa4ea5a9e8df7e4'
+
+
+def test_copter_evolve():
+    from types import SimpleNamespace
+    from houston.ardu.connection import MAVLinkMessage
+    from houston.ardu.copter.state import State as CopterState
+
+    values = {n: 0.0 for n in CopterState.variables}
+    values.update(armable=True, armed=False, ekf_ok=True, mode='GUIDED')
+    state = CopterState(time_offset=0.0, **values)
+    attitude = SimpleNamespace(pitch=0.1, yaw=0.2, roll=0.3)
+    connection = SimpleNamespace(conn=SimpleNamespace(attitude=attitude))
+
+    evolved = state.evolve(MAVLinkMessage('ATTITUDE', None), 1.0, connection)
+    assert evolved.time_offset == 1.0
+    assert (evolved.pitch, evolved.yaw, evolved.roll) == (0.1, 0.2, 0.3)
+    assert evolved.mode == 'GUIDED'
+    assert evolved.altitude == 0.0
+
+    # messages that cannot change the state are ignored
+    message = MAVLinkMessage('SYS_STATUS', None)
+    assert evolved.evolve(message, 2.0, connection) is evolved
@@ -0,0 +1,43 @@
+import z3
+
+from houston.mission import Mission
+from houston.root_cause.symex import SymbolicExecution
+
+from .util import build_mission
+
+
+def build_symex_mission() -> Mission:
+    from houston.ardu.common import ArmDisarm
+    from houston.ardu.copter.goto import GoTo
+    from houston.ardu.copter.takeoff import Takeoff
+
+    template = build_mission(1.0)
+    values = template.initial_state.to_dict()
+    values.update(airspeed=0.0, mode='GUIDED', armable=True, ekf_ok=True,
+                  latitude=-35.3632607, longitude=149.1652351,
+                  home_latitude=-35.3632607, home_longitude=149.1652351)
+    state = template.initial_state.__class__(**values)
+    commands = [ArmDisarm(arm=True),
+                Takeoff(altitude=5.0),
+                GoTo(latitude=-35.36, longitude=149.16, altitude=5.0)]
+    return Mission(template.configuration, template.environment, state,
+                   commands, template.system)
+
+
+def test_execute_symbolically(monkeypatch):
+    mission = build_symex_mission()
+    se = SymbolicExecution(mission.system,
+                           mission.initial_state,
+                           mission.environment,
+                           mission.configuration)
+    missions = se.execute_symbolically(mission)
+    assert len(missions) == 7
+    assert all(m.size == mission.size for m in missions)
+
+    explored = se.explore(mission, max_paths=2)
+    assert len(list(explored)) <= 2
+    assert next(se.explore(mission)) == missions[0]
+
+    # prefixes whose satisfiability is unknown are not pruned
+    monkeypatch.setattr(z3.Solver, 'check', lambda self, *args: z3.unknown)
+    assert list(se.explore(mission)) == missions
@@ -0,0 +1,260 @@
+import pytest
+
+from houston.state import State, var
+from houston.ardu.copter.takeoff import Takeoff
+from houston.trace import ColumnarTraceRecorder, CommandTrace, StateBuffer, \
+    StateSequence
+
+
+class S(State):
+    foo = var(float, lambda c: 0.0)
+    bar = var(bool, lambda c: False)
+    mode = var(str, lambda c: 'GUIDED')
+
+
+def test_columnar_recorder():
+    recorder = ColumnarTraceRecorder(S)
+    states = [S(foo=float(i), bar=i % 2 == 0, mode='AUTO' if i > 1 else 'X',
+                time_offset=i * 0.1)
+              for i in range(5)]
+    for state in states[:2]:
+        recorder.record_state(state)
+    first, _ = recorder.flush()
+    for state in states[2:]:
+        recorder.record_state(state)
+    second, _ = recorder.flush()
+    empty, _ = recorder.flush()
+
+    assert len(first) == 2
+    assert len(second) == 3
+    assert len(empty) == 0
+    assert tuple(first) == tuple(states[:2])
+    assert second[-1] == states[-1]
+    assert second[0:2] == tuple(states[2:4])
+
+    columns = CommandTrace(None, second).columns()
+    assert columns['foo'].tolist() == [2.0, 3.0, 4.0]
+    assert columns['bar'].tolist() == [True, False, True]
+    assert columns['mode'].tolist() == ['AUTO', 'AUTO', 'AUTO']
+    assert CommandTrace(None, empty).columns() == {}
+
+
+class N(State):
+    foo = var(float, lambda c: 0.0, noise=0.5)
+    bar = var(float, lambda c: 0.0)
+
+
+def test_dedup_recorder(tmpdir):
+    from houston.ardu.copter import ArduCopter
+    from houston.tracefile import TraceSink, read_trace_stream
+
+    states = [N(foo=foo, bar=bar, time_offset=i * 0.1)
+              for i, (foo, bar) in enumerate([(0.0, 0.0), (0.0, 0.0),
+                                              (0.3, 0.0), (0.6, 0.0),
+                                              (0.6, None), (0.6, None)])]
+
+    # exact deduplication reconstructs each state exactly
+    buffer = StateBuffer(N, dedup='exact')
+    assert [buffer.append(s) for s in states] == \
+        [True, False, True, True, True, False]
+    assert buffer.num_rows == 4
+    recorded = StateSequence(buffer, 1, len(buffer))
+    assert tuple(recorded) == tuple(states[1:])
+    assert recorded.columns()['foo'].tolist() == [0.0, 0.3, 0.6, 0.6, 0.6]
+
+    # noise deduplication keeps the time offset of each state, but uses the
+    # values of the last stored state
+    buffer = StateBuffer(N, dedup='noise')
+    for state in states:
+        buffer.append(state)
+    assert buffer.num_rows == 3
+    recorded = StateSequence(buffer, 0, len(buffer))
+    assert [s.time_offset for s in recorded] == \
+        [s.time_offset for s in states]
+    assert [s.foo for s in recorded] == [0.0, 0.0, 0.0, 0.6, 0.6, 0.6]
+
+    # repeated states are streamed by their time offsets alone
+    state_class = ArduCopter.state
+    values = {n: 0.0 for n in state_class.variables}
+    values.update(armable=True, armed=False, ekf_ok=True, mode='GUIDED')
+    states = []
+    for i in range(4):
+        values['altitude'] = 1.0 if i > 1 else 0.0
+        states.append(state_class(time_offset=i * 0.1, **values))
+    fn = str(tmpdir.join('trace.jsonl'))
+    with TraceSink(fn, system=ArduCopter) as sink:
+        recorder = ColumnarTraceRecorder(state_class, sink, dedup='exact')
+        sink.begin_trace()
+        for state in states:
+            recorder.record_state(state)
+        sink.seal(0, Takeoff(altitude=1.0))
+        sink.end_trace()
+    with open(fn, 'r') as f:
+        assert sum('"repeat"' in line for line in f) == 2
+    _, traces = read_trace_stream(fn)
+    assert list(traces)[0].commands[0].states == tuple(states)
+    assert tuple(recorder.flush()[0]) == tuple(states)
+
+    # recorders that do not retain their states only stream them
+    fn = str(tmpdir.join('streamed.jsonl'))
+    with TraceSink(fn, system=ArduCopter) as sink:
+        recorder = ColumnarTraceRecorder(state_class, sink, dedup='exact',
+                                         retain=False)
+        sink.begin_trace()
+        for state in states[:3]:
+            recorder.record_state(state)
+        assert recorder.flush()[0] == ()
+        sink.seal(0, Takeoff(altitude=1.0))
+        recorder.record_state(states[3])
+        assert recorder.flush()[0] == ()
+        sink.seal(1, Takeoff(altitude=2.0))
+        sink.end_trace()
+    _, traces = read_trace_stream(fn)
+    assert [ct.states for ct in next(traces).commands] == \
+        [tuple(states[:3]), (states[3],)]
+    with pytest.raises(ValueError):
+        ColumnarTraceRecorder(state_class, retain=False)
+
+
+def test_sampling():
+    from houston.trace import FixedRateSampling, LastStatePerCommand, \
+        MaxGapSampling, TraceRecorder
+
+    states = [N(foo=foo, bar=0.0, time_offset=t)
+              for t, foo in [(0.0, 0.0), (0.1, 0.1), (0.25, 0.2), (0.3, 1.0),
+                             (0.6, 1.1), (0.7, 1.1)]]
+
+    def record(recorder):
+        for state in states[:4]:
+            recorder.record_state(state)
+        first, _ = recorder.flush()
+        for state in states[4:]:
+            recorder.record_state(state)
+        second, _ = recorder.flush()
+        return [s.time_offset for s in first], [s.time_offset for s in second]
+
+    for columnar in (False, True):
+        def build(policy):
+            if columnar:
+                return ColumnarTraceRecorder(N, sampling=policy)
+            return TraceRecorder(sampling=policy)
+
+        # the last state of each command is always recorded
+        policy = FixedRateSampling(5.0)
+        assert record(build(policy)) == \
+            ([0.0, 0.25, 0.3], [0.6, 0.7])
+        policy = MaxGapSampling(0.5)
+        assert record(build(policy)) == ([0.0, 0.3], [0.6, 0.7])
+        policy = LastStatePerCommand()
+        assert record(build(policy)) == ([0.3], [0.7])
+
+        # rates and gaps are measured in simulated time
+        policy = FixedRateSampling(5.0).at_speedup(2)
+        assert record(build(policy)) == \
+            ([0.0, 0.1, 0.25, 0.3], [0.6, 0.7])
+        policy = MaxGapSampling(0.5).at_speedup(2)
+        assert record(build(policy)) == ([0.0, 0.25, 0.3], [0.6, 0.7])
+
+
+def test_trace_file(tmpdir):
+    from houston.ardu.copter import ArduCopter
+    from houston.ardu.copter.takeoff import Takeoff
+    from houston.trace import MissionTrace
+    from houston.tracefile import TraceFile, is_trace_file
+
+    state_class = ArduCopter.state
+    values = {n: 0.0 for n in state_class.variables}
+    values.update(armable=True, armed=False, ekf_ok=True, mode='GUIDED')
+    states = []
+    for i in range(5):
+        values['altitude'] = float(i)
+        values['airspeed'] = None if i == 1 else 1.0
+        values['mode'] = 'GUIDED' if i < 3 else 'LAND'
+        states.append(state_class(time_offset=i * 0.1, **values))
+    trace = MissionTrace((
+        CommandTrace(Takeoff(altitude=3.0), tuple(states[:3])),
+        CommandTrace(Takeoff(altitude=5.0), tuple(states[3:])),
+        CommandTrace(Takeoff(altitude=1.0), ())))
+
+    fn = str(tmpdir.join('trace.bin'))
+    trace.to_binary_file(fn, ArduCopter)
+    assert is_trace_file(fn)
+    assert MissionTrace.from_file(fn, ArduCopter) == trace
+
+    trace_file = TraceFile(fn)
+    assert trace_file.system is ArduCopter
+    assert trace_file.mission is None
+    assert trace_file.num_traces == 1
+    assert trace_file.boundaries(0) == (0, 3, 5, 5)
+    assert trace_file.commands(0)[1] == Takeoff(altitude=5.0)
+    altitude = trace_file.column('altitude', trace=0, command=1)
+    assert altitude.tolist() == [3.0, 4.0]
+    assert trace_file.column('mode').tolist() == \
+        ['GUIDED', 'GUIDED', 'GUIDED', 'LAND', 'LAND']
+    assert trace_file.column('altitude', trace=0, command=2).size == 0
+
+
+def test_trace_sink(tmpdir):
+    from houston.ardu.copter import ArduCopter
+    from houston.ardu.copter.takeoff import Takeoff
+    from houston.ardu.rover import ArduRover
+    from houston.tracefile import TraceSink, is_trace_stream, \
+        read_trace_stream
+
+    state_class = ArduCopter.state
+    values = {n: 0.0 for n in state_class.variables}
+    values.update(armable=True, armed=False, ekf_ok=True, mode='GUIDED')
+    states = [state_class(time_offset=i * 0.1, **values) for i in range(4)]
+    commands = [Takeoff(altitude=3.0), Takeoff(altitude=5.0)]
+
+    fn = str(tmpdir.join('trace.jsonl'))
+    with TraceSink(fn, system=ArduCopter) as sink:
+        sink.begin_trace()
+        sink.write_state(states[0])
+        sink.discard()
+        sink.write_state(states[1])
+        sink.seal(0, commands[0])
+        sink.write_state(states[2])
+        sink.write_state(states[3])
+        sink.seal(1, commands[1])
+        sink.end_trace()
+        sink.begin_trace()
+        sink.write_state(states[0])
+        sink.seal(0, commands[0])
+        sink.write_state(states[1])
+
+        # the unfinished trace is only read if requested
+        assert is_trace_stream(fn)
+        mission, traces = read_trace_stream(fn)
+        assert mission is None
+        assert len(list(traces)) == 1
+        _, traces = read_trace_stream(fn, include_incomplete=True)
+        traces = list(traces)
+
+    assert len(traces) == 2
+    first, second = traces
+    assert [ct.command for ct in first.commands] == commands
+    assert first.commands[0].states == (states[1],)
+    assert first.commands[1].states == tuple(states[2:])
+    assert len(second.commands) == 1
+    assert second.commands[0].states == (states[0],)
+
+    # resuming the stream keeps its completed traces, and discards both its
+    # unfinished trace and any incomplete line
+    with open(fn, 'a') as f:
+        f.write('{"state": [0.')
+    with TraceSink(fn, system=ArduCopter, append=True) as sink:
+        assert sink.num_traces == 1
+        sink.begin_trace()
+        sink.write_state(states[3])
+        sink.seal(0, commands[0])
+        sink.end_trace()
+    _, traces = read_trace_stream(fn, include_incomplete=True)
+    traces = list(traces)
+    assert len(traces) == 2
+    assert traces[0] == first
+    assert traces[1].commands[0].states == (states[3],)
+
+    # streams that belong to a different system cannot be resumed
+    with pytest.raises(ValueError):
+        TraceSink(fn, system=ArduRover, append=True)
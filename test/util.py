@@ -0,0 +1,25 @@
+from houston.mission import Mission
+
+
+def build_mission(altitude: float) -> Mission:
+    """
+    Builds a single-command ArduCopter mission that takes off to a given
+    altitude.
+    """
+    from houston.ardu.copter import ArduCopter
+    from houston.ardu.copter.takeoff import Takeoff
+    from houston.environment import Environment
+
+    state_class = ArduCopter.state
+    values = {n: 0.0 for n in state_class.variables}
+    values.update(armable=True, armed=False, ekf_ok=True, mode='GUIDED',
+                  airspeed=None)
+    config = ArduCopter.configuration(speedup=1,
+                                      time_per_metre_travelled=5.0,
+                                      constant_timeout_offset=1.0,
+                                      min_parachute_alt=10.0)
+    return Mission(config,
+                   Environment({}),
+                   state_class(time_offset=0.0, **values),
+                   [Takeoff(altitude=altitude)],
+                   ArduCopter)